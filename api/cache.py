@@ -0,0 +1,252 @@
+"""
+Two-tier cache shared by price_api and search_api.
+
+L1 is a small in-process LRU with a short TTL, so hot keys are served without
+a Redis round trip. L2 is Redis, shared by every worker and both services.
+Keys are `<namespace>:<key>` in both tiers, and each namespace has its own
+TTL (`CACHE_TTL_<NAMESPACE>`, e.g. CACHE_TTL_CLOB_PRICE=5).
+
+Deleting or clearing through `TieredCache` publishes on the
+`cache:invalidate` channel; every process listening (see `install`) drops the
+matching L1 entries, so a value removed from Redis does not live on in
+another worker's L1 for longer than it takes the message to arrive.
+
+L1 hands out the cached object itself: callers must not mutate values they
+get from a cached function.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from aiocache import RedisCache
+from aiocache.base import SENTINEL
+from fastapi import FastAPI
+from redis import asyncio as aioredis
+
+from api.metrics import metered_cached, record_cache
+from api.serializers import get_serializer
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "1024"))
+L1_TTL = float(os.getenv("CACHE_L1_TTL", "2"))
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Seconds a value lives in Redis, per namespace
+DEFAULT_TTLS = {
+    "candles": 600,  # rebuilt from two upstream series (api/candles.py)
+    "clob_price": 5,  # near-realtime prices
+    "sparkline": 600,  # derived from the candle tiers
+    "search": 60,
+}
+
+
+def namespace_ttl(namespace: str) -> int:
+    """Redis TTL for `namespace`: CACHE_TTL_<NAMESPACE>, else the default."""
+    default = DEFAULT_TTLS.get(namespace, 60)
+    return int(os.getenv(f"CACHE_TTL_{namespace.upper()}", str(default)))
+
+
+class LocalLRU:
+    """Bounded in-process LRU whose entries also expire after a TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = L1_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """The live value of `key`, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        """Store `value` for `ttl` seconds, evicting the least recent entries."""
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        """Drop `key` if present."""
+        self._entries.pop(key, None)
+
+    def clear(self, prefix: str = ""):
+        """Drop every key starting with `prefix` (all keys by default)."""
+        if not prefix:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+
+_tiered_caches: "weakref.WeakSet[TieredCache]" = weakref.WeakSet()
+
+
+class TieredCache(RedisCache):
+    """aiocache RedisCache (L2) with a `LocalLRU` (L1) in front of it."""
+
+    def __init__(
+        self,
+        l1_ttl: float = L1_TTL,
+        l1_max_entries: int = L1_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.l1_ttl = l1_ttl
+        self.local = LocalLRU(l1_max_entries, clock)
+        _tiered_caches.add(self)
+
+    def _build_key(self, key, namespace=None):
+        namespace = namespace if namespace is not None else self.namespace
+        return f"{namespace}:{key}" if namespace else key
+
+    def _local_ttl(self, ttl) -> float:
+        ttl = self._get_ttl(ttl)
+        return self.l1_ttl if not ttl else min(self.l1_ttl, ttl)
+
+    async def get(self, key, default=None, loads_fn=None, namespace=None, _conn=None):
+        full_key = self.build_key(key, namespace=namespace)
+        value = self.local.get(full_key)
+        if value is not None:
+            record_cache(self.namespace or "default", "l1_hit")
+            return value
+        value = await super().get(
+            key, default=None, loads_fn=loads_fn, namespace=namespace, _conn=_conn
+        )
+        if value is None:
+            return default
+        self.local.set(full_key, value, self._local_ttl(SENTINEL))
+        return value
+
+    async def set(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        key,
+        value,
+        ttl=SENTINEL,
+        dumps_fn=None,
+        namespace=None,
+        _cas_token=None,
+        _conn=None,
+    ):
+        # Signature of aiocache's BaseCache.set, which fixes the argument count.
+        # L1 first, so this worker keeps its copy even if Redis is unreachable
+        self.local.set(
+            self.build_key(key, namespace=namespace), value, self._local_ttl(ttl)
+        )
+        return await super().set(
+            key,
+            value,
+            ttl=ttl,
+            dumps_fn=dumps_fn,
+            namespace=namespace,
+            _cas_token=_cas_token,
+            _conn=_conn,
+        )
+
+    async def delete(self, key, namespace=None, _conn=None):
+        full_key = self.build_key(key, namespace=namespace)
+        self.local.delete(full_key)
+        deleted = await super().delete(key, namespace=namespace, _conn=_conn)
+        await self.client.publish(INVALIDATION_CHANNEL, json.dumps({"key": full_key}))
+        return deleted
+
+    async def clear(self, namespace=None, _conn=None):
+        """Remove every key of the namespace (never the whole Redis database)."""
+        prefix = self.build_key("", namespace=namespace)
+        self.local.clear(prefix)
+        keys = [key async for key in self.client.scan_iter(match=f"{prefix}*")]
+        if keys:
+            await self.client.delete(*keys)
+        await self.client.publish(INVALIDATION_CHANNEL, json.dumps({"prefix": prefix}))
+        return True
+
+
+def apply_invalidation(message) -> None:
+    """Drop the L1 entries named by an invalidation message in this process."""
+    try:
+        payload = json.loads(message)
+    except (TypeError, ValueError):
+        logging.warning("Ignoring malformed cache invalidation %r", message)
+        return
+    for cache in list(_tiered_caches):
+        if "key" in payload:
+            cache.local.delete(payload["key"])
+        else:
+            cache.local.clear(payload.get("prefix", ""))
+
+
+async def listen_for_invalidations(retry_delay: float = 5.0):
+    """Apply invalidations published by any process until cancelled."""
+    while True:
+        client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Messages sent while we were not subscribed are lost
+                apply_invalidation(json.dumps({"prefix": ""}))
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        apply_invalidation(message["data"])
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.warning("Cache invalidation listener failed: %s", e)
+        finally:
+            await client.aclose()
+        await asyncio.sleep(retry_delay)
+
+
+def tiered_cached(namespace: str, key_builder: Callable, **kwargs) -> metered_cached:
+    """
+    Decorator caching a coroutine's result in the two-tier cache under
+    `namespace`, with that namespace's TTL.
+    """
+    return metered_cached(
+        cache=TieredCache,
+        namespace=namespace,
+        ttl=namespace_ttl(namespace),
+        key_builder=key_builder,
+        serializer=get_serializer(),
+        endpoint=REDIS_HOST,
+        port=REDIS_PORT,
+        **kwargs,
+    )
+
+
+def install(app: FastAPI):
+    """Keep this process's L1 in step with invalidations while `app` runs."""
+    listener: Optional[asyncio.Task] = None
+
+    async def start():
+        nonlocal listener
+        listener = asyncio.create_task(listen_for_invalidations())
+
+    async def stop():
+        if listener is not None:
+            listener.cancel()
+
+    app.add_event_handler("startup", start)
+    app.add_event_handler("shutdown", stop)
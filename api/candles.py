@@ -0,0 +1,103 @@
+"""
+Multi-resolution OHLC candles built from one price series per token.
+
+`build_pyramid` turns a token's finest `prices-history` series into a tier
+of candles per width in `TIER_WIDTHS`: the finest tier from the points, and
+each coarser tier from the tier below it. Every chart interval is then served
+by `select`, which picks the finest tier that covers the interval's window in
+at most `MAX_CANDLES` candles, so switching intervals needs no upstream call.
+
+A tier only keeps the candles the intervals it serves can ask for (the last
+`MAX_CANDLES`); the coarsest tier keeps everything for `max`. Tiers are
+stored by column, {"t", "o", "h", "l", "c"}, with `t` the candle's start.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+# Candle widths in seconds: 1 minute, 5 minutes, 30 minutes, 2 hours, 1 day
+TIER_WIDTHS = (60, 300, 1800, 7200, 86400)
+MAX_CANDLES = 500
+# Chart intervals ("1m" is one month, as on Polymarket); None means all history
+INTERVAL_WINDOWS = {
+    "1h": 3600,
+    "6h": 6 * 3600,
+    "1d": 86400,
+    "1w": 7 * 86400,
+    "1m": 30 * 86400,
+    "max": None,
+}
+COLUMNS = ("t", "o", "h", "l", "c")
+
+
+def _aggregate(candles: Dict[str, np.ndarray], width: int) -> Dict[str, np.ndarray]:
+    """Candles of `width` seconds from time-ordered finer candles (by column)."""
+    buckets = candles["t"] // width * width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    return {
+        "t": buckets[starts],
+        "o": candles["o"][starts],
+        "h": np.maximum.reduceat(candles["h"], starts),
+        "l": np.minimum.reduceat(candles["l"], starts),
+        "c": candles["c"][ends],
+    }
+
+
+def build_pyramid(history: List[Dict]) -> Dict[str, Dict[str, list]]:
+    """Candle tiers by width (as a string key) from [{"t", "p"}] points."""
+    points = sorted(
+        (int(point["t"]), float(point["p"]))
+        for point in history
+        if point.get("t") is not None and point.get("p") is not None
+    )
+    if not points:
+        return {}
+    times = np.array([t for t, _ in points], dtype=np.int64)
+    prices = np.array([p for _, p in points], dtype=float)
+
+    tiers = {}
+    # A point is a candle whose open, high, low and close are its price
+    tier = {"t": times, "o": prices, "h": prices, "l": prices, "c": prices}
+    for width in TIER_WIDTHS:
+        tier = _aggregate(tier, width)
+        keep = None if width == TIER_WIDTHS[-1] else -MAX_CANDLES
+        tiers[str(width)] = {column: tier[column][keep:].tolist() for column in COLUMNS}
+    return tiers
+
+
+def tier_width(interval: str) -> int:
+    """Finest width showing the interval's window in at most MAX_CANDLES."""
+    window = INTERVAL_WINDOWS.get(interval)
+    if window is None:
+        return TIER_WIDTHS[-1]
+    for width in TIER_WIDTHS:
+        if window / width <= MAX_CANDLES:
+            return width
+    return TIER_WIDTHS[-1]
+
+
+def select(tiers: Dict[str, Dict[str, list]], interval: str) -> Dict:
+    """
+    {"width", "t", "o", "h", "l", "c"} for `interval`: the matching tier's
+    candles in the window that ends with the latest one.
+    """
+    width = tier_width(interval)
+    tier = tiers.get(str(width))
+    if not tier or not tier["t"]:
+        return {"width": width, **{column: [] for column in COLUMNS}}
+    window = INTERVAL_WINDOWS.get(interval)
+    end = tier["t"][-1] + width
+    start = int(np.searchsorted(tier["t"], end - window)) if window else 0
+    return {"width": width, **{column: tier[column][start:] for column in COLUMNS}}
+
+
+def as_history(selected: Dict) -> List[Dict]:
+    """Candles as the [{"t", "p"}] close-price series of `prices-history`."""
+    return [{"t": t, "p": c} for t, c in zip(selected["t"], selected["c"])]
+
+
+def as_rows(selected: Dict) -> List[List]:
+    """Candles as [t, open, high, low, close] rows."""
+    return [list(row) for row in zip(*(selected[column] for column in COLUMNS))]
@@ -0,0 +1,112 @@
+"""
+Request deadlines propagated from the caller.
+
+web_app sends `X-Deadline-Ms` with the time it is still willing to wait for
+the answer. While a request is handled, upstream timeouts are cut to the
+remaining budget (`timeout`), tenacity stops retrying when the next sleep
+would not fit (`stop_before_deadline`), and the request is cancelled with a
+504 once the budget is spent, so no work continues for a caller that has
+already given up.
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter
+
+HEADER = "x-deadline-ms"
+
+DEADLINES_EXCEEDED = Counter(
+    "request_deadline_exceeded_total",
+    "Requests cancelled because the caller's deadline passed",
+    ["path"],
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting upstream work that cannot finish in time."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if unbounded."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """`default` shortened to the remaining budget; raises if nothing is left."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline has passed")
+    return min(default, left)
+
+
+class stop_before_deadline:  # pylint: disable=invalid-name,too-few-public-methods
+    """tenacity stop condition: give up if the next wait would outlast the deadline."""
+
+    def __call__(self, retry_state) -> bool:
+        left = remaining()
+        return left is not None and left <= (retry_state.upcoming_sleep or 0)
+
+
+def parse_budget(value: Optional[str]) -> Optional[float]:
+    """Header value (milliseconds) to seconds; None when absent or malformed."""
+    try:
+        return max(0.0, float(value) / 1000) if value else None
+    except ValueError:
+        return None
+
+
+class DeadlineMiddleware:  # pylint: disable=too-few-public-methods
+    """ASGI middleware that runs each request under its caller's deadline."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        budget = None
+        if scope["type"] == "http":
+            budget = parse_budget(
+                dict(scope["headers"]).get(HEADER.encode(), b"").decode()
+            )
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracking_start(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        token = _deadline.set(time.monotonic() + budget)
+        try:
+            await asyncio.wait_for(
+                self.app(scope, receive, send_tracking_start), budget
+            )
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            DEADLINES_EXCEEDED.labels(scope["path"]).inc()
+            if not started:
+                response = JSONResponse(
+                    {"detail": "Request deadline exceeded"}, status_code=504
+                )
+                await response(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+def install(app: FastAPI):
+    """Apply caller deadlines to every request handled by `app`."""
+    app.add_middleware(DeadlineMiddleware)
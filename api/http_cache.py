@@ -0,0 +1,148 @@
+"""
+HTTP conditional requests and compression for the JSON endpoints.
+
+Every successful GET answered with JSON gets a weak ETag derived from its
+body, so a client sending it back in `If-None-Match` receives an empty 304
+instead of the same JSON again. Responses built from cached values only
+change when the cache entry does, so the ETag changes exactly when the
+cached version does. Paths listed in `install(max_ages=...)` also get a
+`Cache-Control: private, max-age=N` matching their cache TTL; responses
+served from last known data (`X-Stale`) get `no-cache`.
+
+Bodies of at least `MIN_COMPRESS_BYTES` are compressed with brotli or gzip,
+whichever the client prefers among the two (brotli on a tie).
+"""
+
+import gzip
+import hashlib
+from typing import Dict, Iterable, Optional
+
+import brotli
+from fastapi import FastAPI
+
+MIN_COMPRESS_BYTES = 1024
+# Fast settings: the services compress on every response
+BROTLI_QUALITY = 4
+GZIP_LEVEL = 6
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def etag_for(body: bytes) -> str:
+    """Weak ETag derived from a hash of the response body."""
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an `If-None-Match` header against `etag`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(",")
+    )
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """ "br" or "gzip", by the client's q-values; None if it accepts neither."""
+    weights = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+    candidates = [(weights.get(e, weights.get("*", 0.0)), e) for e in ("br", "gzip")]
+    quality, encoding = max(candidates, key=lambda c: c[0])
+    return encoding if quality > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """`body` compressed with "br" or "gzip"."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _header(headers: Iterable, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class HTTPCacheMiddleware:
+    """ASGI middleware adding ETags, Cache-Control and compression to GETs."""
+
+    def __init__(self, app, max_ages: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_ages = max_ages or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def buffer(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self.respond(scope, start, b"".join(chunks), send)
+
+        await self.app(scope, receive, buffer)
+
+    async def respond(self, scope, start, body: bytes, send):
+        """Send the buffered 200 with ETag and Cache-Control, as a 304 or compressed."""
+        headers = [
+            (key, value)
+            for key, value in start["headers"]
+            if key.lower() not in (b"content-length", b"etag", b"cache-control")
+        ]
+        content_type = _header(headers, b"content-type") or ""
+        if start["status"] != 200 or not content_type.startswith(COMPRESSIBLE_TYPES):
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        request_headers = scope["headers"]
+        etag = etag_for(body)
+        headers.append((b"etag", etag.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+        if _header(headers, b"x-stale"):
+            headers.append((b"cache-control", b"no-cache"))
+        elif scope["path"] in self.max_ages:
+            max_age = self.max_ages[scope["path"]]
+            headers.append((b"cache-control", f"private, max-age={max_age}".encode()))
+
+        if etag_matches(_header(request_headers, b"if-none-match"), etag):
+            await send({**start, "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        encoding = None
+        if len(body) >= MIN_COMPRESS_BYTES:
+            encoding = choose_encoding(_header(request_headers, b"accept-encoding"))
+        if encoding:
+            body = compress(body, encoding)
+            headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def install(app: FastAPI, max_ages: Optional[Dict[str, int]] = None):
+    """ETags and compression for `app`; `max_ages` maps paths to max-age seconds."""
+    app.add_middleware(HTTPCacheMiddleware, max_ages=max_ages)
@@ -0,0 +1,139 @@
+"Prometheus metrics shared by the FastAPI services"
+
+import os
+import time
+from contextlib import contextmanager
+
+from aiocache import cached
+from fastapi import FastAPI, Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from api import timing
+
+# Upstream and request latencies span cache hits (~1ms) to slow upstreams (~30s)
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route template",
+    ["service", "method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Time spent waiting on an upstream call",
+    ["upstream", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_EVENTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by namespace and result (hit, miss, stale or l1_hit)",
+    ["namespace", "result"],
+)
+RETRIES = Counter(
+    "upstream_retries_total",
+    "Retries scheduled by tenacity after a failed upstream attempt",
+    ["operation"],
+)
+
+
+@contextmanager
+def track_upstream(upstream: str):
+    """Time the enclosed upstream call; the outcome label is ok or error."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_LATENCY.labels(upstream, outcome).observe(elapsed)
+        timing.record("upstream", elapsed)
+
+
+def count_retry(operation: str):
+    """tenacity `before_sleep` hook counting each retry of `operation`."""
+
+    def before_sleep(retry_state):  # pylint: disable=unused-argument
+        RETRIES.labels(operation).inc()
+
+    return before_sleep
+
+
+def record_cache(namespace: str, result: str):
+    """Count one cache lookup in `namespace` as a hit or a miss."""
+    CACHE_EVENTS.labels(namespace, result).inc()
+
+
+class metered_cached(cached):  # pylint: disable=invalid-name
+    """
+    aiocache `cached` that counts hits and misses under its namespace and
+    adds its reads and writes to the request's cache timing.
+    """
+
+    async def get_from_cache(self, key: str):
+        with timing.phase("cache"):
+            value = await super().get_from_cache(key)
+        record_cache(self._namespace or "default", "miss" if value is None else "hit")
+        return value
+
+    async def set_in_cache(self, key, value):
+        with timing.phase("cache"):
+            await super().set_in_cache(key, value)
+
+
+def render_metrics() -> Response:
+    """Exposition of every metric, merged across workers in multiprocess mode."""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument(app: FastAPI, service: str):
+    """Time every request to `app` and serve the metrics at GET /metrics."""
+
+    @app.middleware("http")
+    async def observe_request(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            REQUEST_LATENCY.labels(
+                service,
+                request.method,
+                route.path if route is not None else "unmatched",
+                str(status),
+            ).observe(time.perf_counter() - start)
+
+    app.add_api_route(
+        "/metrics", render_metrics, methods=["GET"], include_in_schema=False
+    )
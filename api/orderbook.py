@@ -0,0 +1,290 @@
+"""
+Local order books for the tokens being traded, and fill prices against them.
+
+`/clob` answers with the best price only, so a large bet priced from it would
+fill entirely at the top of the book. Instead, price_api keeps the books of
+recently traded tokens in memory: each side is a `SortedDict` of price ->
+size, loaded from a `book` snapshot and then updated in place by the
+`price_change` deltas of the CLOB market channel (a size of 0 removes the
+level). `OrderBook.fill` walks the levels from the best price until a
+notional is spent and reports the average price of the fill.
+
+`BookFeed` holds one market-channel connection subscribed to every watched
+token. Watching a new token re-subscribes; its `WatchList` drops a token not
+asked for within `idle_seconds` (or beyond `max_tokens`). While the connection is
+down the books are discarded rather than served stale, so callers fall back
+to a REST snapshot.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import websockets
+from sortedcontainers import SortedDict
+
+SIDES = ("BUY", "SELL")
+# Smallest notional left unfilled that still counts as a partial fill
+EPSILON = 1e-9
+RECONNECT_MAX_SECONDS = 30
+
+
+def _levels(levels: Iterable[Mapping]) -> SortedDict:
+    book = SortedDict()
+    for level in levels:
+        size = float(level["size"])
+        if size > 0:
+            book[float(level["price"])] = size
+    return book
+
+
+class OrderBook:
+    """Bids and asks of one token, price -> size, kept sorted by price."""
+
+    def __init__(self, snapshot: Optional[Mapping] = None):
+        self.bids = SortedDict()
+        self.asks = SortedDict()
+        self.hash: Optional[str] = None
+        if snapshot is not None:
+            self.apply_snapshot(snapshot)
+
+    def apply_snapshot(self, snapshot: Mapping):
+        """Replace the book with a `book` message or REST `/book` response."""
+        self.bids = _levels(snapshot.get("bids") or [])
+        self.asks = _levels(snapshot.get("asks") or [])
+        self.hash = snapshot.get("hash")
+
+    def apply_change(self, side: str, price, size, book_hash: Optional[str] = None):
+        """Set one level from a `price_change` entry; BUY is a bid, SELL an ask."""
+        levels = self.bids if side == "BUY" else self.asks
+        price, size = float(price), float(size)
+        if size > 0:
+            levels[price] = size
+        else:
+            levels.pop(price, None)
+        if book_hash is not None:
+            self.hash = book_hash
+
+    def best_bid(self) -> Optional[float]:
+        """Highest bid price, or None if there are no bids."""
+        return self.bids.peekitem(-1)[0] if self.bids else None
+
+    def best_ask(self) -> Optional[float]:
+        """Lowest ask price, or None if there are no asks."""
+        return self.asks.peekitem(0)[0] if self.asks else None
+
+    def fill(self, notional: float, side: str = "BUY") -> Dict:
+        """
+        Fill `notional` dollars against the book: a BUY takes the asks from
+        the lowest price, a SELL the bids from the highest.
+
+        Returns {"avg_price", "best_price", "worst_price", "shares",
+        "filled", "levels", "complete", "slippage"}; prices are None when the
+        side is empty, and `complete` is False if the book ran out first.
+        `slippage` is how much worse the average is than the best price.
+        """
+        if side == "BUY":
+            levels = self.asks.items()
+        else:
+            levels = reversed(self.bids.items())
+        remaining = notional
+        shares = 0.0
+        used = 0
+        best = worst = None
+        for price, size in levels:
+            if best is None:
+                best = price
+            spend = min(price * size, remaining)
+            shares += spend / price
+            remaining -= spend
+            worst = price
+            used += 1
+            if remaining <= EPSILON:
+                break
+        filled = notional - remaining
+        avg = filled / shares if shares else None
+        slippage = None
+        if avg is not None:
+            slippage = avg - best if side == "BUY" else best - avg
+        return {
+            "avg_price": avg,
+            "best_price": best,
+            "worst_price": worst,
+            "shares": shares,
+            "filled": filled,
+            "levels": used,
+            "complete": remaining <= EPSILON,
+            "slippage": slippage,
+        }
+
+
+class BookStore:
+    """Books by token, updated from market-channel messages."""
+
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+
+    def get(self, token: str) -> Optional[OrderBook]:
+        """The live book of `token`, or None until its snapshot arrives."""
+        return self.books.get(token)
+
+    def load(self, token: str, snapshot: Mapping) -> OrderBook:
+        """Replace `token`'s book with `snapshot`."""
+        book = self.books[token] = OrderBook(snapshot)
+        return book
+
+    def discard(self, tokens: Iterable[str]):
+        """Forget the books of `tokens`."""
+        for token in tokens:
+            self.books.pop(token, None)
+
+    def handle(self, message: Union[Mapping, List[Mapping]]):
+        """Apply a market-channel message (one event or a list of them)."""
+        events = message if isinstance(message, list) else [message]
+        for event in events:
+            kind = event.get("event_type")
+            if kind == "book":
+                self.load(event["asset_id"], event)
+            elif kind == "price_change":
+                for change in event.get("price_changes") or []:
+                    # Deltas for a book without its snapshot cannot be applied
+                    book = self.books.get(change.get("asset_id"))
+                    if book is not None:
+                        book.apply_change(
+                            change["side"],
+                            change["price"],
+                            change["size"],
+                            change.get("hash"),
+                        )
+
+
+class WatchList:
+    """
+    Tokens asked for recently, least recent first: at most `max_tokens`, each
+    forgotten `idle_seconds` after it was last asked for.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 200,
+        idle_seconds: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_tokens = max_tokens
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        # token -> last time it was asked for, least recent first
+        self._tokens: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def tokens(self) -> List[str]:
+        """The watched tokens, least recently asked for first."""
+        return list(self._tokens)
+
+    def touch(self, token: str) -> Tuple[bool, List[str]]:
+        """Mark `token` as asked for now; (whether it is new, tokens dropped)."""
+        now = self._clock()
+        added = token not in self._tokens
+        self._tokens[token] = now
+        self._tokens.move_to_end(token)
+        dropped = []
+        while self._tokens and (
+            len(self._tokens) > self.max_tokens
+            or next(iter(self._tokens.values())) < now - self.idle_seconds
+        ):
+            dropped.append(self._tokens.popitem(last=False)[0])
+        return added, dropped
+
+
+class BookFeed:
+    """One market-channel subscription keeping a `BookStore` current."""
+
+    def __init__(
+        self,
+        url: str,
+        watching: Optional[WatchList] = None,
+        connect: Callable = websockets.connect,
+    ):
+        self.url = url
+        self.store = BookStore()
+        self.watching = watching if watching is not None else WatchList()
+        self._connect = connect
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def watched(self) -> List[str]:
+        """The tokens the feed is subscribed to."""
+        return self.watching.tokens()
+
+    def watch(self, token: str) -> Optional[OrderBook]:
+        """Keep `token`'s book current; returns it if it is already live."""
+        added, dropped = self.watching.touch(token)
+        self.store.discard(dropped)
+        self._ensure_running()
+        if added or dropped:
+            self._changed.set()
+        return self.store.get(token)
+
+    async def close(self):
+        """Stop the feed (on shutdown); watching a token starts it again."""
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        if task.get_loop() is asyncio.get_running_loop():
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Events and tasks belong to one event loop
+            self._loop = loop
+            self._changed = asyncio.Event()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def _read(self, ws):
+        async for raw in ws:
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue  # e.g. PONG
+            self.store.handle(message)
+
+    async def _run(self):
+        delay = 1.0
+        while self.watching:
+            tokens = self.watching.tokens()
+            self._changed.clear()
+            reader = changed = None
+            try:
+                async with self._connect(self.url) as ws:
+                    await ws.send(json.dumps({"assets_ids": tokens, "type": "market"}))
+                    delay = 1.0
+                    reader = asyncio.create_task(self._read(ws))
+                    changed = asyncio.create_task(self._changed.wait())
+                    await asyncio.wait(
+                        {reader, changed}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not reader.done():
+                        # Re-subscribe; the new snapshots replace the books
+                        continue
+                    reader.result()
+            except Exception as e:  # pylint: disable=broad-except
+                logging.warning("Order book feed %s failed: %s", self.url, e)
+            finally:
+                for task in (reader, changed):
+                    if task is not None:
+                        task.cancel()
+            # The connection dropped: deltas were missed, so drop the books
+            self.store.discard(tokens)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
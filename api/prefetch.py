@@ -0,0 +1,105 @@
+"""
+Background warm-up of caches ahead of the request that will need them.
+
+A `Prefetcher` runs jobs (coroutine factories) on a few worker tasks. Jobs
+are deduplicated by key for `dedup_seconds` after they were scheduled,
+queued up to `max_pending` (extra jobs are dropped, never awaited), and
+started no faster than `rate` per second so warm-up cannot flood an
+upstream. Workers run in an empty context, so they inherit neither the
+deadline nor the Server-Timing phases of the request that scheduled them.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from prometheus_client import Counter
+
+PREFETCH_JOBS = Counter(
+    "prefetch_jobs_total",
+    "Warm-up jobs by result: scheduled, duplicate, dropped, done or failed",
+    ["result"],
+)
+
+
+class PrefetchPolicy(NamedTuple):
+    """How fast, how many at once and how often a `Prefetcher` runs jobs."""
+
+    rate: float = 5.0
+    concurrency: int = 2
+    dedup_seconds: float = 300.0
+    max_pending: int = 200
+
+
+class Prefetcher:
+    """
+    Deduplicated, rate-limited queue of background warm-up jobs.
+
+    Keyword arguments other than `clock` are the fields of `PrefetchPolicy`.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, **policy):
+        self.policy = PrefetchPolicy(**policy)
+        self._clock = clock
+        self._seen: Dict[str, float] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next_start = 0.0
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(self.policy.max_pending)
+        self._workers = [
+            asyncio.create_task(self._work(), context=contextvars.Context())
+            for _ in range(self.policy.concurrency)
+        ]
+
+    def schedule(self, key: str, job: Callable[[], Awaitable]) -> bool:
+        """Queue `job()` unless `key` was scheduled recently; True if queued."""
+        now = self._clock()
+        if self._seen.get(key, float("-inf")) > now:
+            PREFETCH_JOBS.labels("duplicate").inc()
+            return False
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait((key, job))
+        except asyncio.QueueFull:
+            PREFETCH_JOBS.labels("dropped").inc()
+            return False
+        self._seen[key] = now + self.policy.dedup_seconds
+        if len(self._seen) > 10 * self.policy.max_pending:
+            self._seen = {k: t for k, t in self._seen.items() if t > now}
+        PREFETCH_JOBS.labels("scheduled").inc()
+        return True
+
+    async def _throttle(self):
+        # Space job starts 1/rate apart across all workers
+        now = self._clock()
+        start = max(now, self._next_start)
+        self._next_start = start + 1 / self.policy.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _work(self):
+        while True:
+            key, job = await self._queue.get()
+            try:
+                await self._throttle()
+                await job()
+                PREFETCH_JOBS.labels("done").inc()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                PREFETCH_JOBS.labels("failed").inc()
+                logging.info("Prefetch of %s failed: %s", key, e)
+            finally:
+                self._queue.task_done()
+
+    async def join(self):
+        """Wait until every queued job has run (used by tests and shutdown)."""
+        if self._queue is not None:
+            await self._queue.join()
@@ -0,0 +1,156 @@
+"""
+In-process prefix index of market questions and event titles for autocomplete.
+
+Every word of an indexed text goes into one sorted list of postings,
+(word, -volume, text, entry), so the entries with a word starting with a
+given prefix are a contiguous slice found by binary search, and within it
+each word's entries are already ranked by volume. A query matches the
+entries where each of its words is the prefix of some word of the text:
+the slices of its rarest word are merged best first until `limit` entries
+also match the other words, so a suggestion never sorts all the matches.
+
+The index is filled from the gamma search responses the service receives
+anyway: `add_search` indexes the events and open markets of a response and
+`add` updates one entry in place. It holds at most `max_entries` entries
+and forgets the least recently added first.
+"""
+
+import bisect
+import heapq
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+WORD = re.compile(r"[^\W_]+")
+# Longest prefix looked up; longer query words are cut to it
+MAX_PREFIX = 32
+
+
+def _volume(value) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def words(text: str) -> List[str]:
+    """Lowercase words of `text`, without duplicates, in order."""
+    return list(dict.fromkeys(WORD.findall(text.lower())))
+
+
+class PrefixIndex:
+    """Bounded prefix index of {"text", "kind", "slug", "volume"} entries."""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        # (word, -volume, text, entry key): each word's entries best first
+        self._words: List[Tuple[str, float, str, Tuple[str, str]]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _postings(self, key: Tuple[str, str]):
+        entry = self._entries[key]
+        return [(word, -entry["volume"], entry["text"], key) for word in entry["words"]]
+
+    def _unlink(self, key: Tuple[str, str]):
+        for posting in self._postings(key):
+            position = bisect.bisect_left(self._words, posting)
+            if position < len(self._words) and self._words[position] == posting:
+                del self._words[position]
+        del self._entries[key]
+
+    def add(self, kind: str, slug: str, text: str, volume=None):
+        """Index (or re-index) the entry for `kind`/`slug`."""
+        if not slug or not text:
+            return
+        key = (kind, slug)
+        volume = _volume(volume)
+        current = self._entries.get(key)
+        if current is not None:
+            if current["text"] == text and current["volume"] == volume:
+                self._entries.move_to_end(key)
+                return
+            self._unlink(key)
+        self._entries[key] = {
+            "text": text,
+            "kind": kind,
+            "slug": slug,
+            "volume": volume,
+            "words": words(text),
+        }
+        for posting in self._postings(key):
+            bisect.insort(self._words, posting)
+        while len(self._entries) > self.max_entries:
+            self._unlink(next(iter(self._entries)))
+
+    def add_search(self, data: Dict):
+        """Index the events and open markets of a gamma `public-search` response."""
+        for event in data.get("events") or []:
+            self.add(
+                "event", event.get("slug"), event.get("title"), event.get("volume")
+            )
+            for market in event.get("markets") or []:
+                if market.get("active") is True and market.get("closed") is False:
+                    self.add_market(market)
+
+    def add_market(self, market: Dict):
+        """Index a market's slug and question, weighted by its volume."""
+        self.add(
+            "market", market.get("slug"), market.get("question"), market.get("volume")
+        )
+
+    def extend(self, markets: Iterable[Dict]):
+        """Index already projected markets (e.g. a cached search page)."""
+        for market in markets:
+            self.add_market(market)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        """Slice of `_words` holding the words that start with `prefix`."""
+        start = bisect.bisect_left(self._words, (prefix,))
+        end = bisect.bisect_left(self._words, (prefix + "\U0010ffff",), lo=start)
+        return start, end
+
+    def _ranked(self, start: int, end: int) -> Iterator:
+        """Postings of a prefix's slice, best entry first."""
+        runs = []
+        while start < end:
+            # Postings of one word are contiguous and already ranked
+            stop = bisect.bisect_left(
+                self._words, (self._words[start][0] + "\0",), start, end
+            )
+            runs.append(self._words[i] for i in range(start, stop))
+            start = stop
+        return heapq.merge(*runs, key=lambda posting: posting[1:3])
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        """Up to `limit` entries matching every word of `query`, by volume."""
+        prefixes = {word[:MAX_PREFIX] for word in words(query)}
+        if not prefixes:
+            return []
+        ranges = {prefix: self._range(prefix) for prefix in prefixes}
+        # Walk the rarest prefix's entries and check the others against them
+        driver = min(prefixes, key=lambda p: ranges[p][1] - ranges[p][0])
+        others = prefixes - {driver}
+        seen = set()
+        results = []
+        for _, _, _, key in self._ranked(*ranges[driver]):
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = self._entries[key]
+            if all(
+                any(word.startswith(prefix) for word in entry["words"])
+                for prefix in others
+            ):
+                results.append(
+                    {
+                        "text": entry["text"],
+                        "kind": entry["kind"],
+                        "slug": entry["slug"],
+                    }
+                )
+                if len(results) >= limit:
+                    break
+        return results
@@ -1,55 +1,270 @@
 "Historical price retrieval with caching and real time web socket data stream"
 
 import asyncio
+import json
+import logging
 import os
-from typing import Dict, List
+import threading
+import time
+from typing import Dict, List, Optional
 
 import httpx
-from aiocache import Cache, cached
-from aiocache.serializers import JsonSerializer
+import numpy as np
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
-from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import BookParams
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
+from redis import asyncio as aioredis
 from tenacity import (
+    RetryError,
     retry,
     retry_if_exception_type,
     stop_after_attempt,
     wait_exponential,
 )
 
-app = FastAPI(title="Polymarket historical price, clob price, and websocket price")
+from api import cache, candles, deadline, http_cache, ratelimit, timing
+from api.cache import tiered_cached
+from api.metrics import (
+    count_retry,
+    instrument,
+    record_cache,
+    track_upstream,
+)
+from api.orderbook import BookFeed, OrderBook, WatchList
+from api.prefetch import Prefetcher
+from api.resilience import CircuitBreaker, CircuitOpenError
+
+app = FastAPI(
+    title="Polymarket historical price, clob price, and websocket price",
+    default_response_class=ORJSONResponse,
+)
+deadline.install(app)
+ratelimit.install(app)
+instrument(app, "price_api")
+timing.install(app)
+cache.install(app)
+# Browsers and proxies may reuse a response for as long as it stays cached here
+http_cache.install(
+    app,
+    max_ages={
+        "/historical_prices": cache.namespace_ttl("candles"),
+        "/candles": cache.namespace_ttl("candles"),
+        "/clob": cache.namespace_ttl("clob_price"),
+    },
+)
+
+# Overridable so benchmarks can point the service at a local stand-in
+CLOB_URL = os.getenv("POLYMARKET_CLOB_URL", "https://clob.polymarket.com")
+HISTORICAL_PRICE_URL = f"{CLOB_URL}/prices-history"
+BOOK_URL = f"{CLOB_URL}/book"
+CLOB_WS_URL = os.getenv(
+    "POLYMARKET_WS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+)
+# Per-attempt upstream timeouts; shortened further by the caller's deadline
+HISTORY_TIMEOUT = 30
+CLOB_TIMEOUT = 10
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+# Last price seen per token, served (flagged stale) while the CLOB is down
+LAST_PRICE_TTL = int(os.getenv("LAST_PRICE_TTL", str(7 * 24 * 3600)))
+
+# POST /clob/batch: tokens per request, and per call to the CLOB
+CLOB_BATCH_MAX_TOKENS = 500
+CLOB_BATCH_CHUNK = int(os.getenv("CLOB_BATCH_CHUNK", "100"))
+
+_redis_clients: Dict[asyncio.AbstractEventLoop, aioredis.Redis] = {}
+
+
+def get_redis() -> aioredis.Redis:
+    """Redis client for the running event loop (connections are loop-bound)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _redis_clients:
+        _redis_clients[loop] = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+    return _redis_clients[loop]
+
+
+history_breaker = CircuitBreaker("prices-history")
+clob_breaker = CircuitBreaker("clob-prices")
+book_breaker = CircuitBreaker("clob-book")
 
-HISTORICAL_PRICE_URL = "https://clob.polymarket.com/prices-history"
+# Calls per second to clob.polymarket.com across all replicas
+CLOB_RATE_LIMIT = float(os.getenv("CLOB_RATE_LIMIT", "50"))
+CLOB_RATE_BURST = float(os.getenv("CLOB_RATE_BURST", "100"))
+clob_limiter = ratelimit.RateLimiter(
+    "clob", CLOB_RATE_LIMIT, CLOB_RATE_BURST, get_redis
+)
+
+# Resolution in minutes of the two series candle tiers are built from
+CANDLE_FINE_FIDELITY = int(os.getenv("CANDLE_FINE_FIDELITY", "1"))
+CANDLE_COARSE_FIDELITY = int(os.getenv("CANDLE_COARSE_FIDELITY", "60"))
 
+# Background warm-up requested by search_api for markets users are likely to open
+prefetcher = Prefetcher(
+    rate=float(os.getenv("PREFETCH_RATE", "5")),
+    concurrency=int(os.getenv("PREFETCH_CONCURRENCY", "2")),
+    dedup_seconds=float(os.getenv("PREFETCH_DEDUP_SECONDS", "300")),
+)
 
-# Default Redis cache settings
-DEFAULT_CACHE_SETTINGS = {
-    "cache": Cache.REDIS,
-    "endpoint": "redis",
-    "port": 6379,
-    "namespace": "historical",
-    "serializer": JsonSerializer(),
-    "ttl": 3600,  # 1 hour
-}
+# Order books of the tokens /fill_price was asked about, kept by the market channel
+book_feed = BookFeed(
+    CLOB_WS_URL,
+    WatchList(
+        max_tokens=int(os.getenv("ORDERBOOK_MAX_BOOKS", "200")),
+        idle_seconds=float(os.getenv("ORDERBOOK_IDLE_SECONDS", "600")),
+    ),
+)
 
 
-def historical_key_builder(func, *args, **kwargs):
-    """Key builder function for caching"""
-    return f"history:{kwargs['asset_id']}:{kwargs.get('interval', 'max')}"
+async def close_book_feed():
+    """Close the market-channel connection on shutdown."""
+    await book_feed.close()
+
+
+app.add_event_handler("shutdown", close_book_feed)
 
 
-# Fetch single asset from API with caching
-@cached(**DEFAULT_CACHE_SETTINGS, key_builder=historical_key_builder)
 async def fetch_historical(
     asset_id: str, interval: str = "1h", fidelity: int = 0
 ) -> Dict:
     """Method to get historical price of an asset from polymarket"""
     params = {"market": asset_id, "interval": interval, "fidelity": fidelity}
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(HISTORICAL_PRICE_URL, params=params)
-        resp.raise_for_status()
-        return resp.json()
+    await clob_limiter.acquire("chart")
+    timeout = deadline.timeout(HISTORY_TIMEOUT)
+    with history_breaker.guard(), track_upstream("prices-history"):
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.get(HISTORICAL_PRICE_URL, params=params)
+            resp.raise_for_status()
+            return resp.json()
+
+
+@tiered_cached("candles", key_builder=lambda f, asset_id: asset_id)
+async def get_candle_tiers(asset_id: str) -> Dict:
+    """
+    Candle tiers for every chart interval (api/candles.py), from two upstream
+    series: the last week at CANDLE_FINE_FIDELITY minutes, and the whole
+    history at CANDLE_COARSE_FIDELITY minutes for the older part.
+    """
+    fine, coarse = await asyncio.gather(
+        fetch_historical(
+            asset_id=asset_id, interval="1w", fidelity=CANDLE_FINE_FIDELITY
+        ),
+        fetch_historical(
+            asset_id=asset_id, interval="max", fidelity=CANDLE_COARSE_FIDELITY
+        ),
+    )
+    recent = fine.get("history") or []
+    first = min((point["t"] for point in recent), default=None)
+    older = [
+        point
+        for point in coarse.get("history") or []
+        if first is None or point["t"] < first
+    ]
+    return candles.build_pyramid(older + recent)
+
+
+async def gather_candles(assets: List[str], interval: str) -> Dict[str, Dict]:
+    """Selected candles per asset; assets whose tiers cannot be built are left out."""
+    responses = await asyncio.gather(
+        *(get_candle_tiers(asset_id=a) for a in assets), return_exceptions=True
+    )
+    result = {}
+    for asset, tiers in zip(assets, responses):
+        if isinstance(tiers, Exception):
+            logging.warning("Error fetching %s: %s", asset, tiers)
+            continue
+        result[asset] = candles.select(tiers, interval)
+    return result
+
+
+@app.get("/candles")
+async def get_candles(
+    assets: List[str] = Query(..., description="Asset IDs"),
+    interval: str = Query("1h", description="Chart interval"),
+):
+    """
+    OHLC candles per asset: {asset: {"interval", "width", "candles": [[t, o, h, l, c]]}}.
+    `width` is the candle length in seconds, chosen for the interval.
+    """
+    if interval not in candles.INTERVAL_WINDOWS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"interval must be one of {list(candles.INTERVAL_WINDOWS)}",
+        )
+    selected = await gather_candles(assets, interval)
+    return {
+        asset: {
+            "interval": interval,
+            "width": chosen["width"],
+            "candles": candles.as_rows(chosen),
+        }
+        for asset, chosen in selected.items()
+    }
+
+
+@tiered_cached(
+    "sparkline",
+    key_builder=lambda f, asset_id, interval, points: f"{asset_id}:{interval}:{points}",
+)
+async def get_sparkline(asset_id: str, interval: str, points: int) -> List[float]:
+    """`points` closes evenly spaced over the interval, from the candle tiers."""
+    closes = candles.select(await get_candle_tiers(asset_id=asset_id), interval)["c"]
+    if len(closes) > points:
+        picks = np.linspace(0, len(closes) - 1, points).round().astype(int)
+        closes = [closes[i] for i in picks.tolist()]
+    return [round(c, 4) for c in closes]
+
+
+class SparklineRequest(BaseModel):
+    """Body of /sparklines: tokens, chart interval and points per line."""
+
+    tokens: List[str] = Field(..., min_length=1, max_length=100)
+    interval: str = "1w"
+    points: int = Field(32, ge=2, le=128)
+
+
+@app.post("/sparklines")
+async def sparklines(body: SparklineRequest):
+    """
+    Small close-price series for many tokens in one response, read from the
+    cache only: {"sparklines": {token: [price, ...]}, "pending": [token, ...]}.
+
+    Tokens not cached yet are built in the background and listed under
+    "pending"; asking again a few seconds later returns them.
+    """
+    if body.interval not in candles.INTERVAL_WINDOWS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"interval must be one of {list(candles.INTERVAL_WINDOWS)}",
+        )
+    tokens = list(dict.fromkeys(body.tokens))
+    keys = [f"{t}:{body.interval}:{body.points}" for t in tokens]
+    try:
+        with timing.phase("cache"):
+            cached = await get_sparkline.cache.multi_get(keys)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.warning("Could not read sparklines: %s", e)
+        cached = [None] * len(tokens)
+
+    found, pending = {}, []
+    for token, series in zip(tokens, cached):
+        record_cache("sparkline", "miss" if series is None else "hit")
+        if series is not None:
+            found[token] = series
+            continue
+        pending.append(token)
+        prefetcher.schedule(
+            f"sparkline:{token}:{body.interval}:{body.points}",
+            lambda t=token: get_sparkline(
+                asset_id=t, interval=body.interval, points=body.points
+            ),
+        )
+    return {
+        "interval": body.interval,
+        "points": body.points,
+        "sparklines": found,
+        "pending": pending,
+    }
 
 
 # GET endpoint
@@ -64,46 +279,57 @@ async def get_historical_prices(
     """
     if not assets:
         return {}
-    # Fetch cached data per asset
-    tasks = [
-        fetch_historical(asset_id=a, interval=interval, fidelity=fidelity)
-        for a in assets
-    ]
-    responses = await asyncio.gather(*tasks, return_exceptions=True)
-
+    # Every interval is a lookup in the asset's cached candle tiers: the
+    # close of each candle, one candle per point
     result = {}
-    for asset, data in zip(assets, responses):
-        if isinstance(data, Exception):
-            print(f"Error fetching {asset}: {data}")
-            continue
+    for asset, selected in (await gather_candles(assets, interval)).items():
+        data = {"history": candles.as_history(selected)}
 
         # Apply fidelity filtering if specified
-        if fidelity is not None and isinstance(data, dict) and "history" in data:
+        if fidelity is not None:
             history = data["history"]
-            if isinstance(history, list) and len(history) > fidelity:
+            if len(history) > fidelity:
                 # Sample every Nth point to get approximately 'fidelity' points
                 step = max(1, len(history) // fidelity)
                 filtered_history = [history[i] for i in range(0, len(history), step)]
                 # Always include the last point
                 if len(filtered_history) == 0 or filtered_history[-1] != history[-1]:
                     filtered_history.append(history[-1])
-                data["history"] = filtered_history
+                data = {"history": filtered_history}
 
         result[asset] = data
 
     return result
 
 
-Cache.DEFAULT_SETTINGS = {
-    "cache": Cache.REDIS,
-    "endpoint": os.getenv("REDIS_HOST", "redis"),
-    "port": int(os.getenv("REDIS_PORT", 6379)),
-    "ttl": 5,  # short TTL for near-realtime prices
-    "serializer": JsonSerializer(),
-    "namespace": "clob_price",
-}
+_clob_client = None  # pylint: disable=invalid-name
+_clob_client_lock = threading.Lock()
+
+
+def get_clob_client():
+    """
+    The shared ClobClient, built on first use: py_clob_client pulls in the
+    order-signing stack and takes longer to import than the rest of the
+    service, so importing it is left to the first CLOB price request.
+    """
+    global _clob_client  # pylint: disable=global-statement
+    if _clob_client is None:
+        with _clob_client_lock:
+            if _clob_client is None:
+                # pylint: disable-next=import-outside-toplevel
+                from py_clob_client.client import ClobClient
+
+                _clob_client = ClobClient(CLOB_URL)
+    return _clob_client
 
-client = ClobClient("https://clob.polymarket.com")
+
+def get_clob_prices_sync(tokens: List[str]) -> Dict:
+    """ClobClient.get_prices for the BUY side of `tokens` (blocking)."""
+    # pylint: disable-next=import-outside-toplevel
+    from py_clob_client.clob_types import BookParams
+
+    client = get_clob_client()
+    return client.get_prices([BookParams(token_id=t, side="BUY") for t in tokens])
 
 
 class RetryableHTTPError(Exception):
@@ -115,24 +341,75 @@ class RetryableHTTPError(Exception):
 @retry(
     retry=retry_if_exception_type(RetryableHTTPError),
     wait=wait_exponential(multiplier=1, min=1, max=8),
-    stop=stop_after_attempt(5),
+    stop=stop_after_attempt(5) | deadline.stop_before_deadline(),
+    before_sleep=count_retry("clob_prices"),
 )
-async def fetch_clob_prices(tokens: List[str]):
-    """Fetch real-time prices from CLOB with retry/backoff"""
+async def fetch_clob_price_map(tokens: List[str]) -> Dict[str, str]:
+    """Fetch real-time prices from CLOB with retry/backoff, keyed by token"""
     try:
-        book_params = [BookParams(token_id=t, side="BUY") for t in tokens]
-        prices = client.get_prices(book_params)
+        # An open breaker fails fast without spending a rate-limit token
+        with clob_breaker.guard():
+            await clob_limiter.acquire("valuation")
+            attempt_timeout = deadline.timeout(CLOB_TIMEOUT)
+            with track_upstream("clob-prices"):
+                # ClobClient is synchronous: keep it off the event loop and
+                # stop waiting for it when the attempt's time is up
+                prices = await asyncio.wait_for(
+                    asyncio.to_thread(get_clob_prices_sync, tokens), attempt_timeout
+                )
+    except (CircuitOpenError, deadline.DeadlineExceeded):
+        raise
     except Exception as e:
         raise RetryableHTTPError(f"Failed to fetch CLOB prices: {e}") from e
 
-    result = []
-    for _, p in prices.items():
-        result.append(p["BUY"])
-    return result
+    price_map = {token: p["BUY"] for token, p in prices.items()}
+    await remember_prices(price_map)
+    return price_map
+
+
+async def fetch_clob_prices(tokens: List[str]):
+    """Real-time prices from CLOB, in the order the CLOB returns them"""
+    return list((await fetch_clob_price_map(tokens)).values())
+
+
+async def remember_prices(prices: Dict[str, str]):
+    """Store each token's latest price with the time it was fetched."""
+    if not prices:
+        return
+    now = time.time()
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for token, price in prices.items():
+                pipe.set(
+                    f"last_price:{token}",
+                    json.dumps({"price": price, "ts": now}),
+                    ex=LAST_PRICE_TTL,
+                )
+            await pipe.execute()
+    except Exception as e:
+        logging.warning("Could not store last known prices: %s", e)
+
+
+async def read_last_prices(tokens: List[str]) -> Optional[List[Optional[Dict]]]:
+    """{"price", "ts"} or None per token; None if Redis cannot be read."""
+    try:
+        raw = await get_redis().mget([f"last_price:{t}" for t in tokens])
+    except Exception as e:
+        logging.warning("Could not read last known prices: %s", e)
+        return None
+    return [None if value is None else json.loads(value) for value in raw]
+
 
+async def last_known_prices(tokens: List[str]) -> Optional[List[Dict]]:
+    """[{"price", "ts"}] per token, or None unless every token has one."""
+    known = await read_last_prices(tokens)
+    if known is None or any(entry is None for entry in known):
+        return None
+    return known
 
-@cached(
-    key_builder=lambda f, *args, **kwargs: "clob:" + "_".join(str(t) for t in args[0])
+
+@tiered_cached(
+    "clob_price", key_builder=lambda f, tokens: "_".join(str(t) for t in tokens)
 )
 async def get_clob_prices(tokens: List[str]):
     """Cached wrapper around fetch_clob_prices."""
@@ -151,6 +428,155 @@ async def clob_endpoint(
     token_list = [t.strip() for t in tokens.split(",") if t.strip()]
     if not token_list:
         raise HTTPException(status_code=400, detail="No valid tokens provided")
-    result = await get_clob_prices(token_list)
-    print("IN CLOB ", result)
-    return JSONResponse(result)
+    try:
+        result = await get_clob_prices(token_list)
+    except (CircuitOpenError, RetryError, RetryableHTTPError) as e:
+        return await stale_clob_response(token_list, e)
+    return ORJSONResponse(result)
+
+
+async def stale_clob_response(tokens: List[str], error: Exception) -> ORJSONResponse:
+    """
+    Answer /clob from the last known prices while the CLOB is unavailable.
+
+    The body keeps the usual list-of-prices shape so existing callers work
+    unchanged; `X-Stale: true` and `Age` (seconds, oldest price) flag it.
+    """
+    known = await last_known_prices(tokens)
+    if known is None:
+        record_cache("last_price", "miss")
+        retry_after = max(1, round(clob_breaker.seconds_until_retry()))
+        raise HTTPException(
+            status_code=503,
+            detail=f"CLOB unavailable and no last known price: {error}",
+            headers={"Retry-After": str(retry_after)},
+        )
+    record_cache("last_price", "stale")
+    age = max(0, int(time.time() - min(entry["ts"] for entry in known)))
+    return ORJSONResponse(
+        [entry["price"] for entry in known],
+        headers={"X-Stale": "true", "Age": str(age)},
+    )
+
+
+class BatchPriceRequest(BaseModel):
+    """Body of /clob/batch: the tokens to price."""
+
+    tokens: List[str] = Field(..., min_length=1, max_length=CLOB_BATCH_MAX_TOKENS)
+
+
+@app.post("/clob/batch")
+async def clob_batch(body: BatchPriceRequest):
+    """
+    Prices for many tokens at once, keyed by token: {"prices": {token: price}}.
+
+    The tokens are fetched from the CLOB in chunks of CLOB_BATCH_CHUNK, in
+    parallel. A chunk the CLOB cannot answer is filled from the last known
+    prices and its tokens are listed under "stale"; tokens with no price at
+    all are left out.
+    """
+    tokens = list(dict.fromkeys(t.strip() for t in body.tokens if t.strip()))
+    chunks = [
+        tokens[i : i + CLOB_BATCH_CHUNK]
+        for i in range(0, len(tokens), CLOB_BATCH_CHUNK)
+    ]
+    results = await asyncio.gather(
+        *(fetch_clob_price_map(chunk) for chunk in chunks), return_exceptions=True
+    )
+
+    prices: Dict[str, float] = {}
+    stale: List[str] = []
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logging.warning("Batch of %d CLOB prices failed: %s", len(chunk), result)
+            known = await read_last_prices(chunk) or [None] * len(chunk)
+            record_cache("last_price", "stale" if any(known) else "miss")
+            result = {t: entry["price"] for t, entry in zip(chunk, known) if entry}
+            stale.extend(result)
+        for token, price in result.items():
+            try:
+                prices[token] = float(price)
+            except (TypeError, ValueError):
+                continue
+    return {"prices": prices, "stale": stale}
+
+
+class PrefetchRequest(BaseModel):
+    """Body of /prefetch: the tokens to warm."""
+
+    tokens: List[str] = Field(..., max_length=100)
+
+
+@app.post("/prefetch", status_code=202)
+async def prefetch(body: PrefetchRequest):
+    """
+    Warm the candle and CLOB price caches for `tokens` in the background.
+    Returns at once; jobs already scheduled recently are skipped.
+    """
+    scheduled = 0
+    for token in dict.fromkeys(body.tokens):
+        scheduled += prefetcher.schedule(
+            f"candles:{token}",
+            lambda t=token: ratelimit.in_lane(
+                "chart", lambda: get_candle_tiers(asset_id=t)
+            ),
+        )
+        scheduled += prefetcher.schedule(
+            f"clob:{token}",
+            lambda t=token: ratelimit.in_lane("chart", lambda: get_clob_prices([t])),
+        )
+    return {"scheduled": scheduled}
+
+
+async def fetch_book(token: str) -> Dict:
+    """Order book snapshot of `token` from the CLOB REST API."""
+    # An open breaker fails fast without spending a rate-limit token
+    with book_breaker.guard():
+        await clob_limiter.acquire("valuation")
+        timeout = deadline.timeout(CLOB_TIMEOUT)
+        with track_upstream("clob-book"):
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                resp = await client.get(BOOK_URL, params={"token_id": token})
+                resp.raise_for_status()
+                return resp.json()
+
+
+@app.get("/fill_price")
+async def fill_price(
+    token: str = Query(..., min_length=1),
+    notional: float = Query(..., gt=0, description="Dollars to spend or receive"),
+    side: str = Query("BUY", pattern="^(BUY|SELL)$"),
+    local: bool = Query(False, description="Only use the streamed book"),
+):
+    """
+    Average price of filling `notional` dollars against `token`'s order book.
+
+    The book is the local copy kept by the market channel; until its first
+    snapshot arrives (or while the channel is down) a REST snapshot is used,
+    and `source` says which. With `local`, there is no REST fallback: the
+    answer is 404 until the streamed book is live. See `OrderBook.fill` for
+    the other fields.
+    """
+    book = book_feed.watch(token)
+    source = "stream"
+    if book is None and local:
+        raise HTTPException(status_code=404, detail="No streamed order book yet")
+    if book is None:
+        try:
+            book = OrderBook(await fetch_book(token))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise HTTPException(status_code=404, detail="No order book") from e
+            raise HTTPException(status_code=503, detail=str(e)) from e
+        except (CircuitOpenError, httpx.HTTPError) as e:
+            raise HTTPException(
+                status_code=503, detail=f"Order book unavailable: {e}"
+            ) from e
+        source = "snapshot"
+    return {
+        "token": token,
+        "side": side,
+        "notional": notional,
+        "source": source,
+        **book.fill(notional, side),
+    }
@@ -0,0 +1,239 @@
+"""
+Cluster-wide upstream rate limiting with priority lanes.
+
+Every replica of a service takes its upstream calls from one token bucket in
+Redis (`ratelimit:<name>`, refilled at `rate` tokens per second up to
+`burst`), so the replicas share one budget however many of them run. Tokens
+are taken in a WATCH/MULTI transaction timed by Redis' clock.
+
+Calls are made in a lane, highest priority first:
+
+    trade      price lookups executing a trade
+    valuation  prices for portfolio values and the leaderboard
+    chart      price history, candles and background warm-up
+
+Across replicas, a lane may only take a token while the bucket keeps the
+share of `burst` reserved for the lanes above it (`RESERVES`), so a storm of
+chart loads empties the bucket down to the valuation and trade reserve and
+no further. Within a replica, waiting calls are served strictly by lane, then
+in arrival order. The number of waiting calls per lane is exported as the
+`upstream_rate_limit_waiting` gauge.
+
+Callers pick their lane with the `X-Priority` header (see `install`);
+otherwise each call site's default lane applies. If Redis cannot be reached
+the limiter lets calls through rather than failing them.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from prometheus_client import Gauge, Histogram
+from redis import asyncio as aioredis
+
+from api import timing
+
+HEADER = "x-priority"
+LANES = ("trade", "valuation", "chart")
+# Share of the bucket each lane must leave for the lanes above it
+RESERVES = {"trade": 0.0, "valuation": 0.1, "chart": 0.3}
+
+RATE_LIMIT_WAITING = Gauge(
+    "upstream_rate_limit_waiting",
+    "Upstream calls waiting for a rate-limit token, by lane",
+    ["upstream", "lane"],
+    multiprocess_mode="livesum",
+)
+RATE_LIMIT_WAIT = Histogram(
+    "upstream_rate_limit_wait_seconds",
+    "Time upstream calls waited for a rate-limit token, by lane",
+    ["upstream", "lane"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+_lane: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "lane", default=None
+)
+
+
+def current_lane(default: str) -> str:
+    """The lane the caller asked for, or `default`."""
+    return _lane.get() or default
+
+
+@contextmanager
+def lane(name: str):
+    """Run the enclosed calls in lane `name`."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+async def in_lane(name: str, job: Callable):
+    """Await `job()` in lane `name`, e.g. for background jobs."""
+    with lane(name):
+        return await job()
+
+
+class SharedBucket:  # pylint: disable=too-few-public-methods
+    """Token bucket in Redis shared by every replica."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        get_client: Callable[[], aioredis.Redis],
+    ):
+        if rate <= 0:
+            raise ValueError(f"rate limit {name} needs a rate > 0, got {rate}")
+        if burst < 1:
+            raise ValueError(f"rate limit {name} needs a burst >= 1, got {burst}")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.key = f"ratelimit:{name}"
+        self._get_client = get_client
+
+    async def take(self, lane_name: str) -> float:
+        """Take a token for `lane_name`; returns 0, or the seconds to wait."""
+        # Tokens the lane must leave; a full bucket always serves every lane
+        floor = min(RESERVES.get(lane_name, 0.0) * self.burst, self.burst - 1)
+
+        async def attempt(pipe):
+            seconds, micros = await pipe.time()
+            now = seconds + micros / 1e6
+            tokens, stamp = await pipe.hmget(self.key, "tokens", "ts")
+            tokens = self.burst if tokens is None else float(tokens)
+            elapsed = 0.0 if stamp is None else max(0.0, now - float(stamp))
+            tokens = min(self.burst, tokens + elapsed * self.rate)
+            wait = 0.0
+            if tokens - 1 >= floor:
+                tokens -= 1
+            else:
+                wait = (floor + 1 - tokens) / self.rate
+            pipe.multi()
+            pipe.hset(self.key, mapping={"tokens": tokens, "ts": now})
+            pipe.expire(self.key, int(self.burst / self.rate) + 60)
+            return wait
+
+        return await self._get_client().transaction(
+            attempt, self.key, value_from_callable=True
+        )
+
+
+class RateLimiter(SharedBucket):
+    """`SharedBucket` whose waiting calls are served by lane in this replica."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        get_client: Callable[[], aioredis.Redis],
+    ):
+        super().__init__(name, rate, burst, get_client)
+        self._waiters: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._counts = dict.fromkeys(LANES, 0)
+        self._order = itertools.count()
+        self._arrived: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def waiting(self) -> Dict[str, int]:
+        """Calls waiting in this replica, by lane."""
+        return dict(self._counts)
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures and tasks belong to one event loop
+            self._loop = loop
+            self._waiters = []
+            self._arrived = asyncio.Event()
+            self._dispatcher = None
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(
+                self._dispatch(), context=contextvars.Context()
+            )
+
+    async def _dispatch(self):
+        while self._waiters:
+            _, _, lane_name, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            # Cleared before asking Redis so an arrival meanwhile is not lost
+            self._arrived.clear()
+            try:
+                wait = await self.take(lane_name)
+            except Exception as e:  # pylint: disable=broad-except
+                logging.warning("Rate limiter %s unavailable: %s", self.name, e)
+                wait = 0.0
+            if wait <= 0:
+                heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                continue
+            # Sleep until a token is due, or until another call arrives
+            try:
+                await asyncio.wait_for(self._arrived.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(self, default_lane: str = "valuation"):
+        """Wait for a token in the caller's lane (or `default_lane`)."""
+        lane_name = current_lane(default_lane)
+        if lane_name not in LANES:
+            lane_name = default_lane
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters,
+            (LANES.index(lane_name), next(self._order), lane_name, future),
+        )
+        self._arrived.set()
+        self._counts[lane_name] += 1
+        gauge = RATE_LIMIT_WAITING.labels(self.name, lane_name)
+        gauge.inc()
+        started = time.perf_counter()
+        try:
+            await future
+        finally:
+            # Cancelled waiters are dropped by the dispatcher
+            future.cancel()
+            self._counts[lane_name] -= 1
+            gauge.dec()
+            waited = time.perf_counter() - started
+            RATE_LIMIT_WAIT.labels(self.name, lane_name).observe(waited)
+            timing.record("ratelimit", waited)
+
+
+class PriorityMiddleware:  # pylint: disable=too-few-public-methods
+    """ASGI middleware running each request in the lane named by `X-Priority`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        requested = None
+        if scope["type"] == "http":
+            requested = dict(scope["headers"]).get(HEADER.encode(), b"").decode()
+        if requested not in LANES:
+            await self.app(scope, receive, send)
+            return
+        with lane(requested):
+            await self.app(scope, receive, send)
+
+
+def install(app: FastAPI):
+    """Let callers of `app` pick their lane with the `X-Priority` header."""
+    app.add_middleware(PriorityMiddleware)
@@ -0,0 +1,139 @@
+"Circuit breakers that stop the services from hammering an upstream that is down"
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from api.deadline import DeadlineExceeded
+
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Breaker state per upstream: 0 closed, 1 half-open, 2 open",
+    ["upstream"],
+    multiprocess_mode="max",
+)
+BREAKER_REJECTIONS = Counter(
+    "circuit_breaker_rejections_total",
+    "Calls refused without contacting the upstream because its breaker was open",
+    ["upstream"],
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+def is_upstream_failure(exc: Exception) -> bool:
+    """
+    Whether `exc` says the upstream is unhealthy: transport errors, 429 and
+    5xx do; other 4xx are about the request and leave the breaker alone.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return True
+
+
+class CircuitBreaker:  # pylint: disable=too-many-instance-attributes
+    """
+    Consecutive-failure breaker for one upstream.
+
+    closed:    calls go through; `failure_threshold` failures in a row open it.
+    open:      calls fail fast with CircuitOpenError for `cooldown` seconds.
+    half-open: one probe call is let through; success closes the breaker,
+               failure opens it for another cooldown.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half-open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        cooldown: float = COOLDOWN_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._state = self.CLOSED
+        BREAKER_STATE.labels(name).set(0)
+
+    @property
+    def state(self) -> str:
+        """closed, half-open or open; open turns half-open after the cooldown."""
+        if (
+            self._state == self.OPEN
+            and self._clock() - self._opened_at >= self.cooldown
+        ):
+            self._set_state(self.HALF_OPEN)
+        return self._state
+
+    def _set_state(self, state: str):
+        self._state = state
+        BREAKER_STATE.labels(self.name).set(self._STATE_VALUES[state])
+
+    def before_call(self):
+        """Claim permission for one call or raise CircuitOpenError."""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probing):
+            BREAKER_REJECTIONS.labels(self.name).inc()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if state == self.HALF_OPEN:
+            self._probing = True
+
+    def record_success(self):
+        """Close the breaker and reset the failure count."""
+        self._failures = 0
+        self._probing = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        """Count a failure; open the breaker at the threshold or on a failed probe."""
+        self._failures += 1
+        probe_failed = self._probing
+        self._probing = False
+        if probe_failed or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            self._set_state(self.OPEN)
+
+    def seconds_until_retry(self) -> float:
+        """How long an open breaker keeps refusing calls; 0 otherwise."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (self._clock() - self._opened_at))
+
+    @contextmanager
+    def guard(self):
+        """Run the enclosed upstream call under the breaker."""
+        self.before_call()
+        try:
+            yield
+        except DeadlineExceeded:
+            # Our caller ran out of time: says nothing about the upstream
+            self._probing = False
+            raise
+        except Exception as exc:
+            if is_upstream_failure(exc):
+                self.record_failure()
+            else:
+                # The upstream answered, it just refused this request
+                self.record_success()
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the upstream, but free the probe slot
+            self._probing = False
+            raise
+        self.record_success()
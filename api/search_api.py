@@ -1,22 +1,35 @@
 "API to search polymarket"
 
 import asyncio
+import json
 import logging
 import os
 import sys
-from typing import Dict, Set
+from typing import Dict, List, Optional, Set
 
 import httpx
-from aiocache import Cache, cached
-from aiocache.serializers import JsonSerializer
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator
 
-SEARCH_URL = "https://gamma-api.polymarket.com/public-search"
+from api import cache, deadline, http_cache, timing
+from api.cache import tiered_cached
+from api.metrics import instrument, track_upstream
+from api.prefetch import Prefetcher
+from api.prefix_index import PrefixIndex
+from api.resilience import CircuitBreaker, CircuitOpenError
 
-# Redis Config
-REDIS_HOST = os.getenv("REDIS_HOST", "redis")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+# Overridable so benchmarks can point the service at a local stand-in
+GAMMA_URL = os.getenv("POLYMARKET_GAMMA_URL", "https://gamma-api.polymarket.com")
+SEARCH_URL = f"{GAMMA_URL}/public-search"
+MARKETS_URL = f"{GAMMA_URL}/markets"
+# Token ids per gamma /markets request made for POST /resolutions
+RESOLUTION_CHUNK = 50
+
+# Warm price_api's caches for the first markets of each result page
+PRICE_SERVICE_URL = os.getenv("PRICE_SERVICE_URL", "http://localhost:8002")
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "5"))
+AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv("AUTOCOMPLETE_MAX_ENTRIES", "50000"))
 
 logging.basicConfig(
     level=logging.INFO,  # INFO and above
@@ -24,28 +37,94 @@ logging.basicConfig(
     stream=sys.stdout,  # ensure it goes to stdout for Docker
 )
 
-app = FastAPI(title="Polymarket Search")
-
-# --- REDIS CACHE SETUP ---
-try:
-    Cache.DEFAULT_SETTINGS = {
-        "cache": "aiocache.RedisCache",
-        "endpoint": REDIS_HOST,
-        "port": REDIS_PORT,
-        "ttl": 60,
-        "serializer": JsonSerializer(),
-        "namespace": "search",
-    }
-except Exception:
-    print("Redis not configured, caching disabled.")
+app = FastAPI(title="Polymarket Search", default_response_class=ORJSONResponse)
+deadline.install(app)
+instrument(app, "search_api")
+timing.install(app)
+cache.install(app)
+http_cache.install(app, max_ages={"/search": cache.namespace_ttl("search")})
+
+search_breaker = CircuitBreaker("public-search")
+markets_breaker = CircuitBreaker("markets")
+prefetcher = Prefetcher(rate=float(os.getenv("PREFETCH_RATE", "5")), concurrency=1)
+# Filled from the search responses this process sees; see /autocomplete
+suggestions = PrefixIndex(max_entries=AUTOCOMPLETE_MAX_ENTRIES)
 
 asset_queues: Dict[str, Set[asyncio.Queue]] = {}
 asset_connections: Dict[str, "PolymarketWS"] = {}
 
 
-@cached(key_builder=lambda f, *args, **kwargs: f"page:{args[0]}:{args[0]}")
-async def get_polymarket_search(q: str, page: int):
-    """Method to search polymarket"""
+class MarketSummary(BaseModel):
+    """The fields of a gamma market the web app renders, with lists decoded."""
+
+    id: str
+    slug: str
+    question: str
+    description: str = ""
+    category: Optional[str] = None
+    region: Optional[str] = None
+    volume: Optional[float] = None
+    endDate: Optional[str] = None
+    updatedAt: Optional[str] = None
+    outcomes: List[str] = []
+    outcomePrices: List[float] = []
+    clobTokenIds: List[str] = []
+
+    @field_validator("outcomes", "outcomePrices", "clobTokenIds", mode="before")
+    @classmethod
+    def decode_json_list(cls, value):
+        """Decode the JSON-encoded strings gamma sends for these lists."""
+        if isinstance(value, str):
+            return json.loads(value) if value else []
+        return value if value is not None else []
+
+
+class Pagination(BaseModel):
+    """Paging info of a gamma search response."""
+
+    page: int
+    hasMore: bool = False
+    totalResults: Optional[int] = None
+
+
+class SearchPage(BaseModel):
+    """What /search returns: one page of open markets."""
+
+    markets: List[MarketSummary]
+    pagination: Pagination
+
+
+def project_markets(data: Dict) -> List[Dict]:
+    """Open markets of a gamma search response as `MarketSummary` dicts."""
+    markets = []
+    for event in data.get("events") or []:
+        for market in event.get("markets") or []:
+            if market.get("active") is not True or market.get("closed") is not False:
+                continue
+            try:
+                summary = MarketSummary.model_validate(market)
+            except (ValidationError, ValueError) as e:
+                logging.info("Skipping malformed market %s: %s", market.get("id"), e)
+                continue
+            markets.append(summary.model_dump(exclude_none=True))
+    return markets
+
+
+def project_search(data: Dict, page: int) -> Dict:
+    """Slim `SearchPage` of a gamma search response: open markets plus paging."""
+    pagination = data.get("pagination") or {}
+    return {
+        "markets": project_markets(data),
+        "pagination": {
+            "page": page,
+            "hasMore": bool(pagination.get("hasMore", False)),
+            "totalResults": pagination.get("totalResults"),
+        },
+    }
+
+
+async def fetch_polymarket_search(q: str, page: int) -> Dict:
+    """Raw gamma `public-search` response for one page"""
     params = {
         "q": q,
         "cache": "true",
@@ -55,22 +134,164 @@ async def get_polymarket_search(q: str, page: int):
         "ascending": "false",
         "page": page,
     }
-    print(params)
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(SEARCH_URL, params=params)
+    timeout = deadline.timeout(30)
+    with search_breaker.guard(), track_upstream("public-search"):
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.get(SEARCH_URL, params=params)
+            # Raise rather than cache the error; only 5xx/429 count against the breaker
+            resp.raise_for_status()
     return resp.json()
 
 
-@app.get("/search")
+@tiered_cached("search", key_builder=lambda f, q, page: f"{q.lower()}:{page}")
+async def get_polymarket_search(q: str, page: int) -> Dict:
+    """Method to search polymarket; only the slim projection is cached"""
+    data = await fetch_polymarket_search(q, page)
+    suggestions.add_search(data)
+    return project_search(data, page)
+
+
+def top_tokens(data: Dict, limit: int) -> List[str]:
+    """CLOB token ids of the first `limit` markets of a search page."""
+    return [
+        token
+        for market in (data.get("markets") or [])[:limit]
+        for token in market.get("clobTokenIds") or []
+    ]
+
+
+async def request_prefetch(tokens: List[str]):
+    """POST `tokens` to price_api's /prefetch."""
+    async with httpx.AsyncClient(timeout=2) as client:
+        resp = await client.post(
+            f"{PRICE_SERVICE_URL}/prefetch", json={"tokens": tokens}
+        )
+        resp.raise_for_status()
+
+
+def schedule_prefetch(q: str, page: int, data: Dict):
+    """Ask price_api to warm the markets the user will most likely open next."""
+    if PREFETCH_TOP_N <= 0 or not isinstance(data, dict):
+        return
+    tokens = top_tokens(data, PREFETCH_TOP_N)
+    if tokens:
+        prefetcher.schedule(
+            f"search:{q.lower()}:{page}", lambda: request_prefetch(tokens)
+        )
+
+
+@app.get("/search", response_model=SearchPage)
 async def search(q: str = Query(..., min_length=1), page: int = 1):
     """Helper to search markets"""
     if page < 0:
         raise HTTPException(status_code=422, detail="Invalid page number")
     try:
         data = await get_polymarket_search(q, page)
-        return JSONResponse(data)
+        # Pages cached by another worker still teach this one their markets
+        suggestions.extend(data.get("markets") or [])
+        schedule_prefetch(q, page, data)
+        return ORJSONResponse(data)
+    except deadline.DeadlineExceeded:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Search is temporarily unavailable",
+            headers={
+                "Retry-After": str(max(1, round(search_breaker.seconds_until_retry())))
+            },
+        ) from e
     except Exception as e:
         logging.error("Search error: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500, detail=f"Could not retrieve query detail={e}"
         ) from e
+
+
+@app.get("/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+):
+    """
+    Market questions and event titles matching `q` as it is typed:
+    {"suggestions": [{"text", "kind", "slug"}]}. Served from the local
+    prefix index only, never from gamma.
+    """
+    return {"suggestions": suggestions.suggest(q, limit)}
+
+
+def resolved_payouts(market: Dict) -> Dict[str, float]:
+    """
+    Payout per share of each token of a resolved gamma market, e.g.
+    {yes_token: 1.0, no_token: 0.0}; empty while the market is undecided.
+    A market is resolved once it is closed and its outcome prices have
+    settled to the payouts: 0 or 1, or 0.5 each for a market resolved 50-50.
+    """
+    if market.get("closed") is not True:
+        return {}
+    try:
+        summary = MarketSummary.model_validate(market)
+    except (ValidationError, ValueError):
+        return {}
+    prices, tokens = summary.outcomePrices, summary.clobTokenIds
+    if not tokens or len(prices) != len(tokens) or sum(prices) != 1:
+        return {}
+    if any(price not in (0, 0.5, 1) for price in prices):
+        return {}
+    return dict(zip(tokens, map(float, prices)))
+
+
+async def fetch_resolutions(tokens: List[str]) -> Dict[str, float]:
+    """Payouts of the `tokens` whose markets have resolved, from gamma /markets."""
+    params = [("closed", "true"), ("limit", str(len(tokens)))]
+    params += [("clob_token_ids", token) for token in tokens]
+    timeout = deadline.timeout(30)
+    with markets_breaker.guard(), track_upstream("markets"):
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.get(MARKETS_URL, params=params)
+            resp.raise_for_status()
+    wanted = set(tokens)
+    payouts = {}
+    for market in resp.json() or []:
+        for token, payout in resolved_payouts(market).items():
+            if token in wanted:
+                payouts[token] = payout
+    return payouts
+
+
+class ResolutionRequest(BaseModel):
+    """Body of /resolutions: the tokens to check for a payout."""
+
+    tokens: List[str] = Field(..., min_length=1, max_length=500)
+
+
+@app.post("/resolutions")
+async def resolutions(body: ResolutionRequest):
+    """
+    Which of `tokens` belong to resolved markets, and what each share pays:
+    {"resolved": {token: payout}}. Tokens of open markets are left out.
+    """
+    tokens = list(dict.fromkeys(body.tokens))
+    chunks = [
+        tokens[i : i + RESOLUTION_CHUNK]
+        for i in range(0, len(tokens), RESOLUTION_CHUNK)
+    ]
+    try:
+        results = await asyncio.gather(*(fetch_resolutions(c) for c in chunks))
+    except deadline.DeadlineExceeded:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Market data is temporarily unavailable",
+            headers={
+                "Retry-After": str(max(1, round(markets_breaker.seconds_until_retry())))
+            },
+        ) from e
+    except Exception as e:
+        logging.error("Resolution lookup error: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=502, detail=f"Could not look up resolutions: {e}"
+        ) from e
+    return {"resolved": {t: p for result in results for t, p in result.items()}}
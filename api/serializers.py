@@ -0,0 +1,104 @@
+"""
+Cache serializers that are cheaper than aiocache's stdlib-json JsonSerializer.
+
+Pick one with CACHE_SERIALIZER (orjson, msgpack or json) and optionally
+compress larger values with CACHE_COMPRESSION=zstd; `benchmarks/serialization.py`
+compares them on real-sized payloads.
+"""
+
+import os
+
+import msgpack
+import orjson
+import zstandard
+from aiocache.serializers import BaseSerializer, JsonSerializer
+
+
+class OrjsonSerializer(BaseSerializer):
+    """JSON via orjson; values are stored as bytes."""
+
+    DEFAULT_ENCODING = None
+
+    def dumps(self, value):
+        return orjson.dumps(value)
+
+    def loads(self, value):
+        if value is None:
+            return None
+        return orjson.loads(value)
+
+
+class MsgpackSerializer(BaseSerializer):
+    """msgpack with str/bytes kept apart; smaller than JSON for numeric series."""
+
+    DEFAULT_ENCODING = None
+
+    def dumps(self, value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, value):
+        if value is None:
+            return None
+        return msgpack.unpackb(value, raw=False)
+
+
+class ZstdSerializer(BaseSerializer):
+    """
+    Wraps a bytes serializer and zstd-compresses values of at least
+    `min_size` bytes. A one-byte header records whether a value was
+    compressed, so small values skip the compression cost.
+    """
+
+    DEFAULT_ENCODING = None
+    _RAW, _ZSTD = b"\x00", b"\x01"
+
+    def __init__(self, inner, level=3, min_size=1024, **kwargs):
+        super().__init__(**kwargs)
+        self.inner = inner
+        self.min_size = min_size
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, value):
+        data = self.inner.dumps(value)
+        if len(data) < self.min_size:
+            return self._RAW + data
+        return self._ZSTD + self._compressor.compress(data)
+
+    def loads(self, value):
+        if value is None:
+            return None
+        body = value[1:]
+        if value[:1] == self._ZSTD:
+            body = self._decompressor.decompress(body)
+        return self.inner.loads(body)
+
+
+SERIALIZERS = {
+    "json": JsonSerializer,
+    "orjson": OrjsonSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+
+def get_serializer(name=None, compression=None):
+    """
+    Serializer configured by CACHE_SERIALIZER / CACHE_COMPRESSION, or by the
+    arguments. Compression needs a bytes serializer (orjson or msgpack).
+    """
+    name = name or os.getenv("CACHE_SERIALIZER", "orjson")
+    compression = compression or os.getenv("CACHE_COMPRESSION", "none")
+    if name not in SERIALIZERS:
+        raise ValueError(
+            f"CACHE_SERIALIZER must be one of {', '.join(SERIALIZERS)}, got {name!r}"
+        )
+    serializer = SERIALIZERS[name]()
+    if compression == "zstd":
+        if name == "json":
+            raise ValueError("CACHE_COMPRESSION=zstd needs orjson or msgpack")
+        return ZstdSerializer(
+            serializer, min_size=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+        )
+    if compression != "none":
+        raise ValueError(f"CACHE_COMPRESSION must be none or zstd, got {compression!r}")
+    return serializer
@@ -0,0 +1,528 @@
+"""
+Local Polymarket upstream simulator for benchmarking without a network.
+
+Serves the parts of Polymarket the services call: gamma `/public-search` and
+`/markets`, CLOB `/prices-history`, `/prices`, `/book` and the market WebSocket
+channel at `/ws/market`. Markets are generated deterministically from
+SIM_SEED and each token's price follows a mean-reverting random walk (AR(1)
+in logit space) keyed on absolute time, so every interval of every request
+agrees.
+
+Faults are configured through environment variables, or at runtime with
+POST /_sim/config:
+
+    SIM_LATENCY_MS   base delay added to every upstream response
+    SIM_JITTER_MS    extra uniformly distributed delay
+    SIM_ERROR_RATE   fraction of requests answered with 503 (0-1)
+    SIM_RATE_LIMIT   requests per second before answering 429 (0 = off)
+
+Point the services at it with POLYMARKET_GAMMA_URL / POLYMARKET_CLOB_URL
+(and POLYMARKET_WS_URL for the market channel).
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+import random
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from api.candles import INTERVAL_WINDOWS
+
+app = FastAPI(title="Polymarket upstream simulator")
+
+SEED = int(os.getenv("SIM_SEED", "0"))
+MARKET_COUNT = int(os.getenv("SIM_MARKETS", "600"))
+MARKETS_PER_EVENT = 3
+PAGE_SIZE = int(os.getenv("SIM_PAGE_SIZE", "10"))
+# Resolution of the simulated walk and how often the WebSocket pushes updates
+STEP_SECONDS = int(os.getenv("SIM_STEP_SECONDS", "60"))
+TICK_SECONDS = float(os.getenv("SIM_TICK_SECONDS", "1"))
+# Walks start here so any point in time can be reproduced
+EPOCH = int(os.getenv("SIM_EPOCH", "1735689600"))  # 2025-01-01T00:00:00Z
+BLOCK_STEPS = 1440
+WARMUP_BLOCKS = 64
+REVERSION = 1e-4
+VOLATILITY = 0.01
+BOOK_LEVELS = 10
+TICK_SIZE = 0.01
+
+SUBJECTS = (
+    "bitcoin",
+    "ethereum",
+    "the fed",
+    "the election",
+    "world cup",
+    "weather",
+    "inflation",
+    "the senate",
+    "spacex",
+    "openai",
+    "the nba finals",
+    "oil",
+)
+PREDICATES = (
+    "reach a new all-time high",
+    "cut rates",
+    "be decided",
+    "beat expectations",
+    "happen",
+    "drop below last year's level",
+    "announce a deal",
+    "break the record",
+)
+MONTHS = ("January", "March", "June", "September", "December")
+
+
+class SimConfig(BaseModel):
+    """Fault-injection settings; every field is optional on update."""
+
+    latency_ms: float = float(os.getenv("SIM_LATENCY_MS", "0"))
+    jitter_ms: float = float(os.getenv("SIM_JITTER_MS", "0"))
+    error_rate: float = float(os.getenv("SIM_ERROR_RATE", "0"))
+    rate_limit: float = float(os.getenv("SIM_RATE_LIMIT", "0"))
+
+
+class _TokenBucket:  # pylint: disable=too-few-public-methods
+    """Global requests-per-second budget; `rate` 0 disables it."""
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+    def allow(self, rate):
+        """Take one request from the budget; False if it is spent."""
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(rate, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+config = SimConfig()
+stats: Counter = Counter()
+_bucket = _TokenBucket()
+_fault_rng = random.Random(SEED)
+
+
+# --- Deterministic catalog -------------------------------------------------
+
+
+def _stable_int(*parts) -> int:
+    digest = hashlib.sha256(":".join(str(p) for p in (SEED, *parts)).encode())
+    return int.from_bytes(digest.digest()[:8], "big")
+
+
+@lru_cache(maxsize=1)
+def catalog() -> List[Dict]:
+    """All simulated markets, generated once from SIM_SEED."""
+    markets = []
+    for i in range(MARKET_COUNT):
+        rng = random.Random(_stable_int("market", i))
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        question = (
+            f"Will {subject} {rng.choice(PREDICATES)} by "
+            f"{rng.choice(MONTHS)} {2026 + rng.randrange(2)}?"
+        )
+        yes, no = str(rng.getrandbits(128)), str(rng.getrandbits(128))
+        markets.append(
+            {
+                "id": str(100000 + i),
+                "question": question,
+                "conditionId": "0x" + f"{rng.getrandbits(256):064x}",
+                "slug": f"sim-{subject.replace(' ', '-')}-{i}",
+                "event_index": i // MARKETS_PER_EVENT,
+                "description": f"Simulated market #{i} about {subject}.",
+                "volume": str(round(rng.uniform(1e3, 5e6), 2)),
+                "endDate": f"{2026 + rng.randrange(2)}-12-31T00:00:00Z",
+                "updatedAt": "2025-01-01T00:00:00Z",
+                "active": True,
+                "closed": False,
+                "clobTokenIds": [yes, no],
+            }
+        )
+    return markets
+
+
+@lru_cache(maxsize=1)
+def token_index() -> Dict[str, tuple]:
+    """token id -> (market, outcome index)."""
+    index = {}
+    for market in catalog():
+        for outcome, token in enumerate(market["clobTokenIds"]):
+            index[token] = (market, outcome)
+    return index
+
+
+# --- Random walk -----------------------------------------------------------
+
+
+def _block_increments(token: str, block: int) -> np.ndarray:
+    rng = np.random.default_rng(_stable_int("walk", token, block))
+    return rng.normal(0.0, VOLATILITY, BLOCK_STEPS)
+
+
+_DECAY = 1 - REVERSION
+_POWERS = _DECAY ** np.arange(1, BLOCK_STEPS + 1)
+_BLOCK_WEIGHTS = _DECAY ** np.arange(BLOCK_STEPS - 1, -1, -1)
+
+
+@lru_cache(maxsize=262144)
+def _block_contribution(token: str, block: int) -> float:
+    """What `block`'s increments add to the level at the end of the block."""
+    return float(_BLOCK_WEIGHTS @ _block_increments(token, block))
+
+
+@lru_cache(maxsize=65536)
+def _block_start(token: str, block: int) -> float:
+    """
+    Logit level (relative to the token's mean) at the start of `block`.
+
+    The walk forgets its past with a half-life of ~5 blocks, so it is
+    replayed from rest WARMUP_BLOCKS earlier instead of from the epoch;
+    the result still depends only on (token, block).
+    """
+    level = 0.0
+    for previous in range(max(0, block - WARMUP_BLOCKS), block):
+        level = _DECAY**BLOCK_STEPS * level + _block_contribution(token, previous)
+    return level
+
+
+def _block_levels(token: str, block: int) -> np.ndarray:
+    """Logit levels for every step of `block` (AR(1) recursion, vectorized)."""
+    start = _block_start(token, block)
+    eps = _block_increments(token, block)
+    # L_k = a^k * L_0 + sum_{j<k} a^(k-1-j) * eps_j
+    scaled = np.cumsum(eps / _POWERS)
+    levels = _POWERS * (start + scaled)
+    return np.concatenate(([start], levels[:-1]))
+
+
+def _mean_logit(token: str) -> float:
+    """Long-run level of a token's walk, in logit space."""
+    p = 0.1 + 0.8 * (_stable_int("mean", token) % 1000) / 1000
+    return math.log(p / (1 - p))
+
+
+def price_series(token: str, start: int, end: int, every: int = 1) -> List[Dict]:
+    """
+    [{"t", "p"}] between the unix times `start` and `end`, keeping every
+    `every`-th walk step (aligned to the epoch so resolutions line up).
+    """
+    # Both outcomes of a market share one walk so their prices sum to 1
+    market, outcome = token_index().get(token, (None, 0))
+    walk = market["clobTokenIds"][0] if market else token
+    first = max(0, (start - EPOCH) // STEP_SECONDS)
+    last = max(first, (end - EPOCH) // STEP_SECONDS)
+    first += -first % every
+    points = []
+    for block in range(first // BLOCK_STEPS, last // BLOCK_STEPS + 1):
+        base = block * BLOCK_STEPS
+        steps = np.arange(max(first, base), min(last, base + BLOCK_STEPS - 1) + 1)
+        steps = steps[steps % every == 0]
+        if steps.size:
+            points.extend(_block_points(walk, block, steps, outcome))
+    return points
+
+
+def _block_points(walk: str, block: int, steps: np.ndarray, outcome: int):
+    """{"t", "p"} at walk `steps` (all inside `block`) for one outcome."""
+    levels = _block_levels(walk, block)[steps - block * BLOCK_STEPS]
+    prices = 1 / (1 + np.exp(-(_mean_logit(walk) + levels)))
+    prices = np.round(1 - prices if outcome == 1 else prices, 4)
+    times = EPOCH + steps * STEP_SECONDS
+    return (
+        {"t": int(t), "p": float(p)} for t, p in zip(times.tolist(), prices.tolist())
+    )
+
+
+def current_price(token: str, now: Optional[float] = None) -> float:
+    """The token's price at `now` (default: the current time)."""
+    now = int(now if now is not None else time.time())
+    return price_series(token, now, now)[-1]["p"]
+
+
+def order_book(token: str, now: Optional[float] = None) -> Dict:
+    """Synthetic book around the current price, stable within a walk step."""
+    now = int(now if now is not None else time.time())
+    step = (now - EPOCH) // STEP_SECONDS
+    mid = current_price(token, now)
+    rng = random.Random(_stable_int("book", token, step))
+    best_bid = max(TICK_SIZE, math.floor(mid / TICK_SIZE) * TICK_SIZE)
+    bids, asks = [], []
+    for level in range(BOOK_LEVELS):
+        bid = round(best_bid - level * TICK_SIZE, 2)
+        ask = round(best_bid + (level + 1) * TICK_SIZE, 2)
+        if bid > 0:
+            bids.append({"price": f"{bid:.2f}", "size": f"{rng.uniform(50, 5000):.2f}"})
+        if ask < 1:
+            asks.append({"price": f"{ask:.2f}", "size": f"{rng.uniform(50, 5000):.2f}"})
+    market, _ = token_index().get(token, ({"conditionId": ""}, 0))
+    return {
+        "market": market["conditionId"],
+        "asset_id": token,
+        "timestamp": str(now * 1000),
+        "hash": f"{_stable_int('hash', token, step):016x}",
+        # Polymarket lists bids ascending and asks descending, best price last
+        "bids": bids[::-1],
+        "asks": asks[::-1],
+    }
+
+
+def _gamma_market(market: Dict) -> Dict:
+    """Shape a catalog entry the way gamma serializes markets."""
+    yes = current_price(market["clobTokenIds"][0])
+    out = {k: v for k, v in market.items() if k != "event_index"}
+    out["outcomes"] = '["Yes", "No"]'
+    out["outcomePrices"] = f'["{yes}", "{round(1 - yes, 4)}"]'
+    out["clobTokenIds"] = (
+        f'["{market["clobTokenIds"][0]}", "{market["clobTokenIds"][1]}"]'
+    )
+    return out
+
+
+# --- Fault injection -------------------------------------------------------
+
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    """Apply configured latency, rate limiting and errors to upstream routes."""
+    path = request.url.path
+    if path.startswith("/_sim") or path in ("/docs", "/openapi.json"):
+        return await call_next(request)
+    stats[f"{request.method} {path}"] += 1
+    delay = config.latency_ms + _fault_rng.uniform(0, config.jitter_ms)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+    if not _bucket.allow(config.rate_limit):
+        stats["429"] += 1
+        return JSONResponse(
+            {"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"}
+        )
+    if config.error_rate and _fault_rng.random() < config.error_rate:
+        stats["503"] += 1
+        return JSONResponse({"error": "simulated failure"}, status_code=503)
+    return await call_next(request)
+
+
+@app.get("/_sim/config")
+async def get_config():
+    """Current fault settings."""
+    return config
+
+
+@app.post("/_sim/config")
+async def update_config(update: Dict):
+    """Change fault settings at runtime, e.g. {"error_rate": 1} for an outage."""
+    for key, value in update.items():
+        if key in SimConfig.model_fields.keys():
+            setattr(config, key, float(value))
+    return config
+
+
+@app.get("/_sim/stats")
+async def get_stats():
+    """Upstream requests served per route, plus injected 429/503 counts."""
+    return dict(stats)
+
+
+@app.post("/_sim/reset")
+async def reset_stats():
+    """Zero the request counters."""
+    stats.clear()
+    return {}
+
+
+# --- Gamma -----------------------------------------------------------------
+
+
+@app.get("/public-search")
+async def public_search(q: str = "", page: int = 1, closed: str = "false"):
+    """Events whose markets' questions contain every word of `q`, paginated."""
+    terms = q.lower().split()
+    matches = [m for m in catalog() if all(t in m["question"].lower() for t in terms)]
+    if closed == "false":
+        matches = [m for m in matches if not m["closed"]]
+    events: Dict[int, Dict] = {}
+    for market in matches:
+        event = events.setdefault(
+            market["event_index"],
+            {
+                "id": str(market["event_index"]),
+                "title": market["question"].split(" by ")[0].removeprefix("Will "),
+                "slug": f"sim-event-{market['event_index']}",
+                "markets": [],
+            },
+        )
+        event["markets"].append(_gamma_market(market))
+    ordered = list(events.values())
+    start = (max(page, 1) - 1) * PAGE_SIZE
+    return {
+        "events": ordered[start : start + PAGE_SIZE],
+        "pagination": {
+            "hasMore": start + PAGE_SIZE < len(ordered),
+            "totalResults": len(ordered),
+        },
+    }
+
+
+@app.get("/markets")
+async def markets(
+    clob_token_ids: List[str] = Query(default=[]),
+    closed: Optional[str] = None,
+    limit: int = 100,
+):
+    """Gamma markets holding any of `clob_token_ids`."""
+    index = token_index()
+    found = {index[t][0]["id"]: index[t][0] for t in clob_token_ids if t in index}
+    matches = list(found.values())
+    if closed is not None:
+        matches = [m for m in matches if m["closed"] == (closed == "true")]
+    return [_gamma_market(m) for m in matches[:limit]]
+
+
+# --- CLOB ------------------------------------------------------------------
+
+MAX_POINTS = 1000
+
+
+@app.get("/prices-history")
+async def prices_history(
+    market: str,
+    interval: str = "max",
+    fidelity: Optional[str] = Query(None),
+    startTs: Optional[int] = None,  # pylint: disable=invalid-name
+    endTs: Optional[int] = None,  # pylint: disable=invalid-name
+):
+    """Price history of token `market` over `interval` or [startTs, endTs]."""
+    end = endTs or int(time.time())
+    window = INTERVAL_WINDOWS.get(interval)
+    if startTs is not None:
+        start = startTs
+    elif window is not None:
+        start = end - window
+    else:
+        start = EPOCH
+    if fidelity and fidelity.isdigit() and int(fidelity) > 0:
+        # fidelity is the resolution in minutes, like the real endpoint
+        every = max(1, int(fidelity) * 60 // STEP_SECONDS)
+    else:
+        # Without one, long ranges are thinned to roughly MAX_POINTS points
+        every = max(1, (end - start) // STEP_SECONDS // MAX_POINTS)
+    return {"history": price_series(market, start, end, every)}
+
+
+@app.post("/prices")
+async def prices(params: List[Dict]):
+    """
+    Best price per token and side: the best ask to BUY, the best bid to SELL,
+    null when that side of the book is empty.
+    """
+    now = time.time()
+    result: Dict[str, Dict[str, Optional[str]]] = {}
+    for param in params:
+        book = order_book(param["token_id"], now)
+        side = param.get("side", "BUY")
+        # Best price last on both sides
+        levels = book["asks"] if side == "BUY" else book["bids"]
+        best = levels[-1]["price"] if levels else None
+        result.setdefault(param["token_id"], {})[side] = best
+    return result
+
+
+@app.get("/book")
+async def book(token_id: str):
+    """Order book of one token."""
+    return order_book(token_id)
+
+
+@app.post("/books")
+async def books(params: List[Dict]):
+    """Order books of several tokens, in request order."""
+    now = time.time()
+    return [order_book(p["token_id"], now) for p in params]
+
+
+def _book_delta(before: Dict, after: Dict) -> List[Dict]:
+    """price_change entries turning book `before` into `after`."""
+    changes = []
+    for side, key in (("BUY", "bids"), ("SELL", "asks")):
+        old = {lvl["price"]: lvl["size"] for lvl in before[key]}
+        new = {lvl["price"]: lvl["size"] for lvl in after[key]}
+        for price in sorted(set(old) | set(new)):
+            if old.get(price) != new.get(price):
+                changes.append(
+                    {
+                        "asset_id": after["asset_id"],
+                        "price": price,
+                        "size": new.get(price, "0"),
+                        "side": side,
+                        "hash": after["hash"],
+                        "best_bid": (
+                            after["bids"][-1]["price"] if after["bids"] else "0"
+                        ),
+                        "best_ask": (
+                            after["asks"][-1]["price"] if after["asks"] else "1"
+                        ),
+                    }
+                )
+    return changes
+
+
+async def _until_disconnect(websocket: WebSocket):
+    """Discard client messages (e.g. PING) until the connection closes."""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@app.websocket("/ws/market")
+async def market_channel(websocket: WebSocket):
+    """
+    Market channel: send {"assets_ids": [...], "type": "market"}, receive a
+    `book` snapshot per asset, then `price_change` deltas every tick.
+    """
+    await websocket.accept()
+    closed = None
+    try:
+        subscription = await websocket.receive_json()
+        assets = [str(a) for a in subscription.get("assets_ids", [])]
+        books = {a: order_book(a) for a in assets}
+        await websocket.send_json([{"event_type": "book", **b} for b in books.values()])
+        # Reading on the side notices a client that went away (or a server
+        # shutdown) even while no deltas are due
+        closed = asyncio.create_task(_until_disconnect(websocket))
+        while True:
+            await asyncio.wait({closed}, timeout=TICK_SECONDS)
+            if closed.done():
+                return
+            now = time.time()
+            for asset in assets:
+                latest = order_book(asset, now)
+                changes = _book_delta(books[asset], latest)
+                books[asset] = latest
+                if changes:
+                    await websocket.send_json(
+                        {
+                            "event_type": "price_change",
+                            "market": latest["market"],
+                            "price_changes": changes,
+                            "timestamp": latest["timestamp"],
+                        }
+                    )
+    except WebSocketDisconnect:
+        return
+    finally:
+        if closed is not None:
+            closed.cancel()
@@ -0,0 +1,94 @@
+"Tests for the two-tier cache"
+
+import json
+
+import pytest
+
+from api import cache
+from api.cache import LocalLRU, TieredCache
+from api.serializers import get_serializer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def unreachable_cache(clock, **kwargs):
+    """TieredCache whose Redis cannot be reached, so only L1 can answer."""
+    return TieredCache(
+        endpoint="127.0.0.1",
+        port=1,
+        namespace="test_ns",
+        ttl=60,
+        serializer=get_serializer(),
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    lru = LocalLRU(max_entries=2)
+    lru.set("a", 1, ttl=10)
+    lru.set("b", 2, ttl=10)
+    assert lru.get("a") == 1
+    lru.set("c", 3, ttl=10)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+
+
+def test_lru_entries_expire():
+    clock = FakeClock()
+    lru = LocalLRU(clock=clock)
+    lru.set("a", 1, ttl=2)
+    clock.now = 1.9
+    assert lru.get("a") == 1
+    clock.now = 2.0
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_keys_are_namespaced_with_a_separator():
+    tiered = unreachable_cache(FakeClock())
+    assert tiered.build_key("btc:1") == "test_ns:btc:1"
+
+
+def test_namespace_ttl_reads_config(monkeypatch):
+    assert cache.namespace_ttl("clob_price") == 5
+    monkeypatch.setenv("CACHE_TTL_CLOB_PRICE", "2")
+    assert cache.namespace_ttl("clob_price") == 2
+    assert cache.namespace_ttl("unknown") == 60
+
+
+@pytest.mark.asyncio
+async def test_hot_keys_are_served_from_l1_without_redis():
+    clock = FakeClock()
+    tiered = unreachable_cache(clock, l1_ttl=2)
+    with pytest.raises(Exception):
+        await tiered.set("k", {"v": 1})
+    assert await tiered.get("k") == {"v": 1}
+
+    clock.now = 2.5
+    with pytest.raises(Exception):
+        await tiered.get("k")
+
+
+def test_invalidation_messages_drop_l1_entries():
+    tiered = unreachable_cache(FakeClock())
+    tiered.local.set("test_ns:a", 1, ttl=10)
+    tiered.local.set("test_ns:b", 2, ttl=10)
+    tiered.local.set("other:c", 3, ttl=10)
+
+    cache.apply_invalidation(json.dumps({"key": "test_ns:a"}))
+    assert tiered.local.get("test_ns:a") is None
+    assert tiered.local.get("test_ns:b") == 2
+
+    cache.apply_invalidation(json.dumps({"prefix": "test_ns:"}))
+    assert tiered.local.get("test_ns:b") is None
+    assert tiered.local.get("other:c") == 3
+
+    cache.apply_invalidation(b"not json")
+    assert tiered.local.get("other:c") == 3
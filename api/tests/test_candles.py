@@ -0,0 +1,123 @@
+"Tests for the OHLC candle tiers"
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import candles, price_api
+from api.prefetch import Prefetcher
+
+client = TestClient(price_api.app)
+START = 1735689600  # a day boundary
+
+
+def minute_series(prices, start=START):
+    return [{"t": start + 60 * i, "p": p} for i, p in enumerate(prices)]
+
+
+def test_candles_aggregate_open_high_low_close():
+    # Ten minutes: two 5-minute candles
+    tiers = candles.build_pyramid(
+        minute_series([0.5, 0.7, 0.4, 0.6, 0.55, 0.55, 0.3, 0.9, 0.8, 0.6])
+    )
+    five = tiers["300"]
+    assert five["t"] == [START, START + 300]
+    assert five["o"] == [0.5, 0.55]
+    assert five["h"] == [0.7, 0.9]
+    assert five["l"] == [0.4, 0.3]
+    assert five["c"] == [0.55, 0.6]
+    # Coarser tiers are built from finer ones and agree with them
+    assert tiers["86400"] == {
+        "t": [START],
+        "o": [0.5],
+        "h": [0.9],
+        "l": [0.3],
+        "c": [0.6],
+    }
+
+
+def test_each_interval_uses_the_finest_tier_that_fits():
+    assert candles.tier_width("1h") == 60
+    assert candles.tier_width("6h") == 60
+    assert candles.tier_width("1d") == 300
+    assert candles.tier_width("1w") == 1800
+    assert candles.tier_width("1m") == 7200
+    assert candles.tier_width("max") == 86400
+
+
+def test_select_returns_the_window_ending_at_the_latest_candle():
+    tiers = candles.build_pyramid(minute_series([0.5] * 3 * 60))
+    selected = candles.select(tiers, "1h")
+    assert selected["width"] == 60
+    assert len(selected["t"]) == 60
+    assert selected["t"][-1] == START + 179 * 60
+    # Fine tiers only keep what their intervals can ask for
+    tiers = candles.build_pyramid(minute_series([0.5] * 2000))
+    assert len(tiers["60"]["t"]) == candles.MAX_CANDLES
+
+
+def test_intervals_are_served_without_more_upstream_calls(monkeypatch):
+    calls = []
+
+    async def fake_history(asset_id, interval, fidelity):
+        calls.append((asset_id, interval, fidelity))
+        if interval == "1w":
+            return {"history": minute_series([0.6] * 120, start=START + 86400)}
+        return {"history": [{"t": START + 3600 * h, "p": 0.4} for h in range(30)]}
+
+    monkeypatch.setattr(price_api, "fetch_historical", fake_history)
+    # A fresh asset id, so tiers cached by an earlier run are not reused
+    asset = f"candle-test-{uuid.uuid4().hex}"
+
+    for interval in ("1h", "1d", "max"):
+        response = client.get(f"/historical_prices?assets={asset}&interval={interval}")
+        assert response.status_code == 200
+        assert response.json()[asset]["history"][-1]["p"] == 0.6
+    assert sorted(c[1] for c in calls) == ["1w", "max"]
+
+    response = client.get(f"/candles?assets={asset}&interval=max")
+    body = response.json()[asset]
+    assert body["width"] == 86400
+    # Day one from the coarse series; from day two on, the fine series
+    # replaces the coarse points it overlaps
+    assert body["candles"] == [
+        [START, 0.4, 0.4, 0.4, 0.4],
+        [START + 86400, 0.6, 0.6, 0.6, 0.6],
+    ]
+
+
+def test_candles_rejects_unknown_intervals():
+    response = client.get("/candles?assets=a&interval=3y")
+    assert response.status_code == 422
+
+
+def test_sparklines_are_served_from_the_cache(monkeypatch):
+    async def fake_history(asset_id, interval, fidelity):
+        if interval == "1w":
+            return {"history": minute_series([i / 1000 for i in range(600)])}
+        return {"history": []}
+
+    monkeypatch.setattr(price_api, "fetch_historical", fake_history)
+    monkeypatch.setattr(price_api, "prefetcher", Prefetcher(rate=1000))
+    asset = f"spark-test-{uuid.uuid4().hex}"
+    body = {"tokens": [asset], "interval": "1d", "points": 8}
+
+    with TestClient(price_api.app) as test_client:
+        first = test_client.post("/sparklines", json=body).json()
+        assert first["sparklines"] == {}
+        assert first["pending"] == [asset]
+        test_client.portal.call(price_api.prefetcher.join)
+
+        second = test_client.post("/sparklines", json=body).json()
+
+    series = second["sparklines"][asset]
+    assert second["pending"] == []
+    assert len(series) == 8
+    assert series == sorted(series)
+    assert series[-1] == pytest.approx(0.599)
+
+
+def test_sparklines_limit_the_batch_size():
+    response = client.post("/sparklines", json={"tokens": ["t"] * 101})
+    assert response.status_code == 422
@@ -5,7 +5,13 @@ from unittest.mock import MagicMock
 import pytest
 from fastapi.testclient import TestClient
 
-from api.price_api import RetryableHTTPError, app, fetch_clob_prices, get_clob_prices
+from api.price_api import (
+    RetryableHTTPError,
+    app,
+    fetch_clob_prices,
+    get_clob_client,
+    get_clob_prices,
+)
 
 client = TestClient(app)
 
@@ -74,8 +80,53 @@ async def test_fetch_clob_prices_retry(monkeypatch):
             raise Exception("Temporary failure")
         return {"t1": {"BUY": {"token_id": "t1", "price": 42}}}
 
-    monkeypatch.setattr("api.price_api.client.get_prices", fake_prices)
+    monkeypatch.setattr(get_clob_client(), "get_prices", fake_prices)
 
     result = await fetch_clob_prices(["t1"])
     assert result == [{"token_id": "t1", "price": 42}]
     assert call_count == 3
+
+
+def test_clob_batch_returns_prices_keyed_by_token(monkeypatch):
+    """POST /clob/batch chunks the tokens and keys each price by its token."""
+    chunks = []
+
+    async def mock_map(tokens):
+        chunks.append(list(tokens))
+        return {t: str(0.1 * (int(t[1:]) % 10)) for t in tokens}
+
+    monkeypatch.setattr("api.price_api.fetch_clob_price_map", mock_map)
+    monkeypatch.setattr("api.price_api.CLOB_BATCH_CHUNK", 2)
+
+    response = client.post("/clob/batch", json={"tokens": ["t1", "t2", "t3", "t1"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["prices"] == pytest.approx({"t1": 0.1, "t2": 0.2, "t3": 0.3})
+    assert body["stale"] == []
+    assert chunks == [["t1", "t2"], ["t3"]]
+
+
+def test_clob_batch_fills_failed_chunks_from_last_known_prices(monkeypatch):
+    """A chunk the CLOB cannot answer falls back to last known prices."""
+
+    async def mock_map(tokens):
+        if "t3" in tokens:
+            raise RetryableHTTPError("CLOB down")
+        return {t: "0.5" for t in tokens}
+
+    async def mock_last(tokens):
+        return [{"price": "0.25", "ts": 0} if t == "t3" else None for t in tokens]
+
+    monkeypatch.setattr("api.price_api.fetch_clob_price_map", mock_map)
+    monkeypatch.setattr("api.price_api.read_last_prices", mock_last)
+    monkeypatch.setattr("api.price_api.CLOB_BATCH_CHUNK", 2)
+
+    response = client.post("/clob/batch", json={"tokens": ["t1", "t2", "t3", "t4"]})
+    body = response.json()
+    assert body["prices"] == {"t1": 0.5, "t2": 0.5, "t3": 0.25}
+    assert body["stale"] == ["t3"]
+
+
+def test_clob_batch_rejects_oversized_requests():
+    response = client.post("/clob/batch", json={"tokens": ["t"] * 501})
+    assert response.status_code == 422
@@ -0,0 +1,94 @@
+"Tests for caller deadline propagation in the API services"
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from tenacity import RetryError
+
+from api import deadline, price_api
+
+client = TestClient(price_api.app)
+
+
+def test_parse_budget():
+    assert deadline.parse_budget("1500") == 1.5
+    assert deadline.parse_budget("-3") == 0.0
+    assert deadline.parse_budget("soon") is None
+    assert deadline.parse_budget(None) is None
+
+
+def test_timeout_is_unchanged_without_a_deadline():
+    assert deadline.remaining() is None
+    assert deadline.timeout(30) == 30
+
+
+def test_timeout_is_cut_to_the_remaining_budget():
+    token = deadline._deadline.set(time.monotonic() + 2)
+    try:
+        assert 1.5 < deadline.timeout(30) <= 2
+        assert deadline.timeout(1) == 1
+    finally:
+        deadline._deadline.reset(token)
+
+
+def test_timeout_raises_once_the_deadline_passed():
+    token = deadline._deadline.set(time.monotonic() - 1)
+    try:
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.timeout(30)
+    finally:
+        deadline._deadline.reset(token)
+
+
+def test_request_is_cancelled_when_the_deadline_passes(monkeypatch):
+    cancelled = []
+
+    async def slow(tokens):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return ["0.5"]
+
+    monkeypatch.setattr(price_api, "get_clob_prices", slow)
+    start = time.perf_counter()
+    response = client.get("/clob?tokens=t1", headers={"X-Deadline-Ms": "100"})
+    assert response.status_code == 504
+    assert time.perf_counter() - start < 2
+    assert cancelled == [True]
+
+
+def test_requests_without_the_header_are_not_limited(monkeypatch):
+    async def quick(tokens):
+        return ["0.5"]
+
+    monkeypatch.setattr(price_api, "get_clob_prices", quick)
+    response = client.get("/clob?tokens=t1")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_retries_stop_when_the_next_wait_would_miss_the_deadline(monkeypatch):
+    calls = []
+
+    def failing(book_params):
+        calls.append(1)
+        raise RuntimeError("CLOB down")
+
+    monkeypatch.setattr(price_api.get_clob_client(), "get_prices", failing)
+    monkeypatch.setattr(
+        price_api, "clob_breaker", price_api.CircuitBreaker("test-deadline", 100)
+    )
+    token = deadline._deadline.set(time.monotonic() + 0.5)
+    try:
+        start = time.perf_counter()
+        with pytest.raises(RetryError):
+            await price_api.fetch_clob_prices(["t1"])
+    finally:
+        deadline._deadline.reset(token)
+    # The first backoff (1s) does not fit in 0.5s, so no retry is attempted
+    assert len(calls) == 1
+    assert time.perf_counter() - start < 0.5
@@ -0,0 +1,79 @@
+"Tests for ETags, Cache-Control and compression"
+
+import brotli
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+
+from api import http_cache
+
+app = FastAPI(default_response_class=ORJSONResponse)
+http_cache.install(app, max_ages={"/series": 60})
+
+
+@app.get("/series")
+async def series():
+    return {"history": [{"t": 1735689600 + 60 * i, "p": 0.5} for i in range(500)]}
+
+
+@app.get("/small")
+async def small():
+    return {"ok": True}
+
+
+@app.get("/stale")
+async def stale():
+    return ORJSONResponse({"ok": True}, headers={"X-Stale": "true"})
+
+
+client = TestClient(app)
+
+
+def test_repeat_requests_with_the_etag_are_304():
+    first = client.get("/series")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert first.headers["Cache-Control"] == "private, max-age=60"
+
+    again = client.get("/series", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    other = client.get("/series", headers={"If-None-Match": 'W/"something-else"'})
+    assert other.status_code == 200
+
+
+def test_large_bodies_are_compressed_as_the_client_prefers():
+    plain = client.get("/series", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    compressed = client.get("/series", headers={"Accept-Encoding": "gzip, br"})
+    assert compressed.headers["Content-Encoding"] == "br"
+    assert compressed.json() == plain.json()
+    assert int(compressed.headers["Content-Length"]) * 5 < len(plain.content)
+    assert compressed.headers["ETag"] == plain.headers["ETag"]
+
+    gzipped = client.get("/series", headers={"Accept-Encoding": "gzip, br;q=0.5"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+
+    small = client.get("/small", headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in small.headers
+
+
+def test_stale_responses_are_not_cached():
+    response = client.get("/stale")
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_choose_encoding():
+    assert http_cache.choose_encoding("gzip, deflate, br") == "br"
+    assert http_cache.choose_encoding("gzip") == "gzip"
+    assert http_cache.choose_encoding("br;q=0, gzip;q=0.1") == "gzip"
+    assert http_cache.choose_encoding("identity") is None
+    assert http_cache.choose_encoding(None) is None
+
+
+def test_brotli_body_decodes():
+    body = b'{"a": 1}' * 200
+    assert brotli.decompress(http_cache.compress(body, "br")) == body
@@ -0,0 +1,73 @@
+"Tests for the Prometheus instrumentation of the API services"
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from api import metrics
+from api.price_api import app as price_app
+from api.search_api import app as search_app
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.parametrize("service_app", [price_app, search_app])
+def test_metrics_endpoint_is_served(service_app):
+    response = TestClient(service_app).get("/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+
+
+def test_requests_are_timed_by_route_template(monkeypatch):
+    async def mock_get(tokens):
+        return ["0.5"]
+
+    monkeypatch.setattr("api.price_api.get_clob_prices", mock_get)
+    labels = {
+        "service": "price_api",
+        "method": "GET",
+        "route": "/clob",
+        "status": "200",
+    }
+    before = sample("http_request_duration_seconds_count", **labels)
+    TestClient(price_app).get("/clob?tokens=t1")
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metered_cached_counts_hits_and_misses():
+    @metrics.metered_cached(namespace="test_ns")
+    async def double(x):
+        return x * 2
+
+    hits = sample("cache_requests_total", namespace="test_ns", result="hit")
+    misses = sample("cache_requests_total", namespace="test_ns", result="miss")
+    await double(2)
+    await double(2)
+    assert sample("cache_requests_total", namespace="test_ns", result="miss") == (
+        misses + 1
+    )
+    assert sample("cache_requests_total", namespace="test_ns", result="hit") == hits + 1
+
+
+def test_track_upstream_labels_failures():
+    before = sample(
+        "upstream_request_duration_seconds_count", upstream="x", outcome="error"
+    )
+    with pytest.raises(RuntimeError):
+        with metrics.track_upstream("x"):
+            raise RuntimeError("boom")
+    assert (
+        sample("upstream_request_duration_seconds_count", upstream="x", outcome="error")
+        == before + 1
+    )
+
+
+def test_count_retry_increments_per_sleep():
+    hook = metrics.count_retry("op")
+    before = sample("upstream_retries_total", operation="op")
+    hook(None)
+    hook(None)
+    assert sample("upstream_retries_total", operation="op") == before + 2
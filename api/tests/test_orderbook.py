@@ -0,0 +1,223 @@
+"Tests for the local order books and fill prices"
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import price_api, simulator
+from api.orderbook import BookFeed, BookStore, OrderBook, WatchList
+
+
+def book(bids=(), asks=()):
+    return OrderBook(
+        {
+            "bids": [{"price": str(p), "size": str(s)} for p, s in bids],
+            "asks": [{"price": str(p), "size": str(s)} for p, s in asks],
+        }
+    )
+
+
+def test_buy_walks_the_asks_from_the_lowest_price():
+    result = book(asks=[(0.6, 100), (0.5, 100), (0.7, 100)]).fill(80)
+    # $50 buys 100 shares at 0.50, the other $30 buys 50 at 0.60
+    assert result["shares"] == pytest.approx(150)
+    assert result["avg_price"] == pytest.approx(80 / 150)
+    assert result["best_price"] == 0.5
+    assert result["worst_price"] == 0.6
+    assert result["levels"] == 2
+    assert result["complete"] is True
+    assert result["slippage"] == pytest.approx(80 / 150 - 0.5)
+
+
+def test_sell_walks_the_bids_from_the_highest_price():
+    result = book(bids=[(0.4, 100), (0.45, 100)]).fill(45, side="SELL")
+    assert result["best_price"] == 0.45
+    assert result["levels"] == 1
+    assert result["slippage"] == pytest.approx(0)
+
+
+def test_a_thin_book_fills_partially():
+    result = book(asks=[(0.5, 10)]).fill(100)
+    assert result["complete"] is False
+    assert result["filled"] == pytest.approx(5)
+    assert book().fill(100)["avg_price"] is None
+
+
+def test_deltas_keep_the_book_equal_to_the_snapshot():
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    now = 1_700_000_000
+    before = simulator.order_book(token, now)
+    local = BookStore()
+    local.handle([{"event_type": "book", **before}])
+    for step in range(1, 6):
+        after = simulator.order_book(token, now + step * simulator.STEP_SECONDS)
+        local.handle(
+            {
+                "event_type": "price_change",
+                "price_changes": simulator._book_delta(before, after),
+            }
+        )
+        before = after
+    expected = OrderBook(before)
+    assert dict(local.get(token).bids) == dict(expected.bids)
+    assert dict(local.get(token).asks) == dict(expected.asks)
+    assert local.get(token).best_ask() == float(before["asks"][-1]["price"])
+
+
+def test_a_zero_size_removes_the_level():
+    local = book(asks=[(0.5, 10), (0.6, 10)])
+    local.apply_change("SELL", "0.5", "0")
+    assert local.best_ask() == 0.6
+
+
+def test_deltas_without_a_snapshot_are_ignored():
+    store = BookStore()
+    store.handle(
+        {
+            "event_type": "price_change",
+            "price_changes": [
+                {"asset_id": "t", "price": "0.5", "size": "1", "side": "BUY"}
+            ],
+        }
+    )
+    assert store.get("t") is None
+
+
+class FakeChannel:
+    """Stands in for `websockets.connect` and the connection it opens."""
+
+    def __init__(self):
+        self.subscriptions = []
+        self.inbox = asyncio.Queue()
+
+    def __call__(self, url):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def send(self, raw):
+        self.subscriptions.append(json.loads(raw)["assets_ids"])
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return json.dumps(message)
+
+
+async def until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+@pytest.mark.asyncio
+async def test_feed_subscribes_to_watched_tokens_and_applies_messages():
+    channel = FakeChannel()
+    feed = BookFeed("ws://clob", connect=channel)
+    try:
+        assert feed.watch("a") is None
+        await until(lambda: channel.subscriptions == [["a"]])
+        await channel.inbox.put(
+            [{"event_type": "book", "asset_id": "a", "bids": [], "asks": []}]
+        )
+        await until(lambda: feed.store.get("a") is not None)
+
+        feed.watch("b")
+        await until(lambda: channel.subscriptions[-1:] == [["a", "b"]])
+        assert feed.watch("a") is feed.store.get("a")
+
+        # A dropped connection may have missed deltas: its books go
+        await channel.inbox.put(None)
+        await until(lambda: feed.store.get("a") is None)
+    finally:
+        await feed.close()
+
+
+@pytest.mark.asyncio
+async def test_feed_forgets_idle_tokens():
+    now = [0.0]
+    watching = WatchList(idle_seconds=10, clock=lambda: now[0])
+    feed = BookFeed("ws://clob", watching, connect=FakeChannel())
+    try:
+        feed.watch("a")
+        feed.store.load("a", {"bids": [], "asks": []})
+        now[0] = 11
+        feed.watch("b")
+        assert feed.watched() == ["b"]
+        assert feed.store.get("a") is None
+    finally:
+        await feed.close()
+
+
+def test_watch_list_keeps_the_most_recent_tokens():
+    watching = WatchList(max_tokens=2)
+    assert watching.touch("a") == (True, [])
+    watching.touch("b")
+    assert watching.touch("a") == (False, [])
+    assert watching.touch("c") == (True, ["b"])
+    assert watching.tokens() == ["a", "c"]
+
+
+def test_fill_price_endpoint_uses_a_snapshot_until_the_stream_has_one(monkeypatch):
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    snapshot = simulator.order_book(token, 1_700_000_000)
+    fetched = []
+
+    async def fake_fetch_book(t):
+        fetched.append(t)
+        return snapshot
+
+    feed = BookFeed("ws://clob", connect=FakeChannel())
+    monkeypatch.setattr(price_api, "fetch_book", fake_fetch_book)
+    monkeypatch.setattr(price_api, "book_feed", feed)
+
+    with TestClient(price_api.app) as client:
+        response = client.get(f"/fill_price?token={token}&notional=100000")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["source"] == "snapshot"
+        assert fetched == [token]
+        assert body["best_price"] == float(snapshot["asks"][-1]["price"])
+        assert body["avg_price"] > body["best_price"]
+        assert body["levels"] > 1
+
+        feed.store.load(token, snapshot)
+        body = client.get(f"/fill_price?token={token}&notional=10").json()
+        assert body["source"] == "stream"
+        assert fetched == [token]
+
+        assert client.get(f"/fill_price?token={token}&notional=0").status_code == 422
+
+
+def test_local_fill_price_never_fetches_a_snapshot(monkeypatch):
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    fetched = []
+
+    async def fake_fetch_book(t):
+        fetched.append(t)
+        return {}
+
+    feed = BookFeed("ws://clob", connect=FakeChannel())
+    monkeypatch.setattr(price_api, "fetch_book", fake_fetch_book)
+    monkeypatch.setattr(price_api, "book_feed", feed)
+
+    with TestClient(price_api.app) as client:
+        url = f"/fill_price?token={token}&notional=10&local=true"
+        assert client.get(url).status_code == 404
+        assert feed.watched() == [token]
+
+        feed.store.load(token, simulator.order_book(token, 1_700_000_000))
+        assert client.get(url).json()["source"] == "stream"
+    assert fetched == []
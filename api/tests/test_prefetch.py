@@ -0,0 +1,162 @@
+"Tests for background cache warm-up"
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import deadline, price_api, search_api
+from api.prefetch import Prefetcher
+
+
+async def noop():
+    return None
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_deduplicated_by_key():
+    prefetcher = Prefetcher(rate=1000)
+    runs = []
+
+    async def job():
+        runs.append(1)
+
+    assert prefetcher.schedule("k", job) is True
+    assert prefetcher.schedule("k", job) is False
+    await prefetcher.join()
+    assert runs == [1]
+
+
+@pytest.mark.asyncio
+async def test_dedup_window_expires():
+    now = [0.0]
+    prefetcher = Prefetcher(rate=1000, dedup_seconds=10, clock=lambda: now[0])
+    assert prefetcher.schedule("k", noop)
+    now[0] = 11
+    assert prefetcher.schedule("k", noop)
+    await prefetcher.join()
+
+
+@pytest.mark.asyncio
+async def test_jobs_beyond_the_queue_are_dropped():
+    prefetcher = Prefetcher(rate=1000, concurrency=1, max_pending=2)
+    scheduled = [prefetcher.schedule(f"k{i}", noop) for i in range(5)]
+    assert scheduled.count(True) == 2
+    await prefetcher.join()
+
+
+@pytest.mark.asyncio
+async def test_job_starts_are_rate_limited():
+    prefetcher = Prefetcher(rate=20, concurrency=4)
+    starts = []
+
+    async def job():
+        starts.append(time.monotonic())
+
+    for i in range(5):
+        prefetcher.schedule(f"k{i}", job)
+    await prefetcher.join()
+    # 5 starts at 20/s need at least 4 gaps of 50ms
+    assert max(starts) - min(starts) >= 0.19
+
+
+@pytest.mark.asyncio
+async def test_jobs_do_not_inherit_the_request_deadline():
+    prefetcher = Prefetcher(rate=1000)
+    seen = []
+
+    async def job():
+        seen.append(deadline.remaining())
+
+    token = deadline._deadline.set(time.monotonic() + 0.01)
+    try:
+        prefetcher.schedule("k", job)
+    finally:
+        deadline._deadline.reset(token)
+    await asyncio.sleep(0.05)
+    await prefetcher.join()
+    assert seen == [None]
+
+
+@pytest.mark.asyncio
+async def test_failing_jobs_do_not_stop_the_workers():
+    prefetcher = Prefetcher(rate=1000, concurrency=1)
+    runs = []
+
+    async def broken():
+        raise RuntimeError("upstream down")
+
+    async def job():
+        runs.append(1)
+
+    prefetcher.schedule("a", broken)
+    prefetcher.schedule("b", job)
+    await prefetcher.join()
+    assert runs == [1]
+
+
+def test_price_api_prefetch_warms_candles_and_clob(monkeypatch):
+    warmed = []
+
+    async def fake_candles(asset_id):
+        warmed.append(("candles", asset_id))
+
+    async def fake_clob(tokens):
+        warmed.append(("clob", tokens[0]))
+
+    monkeypatch.setattr(price_api, "get_candle_tiers", fake_candles)
+    monkeypatch.setattr(price_api, "get_clob_prices", fake_clob)
+    monkeypatch.setattr(price_api, "prefetcher", Prefetcher(rate=1000))
+
+    with TestClient(price_api.app) as client:
+        response = client.post("/prefetch", json={"tokens": ["a", "b", "a"]})
+        assert response.status_code == 202
+        assert response.json() == {"scheduled": 4}
+        again = client.post("/prefetch", json={"tokens": ["a"]})
+        assert again.json() == {"scheduled": 0}
+        client.portal.call(price_api.prefetcher.join)
+
+    assert sorted(warmed) == [
+        ("candles", "a"),
+        ("candles", "b"),
+        ("clob", "a"),
+        ("clob", "b"),
+    ]
+
+
+def test_top_tokens_takes_the_first_markets_of_the_page():
+    data = {
+        "markets": [
+            {"slug": "a", "clobTokenIds": ["1", "2"]},
+            {"slug": "b", "clobTokenIds": ["3", "4"]},
+        ],
+        "pagination": {"page": 1, "hasMore": False},
+    }
+    assert search_api.top_tokens(data, 1) == ["1", "2"]
+    assert search_api.top_tokens(data, 5) == ["1", "2", "3", "4"]
+
+
+def test_search_schedules_a_prefetch_for_the_results(monkeypatch):
+    data = {
+        "markets": [{"slug": "a", "clobTokenIds": ["1", "2"]}],
+        "pagination": {"page": 1, "hasMore": False, "totalResults": 1},
+    }
+    posted = []
+
+    async def fake_search(q, page):
+        return data
+
+    async def fake_request(tokens):
+        posted.append(tokens)
+
+    monkeypatch.setattr(search_api, "get_polymarket_search", fake_search)
+    monkeypatch.setattr(search_api, "request_prefetch", fake_request)
+    monkeypatch.setattr(search_api, "prefetcher", Prefetcher(rate=1000))
+
+    with TestClient(search_api.app) as client:
+        assert client.get("/search?q=Bitcoin").json() == data
+        assert client.get("/search?q=bitcoin").json() == data
+        client.portal.call(search_api.prefetcher.join)
+
+    assert posted == [["1", "2"]]
@@ -0,0 +1,48 @@
+"""Tests for prefix_index.py"""
+
+from api.prefix_index import PrefixIndex
+
+
+def texts(results):
+    return [result["text"] for result in results]
+
+
+def test_every_query_word_is_a_word_prefix():
+    index = PrefixIndex()
+    index.add("market", "btc-100k", "Will BTC hit $100k in 2025?", volume=10)
+    index.add("market", "eth-5k", "Will ETH hit $5k?", volume=20)
+    index.add("event", "btc-price", "Bitcoin price", volume="5")
+
+    assert texts(index.suggest("wi hi")) == [
+        "Will ETH hit $5k?",
+        "Will BTC hit $100k in 2025?",
+    ]
+    assert texts(index.suggest("BTC 100")) == ["Will BTC hit $100k in 2025?"]
+    assert texts(index.suggest("bit")) == ["Bitcoin price"]
+    assert index.suggest("itcoin") == []
+    assert index.suggest("btc eth") == []
+    assert index.suggest("  ") == []
+    assert index.suggest("will", limit=1)[0] == {
+        "text": "Will ETH hit $5k?",
+        "kind": "market",
+        "slug": "eth-5k",
+    }
+
+
+def test_reindexing_replaces_the_old_text():
+    index = PrefixIndex()
+    index.add("market", "m", "Will it rain?")
+    index.add("market", "m", "Will it snow?")
+    assert index.suggest("rain") == []
+    assert texts(index.suggest("snow")) == ["Will it snow?"]
+    assert len(index) == 1
+
+
+def test_oldest_entries_are_forgotten_first():
+    index = PrefixIndex(max_entries=2)
+    index.add("market", "a", "Alpha market")
+    index.add("market", "b", "Beta market")
+    index.add("market", "a", "Alpha market")
+    index.add("market", "c", "Gamma market")
+    assert sorted(texts(index.suggest("market"))) == ["Alpha market", "Gamma market"]
+    assert index.suggest("beta") == []
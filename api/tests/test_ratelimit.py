@@ -0,0 +1,104 @@
+"Tests for the shared upstream rate limiter"
+
+import asyncio
+
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import ratelimit
+from api.ratelimit import RateLimiter
+
+
+def limiter(client, rate=10.0, burst=10.0, **kwargs):
+    return RateLimiter("test", rate, burst, lambda: client, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_replicas_share_one_bucket():
+    client = fakeredis.FakeAsyncRedis()
+    first, second = limiter(client), limiter(client)
+    waits = [await first.take("trade") for _ in range(5)]
+    waits += [await second.take("trade") for _ in range(5)]
+    assert waits == [0.0] * 10
+    # Empty: the next token is due in about 1 / rate seconds
+    assert 0 < await first.take("trade") <= 0.1
+
+
+@pytest.mark.asyncio
+async def test_lower_lanes_leave_the_reserve_for_higher_ones():
+    bucket = limiter(fakeredis.FakeAsyncRedis(), rate=1.0)
+    # chart must leave 30% of the burst: 7 of 10 tokens
+    assert [await bucket.take("chart") for _ in range(7)] == [0.0] * 7
+    assert await bucket.take("chart") > 0
+    assert await bucket.take("valuation") == 0.0
+    assert await bucket.take("valuation") == 0.0
+    assert await bucket.take("valuation") > 0
+    assert await bucket.take("trade") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_waiting_calls_are_served_by_lane():
+    bucket = limiter(fakeredis.FakeAsyncRedis(), rate=20.0, burst=1.0)
+    await bucket.acquire("trade")  # empties the bucket
+    served = []
+
+    async def call(lane):
+        with ratelimit.lane(lane):
+            await bucket.acquire()
+        served.append(lane)
+
+    tasks = [asyncio.create_task(call(lane)) for lane in ("chart", "chart")]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(call(lane)) for lane in ("valuation", "trade")]
+    await asyncio.sleep(0)
+    assert bucket.waiting() == {"trade": 1, "valuation": 1, "chart": 2}
+
+    await asyncio.gather(*tasks)
+    assert served == ["trade", "valuation", "chart", "chart"]
+    assert bucket.waiting() == {"trade": 0, "valuation": 0, "chart": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_leave_the_queue():
+    bucket = limiter(fakeredis.FakeAsyncRedis(), rate=5.0, burst=1.0)
+    await bucket.acquire("trade")
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(bucket.acquire("chart"), 0.01)
+    assert bucket.waiting()["chart"] == 0
+    await asyncio.wait_for(bucket.acquire("trade"), 1)
+
+
+@pytest.mark.asyncio
+async def test_calls_go_through_when_redis_is_down():
+    class Down:
+        async def transaction(self, *args, **kwargs):
+            raise ConnectionError("redis is down")
+
+    bucket = RateLimiter("test", 1.0, 1.0, Down)
+    await asyncio.wait_for(bucket.acquire(), 1)
+
+
+@pytest.mark.parametrize("rate, burst", [(0.0, 10.0), (-1.0, 10.0), (10.0, 0.5)])
+def test_a_bucket_needs_a_positive_rate_and_a_whole_token(rate, burst):
+    with pytest.raises(ValueError):
+        limiter(fakeredis.FakeAsyncRedis(), rate=rate, burst=burst)
+
+
+def test_callers_pick_their_lane_with_a_header():
+    app = FastAPI()
+    ratelimit.install(app)
+
+    @app.get("/lane")
+    async def which_lane():
+        return {"lane": ratelimit.current_lane("valuation")}
+
+    client = TestClient(app)
+    assert client.get("/lane").json() == {"lane": "valuation"}
+    assert client.get("/lane", headers={"X-Priority": "trade"}).json() == {
+        "lane": "trade"
+    }
+    assert client.get("/lane", headers={"X-Priority": "vip"}).json() == {
+        "lane": "valuation"
+    }
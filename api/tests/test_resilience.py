@@ -0,0 +1,183 @@
+"Tests for the circuit breakers and price_api's last-known-price fallback"
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from api import price_api
+from api.deadline import DeadlineExceeded
+from api.resilience import CircuitBreaker, CircuitOpenError
+
+client = TestClient(price_api.app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fail(breaker):
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError("upstream down")
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("test-open", failure_threshold=3, cooldown=10)
+    for _ in range(3):
+        fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pytest.fail("upstream must not be called while open")
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test-reset", failure_threshold=2)
+    fail(breaker)
+    with breaker.guard():
+        pass
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_one_probe_and_closes_on_success():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test-probe", failure_threshold=1, cooldown=5, clock=clock)
+    fail(breaker)
+    clock.now = 5
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.seconds_until_retry() == 0
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_for_another_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "test-reopen", failure_threshold=3, cooldown=5, clock=clock
+    )
+    for _ in range(3):
+        fail(breaker)
+    clock.now = 6
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.seconds_until_retry() == 5
+
+
+def http_error(status):
+    request = httpx.Request("GET", "https://upstream")
+    response = httpx.Response(status, request=request)
+    return httpx.HTTPStatusError(str(status), request=request, response=response)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_throttling_and_server_errors_count_as_failures(status):
+    breaker = CircuitBreaker("test-5xx", failure_threshold=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        with breaker.guard():
+            raise http_error(status)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_client_errors_do_not_open_the_breaker():
+    breaker = CircuitBreaker("test-4xx", failure_threshold=1)
+    for status in (400, 404, 422):
+        with pytest.raises(httpx.HTTPStatusError):
+            with breaker.guard():
+                raise http_error(status)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_a_client_error_from_the_probe_closes_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "test-4xx-probe", failure_threshold=1, cooldown=5, clock=clock
+    )
+    fail(breaker)
+    clock.now = 5
+    with pytest.raises(httpx.HTTPStatusError):
+        with breaker.guard():
+            raise http_error(404)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_an_expired_deadline_is_not_an_upstream_failure():
+    breaker = CircuitBreaker("test-deadline", failure_threshold=1)
+    with pytest.raises(DeadlineExceeded):
+        with breaker.guard():
+            raise DeadlineExceeded("request deadline has passed")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breakers_fail_fast_without_spending_rate_limit_tokens(monkeypatch):
+    class Limiter:
+        acquired = 0
+
+        async def acquire(self, default_lane="valuation"):
+            self.acquired += 1
+
+    limiter = Limiter()
+    monkeypatch.setattr(price_api, "clob_limiter", limiter)
+    for name in ("clob_breaker", "book_breaker"):
+        breaker = CircuitBreaker(f"test-{name}", failure_threshold=1)
+        fail(breaker)
+        monkeypatch.setattr(price_api, name, breaker)
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(price_api.fetch_clob_price_map(["t1"]))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(price_api.fetch_book("t1"))
+    assert limiter.acquired == 0
+
+
+def test_clob_serves_last_known_prices_flagged_stale(monkeypatch):
+    async def down(tokens):
+        raise CircuitOpenError("clob-prices circuit is open")
+
+    async def known(tokens):
+        return [
+            {"price": "0.42", "ts": time.time() - 30},
+            {"price": "0.58", "ts": time.time() - 5},
+        ]
+
+    monkeypatch.setattr(price_api, "get_clob_prices", down)
+    monkeypatch.setattr(price_api, "last_known_prices", known)
+    response = client.get("/clob?tokens=t1,t2")
+    assert response.status_code == 200
+    assert response.json() == ["0.42", "0.58"]
+    assert response.headers["X-Stale"] == "true"
+    assert 29 <= int(response.headers["Age"]) <= 31
+
+
+def test_clob_without_last_known_price_is_503(monkeypatch):
+    async def down(tokens):
+        raise CircuitOpenError("clob-prices circuit is open")
+
+    async def unknown(tokens):
+        return None
+
+    monkeypatch.setattr(price_api, "get_clob_prices", down)
+    monkeypatch.setattr(price_api, "last_known_prices", unknown)
+    response = client.get("/clob?tokens=t1")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_fresh_prices_are_not_flagged(monkeypatch):
+    async def up(tokens):
+        return ["0.5"]
+
+    monkeypatch.setattr(price_api, "get_clob_prices", up)
+    response = client.get("/clob?tokens=t1")
+    assert response.json() == ["0.5"]
+    assert "X-Stale" not in response.headers
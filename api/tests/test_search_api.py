@@ -1,20 +1,27 @@
 """Tests for search_api.py"""
 
 import asyncio
+import json
+import uuid
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import httpx
 import pytest
-from api.search_api import app
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+from api import search_api
+from api.search_api import app
+
 client = TestClient(app)
 
 
 def test_search_markets_endpoint(monkeypatch):
     """Test the /search endpoint returns correct JSON."""
-    mock_result = {"events": [{"id": 1, "name": "Test Market"}]}
+    mock_result = {
+        "markets": [{"id": "1", "slug": "test-market", "question": "Test Market"}],
+        "pagination": {"page": 1, "hasMore": False, "totalResults": 1},
+    }
 
     async def mock_cached(q, page):
         return mock_result
@@ -29,7 +36,10 @@ def test_search_markets_endpoint(monkeypatch):
 
 def test_search_markets_endpoint_default_page(monkeypatch):
     """Test /search endpoint with no page number defaults to 1."""
-    mock_result = {"events": [{"id": 1, "name": "Test Market"}]}
+    mock_result = {
+        "markets": [{"id": "1", "slug": "test-market", "question": "Test Market"}],
+        "pagination": {"page": 1, "hasMore": False, "totalResults": 1},
+    }
 
     async def mock_cached(q, page):
         assert page == 1
@@ -46,3 +56,151 @@ def test_search_markets_endpoint_invalid_page(monkeypatch):
     """Test FastAPI validation rejects negative page numbers."""
     response = client.get("/search?q=russia&page=-1")
     assert response.status_code == 422  # Unprocessable Entity due to validation
+
+
+GAMMA_RESPONSE = {
+    "events": [
+        {
+            "id": "1",
+            "tags": [{"id": "2", "label": "Crypto"}],
+            "markets": [
+                {
+                    "id": "10",
+                    "slug": "btc-100k",
+                    "question": "Will BTC hit 100k?",
+                    "conditionId": "0xabc",
+                    "volume": "1234.5",
+                    "active": True,
+                    "closed": False,
+                    "outcomes": '["Yes", "No"]',
+                    "outcomePrices": '["0.25", "0.75"]',
+                    "clobTokenIds": '["111", "222"]',
+                },
+                {
+                    "id": "11",
+                    "slug": "btc-closed",
+                    "question": "Closed market",
+                    "active": True,
+                    "closed": True,
+                },
+                {
+                    "id": "12",
+                    "slug": "broken",
+                    "question": "Bad",
+                    "active": True,
+                    "closed": False,
+                    "outcomePrices": "not json",
+                },
+            ],
+        }
+    ],
+    "pagination": {"hasMore": True, "totalResults": 40},
+}
+
+
+def test_project_search_keeps_open_markets_with_decoded_fields():
+    """Closed and malformed markets are dropped; list fields are decoded once."""
+    page = search_api.project_search(GAMMA_RESPONSE, 2)
+    assert page == {
+        "markets": [
+            {
+                "id": "10",
+                "slug": "btc-100k",
+                "question": "Will BTC hit 100k?",
+                "description": "",
+                "volume": 1234.5,
+                "outcomes": ["Yes", "No"],
+                "outcomePrices": [0.25, 0.75],
+                "clobTokenIds": ["111", "222"],
+            }
+        ],
+        "pagination": {"page": 2, "hasMore": True, "totalResults": 40},
+    }
+
+
+def test_search_returns_the_slim_projection(monkeypatch):
+    """/search projects the upstream response instead of passing it through."""
+
+    async def fake_fetch(q, page):
+        return GAMMA_RESPONSE
+
+    monkeypatch.setattr(search_api, "fetch_polymarket_search", fake_fetch)
+    monkeypatch.setattr(search_api, "PREFETCH_TOP_N", 0)
+
+    response = client.get("/search?q=projection-test&page=3")
+    assert response.status_code == 200
+    body = response.json()
+    assert [m["slug"] for m in body["markets"]] == ["btc-100k"]
+    assert "conditionId" not in body["markets"][0]
+    assert body["pagination"] == {"page": 3, "hasMore": True, "totalResults": 40}
+
+
+def test_autocomplete_suggests_from_searches_already_made(monkeypatch):
+    """Suggestions come from earlier search responses, not from gamma."""
+    fetch = AsyncMock(return_value=GAMMA_RESPONSE)
+    monkeypatch.setattr(search_api, "fetch_polymarket_search", fetch)
+    monkeypatch.setattr(search_api, "PREFETCH_TOP_N", 0)
+    monkeypatch.setattr(search_api, "suggestions", search_api.PrefixIndex())
+
+    assert client.get("/autocomplete?q=bt").json() == {"suggestions": []}
+    client.get("/search", params={"q": f"autocomplete-{uuid.uuid4()}"})
+    calls = fetch.await_count
+
+    response = client.get("/autocomplete?q=will bt")
+    assert response.status_code == 200
+    assert response.json()["suggestions"] == [
+        {"text": "Will BTC hit 100k?", "kind": "market", "slug": "btc-100k"}
+    ]
+    assert fetch.await_count == calls
+    assert client.get("/autocomplete?q=closed").json() == {"suggestions": []}
+    assert client.get("/autocomplete?q=b").status_code == 422
+
+
+def gamma_market(closed, prices, tokens=("111", "222")):
+    return {
+        "id": "10",
+        "slug": "btc-100k",
+        "question": "Will BTC hit 100k?",
+        "closed": closed,
+        "outcomePrices": json.dumps([str(p) for p in prices]),
+        "clobTokenIds": json.dumps(list(tokens)),
+    }
+
+
+def test_resolved_payouts():
+    assert search_api.resolved_payouts(gamma_market(True, [1, 0])) == {
+        "111": 1.0,
+        "222": 0.0,
+    }
+    assert search_api.resolved_payouts(gamma_market(True, [0.5, 0.5])) == {
+        "111": 0.5,
+        "222": 0.5,
+    }
+    # Open, or closed but not yet decided
+    assert search_api.resolved_payouts(gamma_market(False, [1, 0])) == {}
+    assert search_api.resolved_payouts(gamma_market(True, [0.97, 0.03])) == {}
+
+
+def test_resolutions_endpoint_asks_gamma_in_chunks(monkeypatch):
+    requested = []
+
+    async def fake_fetch(tokens):
+        requested.append(tokens)
+        return {"111": 1.0, "222": 0.0} if "111" in tokens else {}
+
+    monkeypatch.setattr(search_api, "fetch_resolutions", fake_fetch)
+    monkeypatch.setattr(search_api, "RESOLUTION_CHUNK", 2)
+
+    response = client.post("/resolutions", json={"tokens": ["111", "222", "333"]})
+    assert response.status_code == 200
+    assert response.json() == {"resolved": {"111": 1.0, "222": 0.0}}
+    assert requested == [["111", "222"], ["333"]]
+
+
+def test_resolutions_endpoint_reports_upstream_failures(monkeypatch):
+    async def failing(tokens):
+        raise httpx.ConnectError("gamma down")
+
+    monkeypatch.setattr(search_api, "fetch_resolutions", failing)
+    response = client.post("/resolutions", json={"tokens": ["111"]})
+    assert response.status_code == 502
@@ -0,0 +1,61 @@
+"Tests for the cache serializers"
+
+import pytest
+from aiocache.serializers import JsonSerializer
+
+from api.serializers import (
+    MsgpackSerializer,
+    OrjsonSerializer,
+    ZstdSerializer,
+    get_serializer,
+)
+
+HISTORY = {
+    "history": [{"t": 1735689600 + 60 * i, "p": 0.5 + i / 1e4} for i in range(500)]
+}
+
+
+@pytest.mark.parametrize(
+    "serializer",
+    [
+        OrjsonSerializer(),
+        MsgpackSerializer(),
+        ZstdSerializer(OrjsonSerializer()),
+        ZstdSerializer(MsgpackSerializer()),
+    ],
+)
+def test_round_trip(serializer):
+    assert serializer.loads(serializer.dumps(HISTORY)) == HISTORY
+    assert serializer.loads(None) is None
+
+
+def test_zstd_only_compresses_large_values():
+    serializer = ZstdSerializer(OrjsonSerializer(), min_size=100)
+    small = serializer.dumps(["0.5"])
+    large = serializer.dumps(HISTORY)
+    assert small[:1] == b"\x00"
+    assert large[:1] == b"\x01"
+    assert len(large) < len(OrjsonSerializer().dumps(HISTORY)) / 2
+
+
+def test_get_serializer_reads_the_environment(monkeypatch):
+    monkeypatch.setenv("CACHE_SERIALIZER", "msgpack")
+    monkeypatch.setenv("CACHE_COMPRESSION", "zstd")
+    serializer = get_serializer()
+    assert isinstance(serializer, ZstdSerializer)
+    assert isinstance(serializer.inner, MsgpackSerializer)
+
+
+def test_get_serializer_defaults_to_orjson(monkeypatch):
+    monkeypatch.delenv("CACHE_SERIALIZER", raising=False)
+    monkeypatch.delenv("CACHE_COMPRESSION", raising=False)
+    assert isinstance(get_serializer(), OrjsonSerializer)
+    assert isinstance(get_serializer("json"), JsonSerializer)
+
+
+@pytest.mark.parametrize(
+    "name,compression", [("yaml", "none"), ("json", "zstd"), ("orjson", "gzip")]
+)
+def test_get_serializer_rejects_bad_settings(name, compression):
+    with pytest.raises(ValueError):
+        get_serializer(name, compression)
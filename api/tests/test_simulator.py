@@ -0,0 +1,150 @@
+"Tests for the local Polymarket simulator"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import simulator
+from api.simulator import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_faults():
+    """Every test starts with faults switched off and empty stats."""
+    client.post(
+        "/_sim/config",
+        json={"latency_ms": 0, "jitter_ms": 0, "error_rate": 0, "rate_limit": 0},
+    )
+    client.post("/_sim/reset")
+
+
+def _first_market():
+    data = client.get("/public-search?q=bitcoin").json()
+    return data["events"][0]["markets"][0]
+
+
+def test_search_is_deterministic_and_paginated():
+    first = client.get("/public-search?q=bitcoin&page=1").json()
+    again = client.get("/public-search?q=bitcoin&page=1").json()
+    second = client.get("/public-search?q=bitcoin&page=2").json()
+    assert [e["id"] for e in first["events"]] == [e["id"] for e in again["events"]]
+    assert first["pagination"]["hasMore"] is True
+    assert {e["id"] for e in first["events"]}.isdisjoint(
+        e["id"] for e in second["events"]
+    )
+    for event in first["events"]:
+        for market in event["markets"]:
+            assert "bitcoin" in market["question"].lower()
+            assert isinstance(market["clobTokenIds"], str)  # gamma sends JSON strings
+
+
+def test_outcome_prices_sum_to_one():
+    yes, no = simulator.catalog()[0]["clobTokenIds"]
+    assert simulator.current_price(yes) + simulator.current_price(no) == pytest.approx(
+        1.0, abs=1e-3
+    )
+
+
+def test_history_agrees_across_intervals():
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    day = client.get(f"/prices-history?market={token}&interval=1d").json()["history"]
+    week = client.get(f"/prices-history?market={token}&interval=1w&fidelity=60").json()[
+        "history"
+    ]
+    by_time = {p["t"]: p["p"] for p in day}
+    shared = [p for p in week if p["t"] in by_time]
+    assert shared
+    assert all(by_time[p["t"]] == p["p"] for p in shared)
+    assert all(0 < p["p"] < 1 for p in day)
+
+
+def test_max_history_is_thinned():
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    history = client.get(f"/prices-history?market={token}&interval=max").json()
+    assert len(history["history"]) <= simulator.MAX_POINTS + 1
+
+
+def test_empty_fidelity_is_ignored():
+    # price_api forwards fidelity= when the caller did not pick one
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    response = client.get(f"/prices-history?market={token}&interval=1d&fidelity=")
+    assert response.status_code == 200
+    assert response.json()["history"]
+
+
+def test_prices_returns_book_price_per_token():
+    yes, no = simulator.catalog()[0]["clobTokenIds"]
+    result = client.post(
+        "/prices",
+        json=[{"token_id": yes, "side": "BUY"}, {"token_id": no, "side": "BUY"}],
+    ).json()
+    assert set(result) == {yes, no}
+    assert 0 < float(result[yes]["BUY"]) < 1
+
+
+def test_prices_are_null_for_an_empty_side(monkeypatch):
+    empty = {"bids": [], "asks": [{"price": "0.99", "size": "5"}]}
+    monkeypatch.setattr(simulator, "order_book", lambda token, now=None: empty)
+    result = client.post(
+        "/prices",
+        json=[{"token_id": "t", "side": "SELL"}, {"token_id": "u", "side": "BUY"}],
+    ).json()
+    assert result == {"t": {"SELL": None}, "u": {"BUY": "0.99"}}
+
+
+def test_error_rate_injects_503():
+    client.post("/_sim/config", json={"error_rate": 1})
+    response = client.get("/public-search?q=bitcoin")
+    assert response.status_code == 503
+    assert client.get("/_sim/stats").json()["503"] == 1
+
+
+def test_rate_limit_injects_429():
+    client.post("/_sim/config", json={"rate_limit": 1})
+    statuses = [client.get("/public-search?q=oil").status_code for _ in range(5)]
+    assert 429 in statuses
+    assert client.get("/_sim/stats").json()["GET /public-search"] == 5
+
+
+def test_market_channel_sends_book_then_deltas(monkeypatch):
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    books = iter(
+        [
+            {
+                "market": "m",
+                "asset_id": token,
+                "timestamp": "1",
+                "hash": "a",
+                "bids": [{"price": "0.49", "size": "10"}],
+                "asks": [{"price": "0.51", "size": "10"}],
+            },
+            {
+                "market": "m",
+                "asset_id": token,
+                "timestamp": "2",
+                "hash": "b",
+                "bids": [{"price": "0.49", "size": "25"}],
+                "asks": [{"price": "0.51", "size": "10"}],
+            },
+        ]
+    )
+    monkeypatch.setattr(simulator, "order_book", lambda asset, now=None: next(books))
+    monkeypatch.setattr(simulator, "TICK_SECONDS", 0.01)
+    with client.websocket_connect("/ws/market") as ws:
+        ws.send_json({"assets_ids": [token], "type": "market"})
+        snapshot = ws.receive_json()
+        delta = ws.receive_json()
+    assert snapshot[0]["event_type"] == "book"
+    assert delta["event_type"] == "price_change"
+    assert delta["price_changes"] == [
+        {
+            "asset_id": token,
+            "price": "0.49",
+            "size": "25",
+            "side": "BUY",
+            "hash": "b",
+            "best_bid": "0.49",
+            "best_ask": "0.51",
+        }
+    ]
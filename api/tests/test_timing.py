@@ -0,0 +1,60 @@
+"Tests for Server-Timing headers and the on-demand profiler"
+
+from fastapi.testclient import TestClient
+
+from api import timing
+from api.price_api import app
+
+client = TestClient(app)
+
+
+def test_header_value_formats_phases_in_milliseconds():
+    value = timing.header_value({"cache": 0.0012, "upstream": 0.25}, 0.3)
+    assert value == "cache;dur=1.2, upstream;dur=250.0, total;dur=300.0"
+
+
+def test_responses_carry_server_timing_with_upstream_phase(monkeypatch):
+    async def mock_get(tokens):
+        timing.record("upstream", 0.05)
+        return ["0.5"]
+
+    monkeypatch.setattr("api.price_api.get_clob_prices", mock_get)
+    response = client.get("/clob?tokens=t1")
+    assert response.status_code == 200
+    assert "upstream;dur=50.0" in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+
+def test_record_outside_a_request_is_ignored():
+    timing.record("db", 1.0)
+
+
+def test_profile_requires_the_token(monkeypatch):
+    monkeypatch.setenv("PROFILE_TOKEN", "secret")
+    response = client.get("/clob?tokens=%20&profile=1")
+    assert response.status_code == 400
+    response = client.get(
+        "/clob?tokens=%20&profile=1", headers={"X-Profile-Token": "wrong"}
+    )
+    assert response.status_code == 400
+
+
+def test_profile_returns_folded_stacks(monkeypatch):
+    monkeypatch.setenv("PROFILE_TOKEN", "secret")
+
+    async def slow_get(tokens):
+        deadline = timing.time.perf_counter() + 0.05
+        while timing.time.perf_counter() < deadline:
+            pass
+        return ["0.5"]
+
+    monkeypatch.setattr("api.price_api.get_clob_prices", slow_get)
+    response = client.get(
+        "/clob?tokens=t1", headers={"X-Profile": "1", "X-Profile-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.strip().splitlines()
+    assert lines
+    assert any("slow_get" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
@@ -0,0 +1,142 @@
+"""
+Per-request timing for the FastAPI services: Server-Timing phases and an
+on-demand sampling profiler.
+
+Upstream calls and cache lookups add their durations to the current
+request through `record`, and every response carries
+
+    Server-Timing: cache;dur=0.8, upstream;dur=212.4, total;dur=214.0
+
+Sending `X-Profile-Token: $PROFILE_TOKEN` together with `?profile=1` (or
+`X-Profile: 1`) returns a profile of the request instead of its body, as
+folded stacks for flamegraph.pl or speedscope. The event loop thread is
+sampled, so requests running concurrently show up in the profile too.
+"""
+
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "server_timing", default=None
+)
+
+
+def record(name: str, seconds: float):
+    """Add `seconds` to phase `name` of the current request, if there is one."""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name: str):
+    """Time the enclosed block and add it to phase `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def header_value(phases: Dict[str, float], total: float) -> str:
+    """Format phase totals (seconds) as a Server-Timing header value."""
+    parts = [f"{name};dur={phases[name] * 1000:.1f}" for name in phases]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread and counts identical stacks.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(  # pylint: disable=protected-access
+                self.thread_id
+            )
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                    f":{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        """Start sampling in the background."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread to exit."""
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """One `frame;frame;... count` line per distinct stack, busiest first."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def profiling_requested(request: Request) -> bool:
+    """True when the request asks for a profile and carries the admin token."""
+    token = os.getenv("PROFILE_TOKEN")
+    wanted = (
+        request.query_params.get("profile") == "1"
+        or request.headers.get("X-Profile") == "1"
+    )
+    return bool(
+        token
+        and wanted
+        and secrets.compare_digest(request.headers.get("X-Profile-Token", ""), token)
+    )
+
+
+def install(app: FastAPI):
+    """Add Server-Timing headers and the token-guarded profiler to `app`."""
+
+    @app.middleware("http")
+    async def server_timing(request: Request, call_next):
+        start = time.perf_counter()
+        phases: Dict[str, float] = {}
+        reset = _phases.set(phases)
+        profiler = None
+        if profiling_requested(request):
+            profiler = StackSampler(threading.get_ident()).start()
+        try:
+            response = await call_next(request)
+        finally:
+            _phases.reset(reset)
+            if profiler is not None:
+                profiler.stop()
+        if profiler is not None:
+            response = PlainTextResponse(profiler.folded())
+        response.headers["Server-Timing"] = header_value(
+            phases, time.perf_counter() - start
+        )
+        return response
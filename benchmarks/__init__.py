@@ -0,0 +1 @@
+"Performance benchmarks for the web app and API services"
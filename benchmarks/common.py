@@ -0,0 +1,166 @@
+"Shared helpers for the benchmark scripts: load generation, latency stats, result files"
+
+import json
+import math
+import os
+import platform
+import socket
+import threading
+import time
+
+import requests
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of `samples` for `pct` in [0, 100]."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies_ms, errors, elapsed):
+    """Collapse raw latencies (milliseconds) into throughput and percentiles."""
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "rps": round(len(latencies_ms) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
+
+
+class LatencyRecorder:
+    """Thread-safe collector of per-route latencies and error counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+
+    def record(self, route, latency_ms, ok=True):
+        with self._lock:
+            self._latencies.setdefault(route, [])
+            self._errors.setdefault(route, 0)
+            if ok:
+                self._latencies[route].append(latency_ms)
+            else:
+                self._errors[route] += 1
+
+    def summary(self, elapsed):
+        """`summarize` output for every route seen, keyed by route."""
+        with self._lock:
+            return {
+                route: summarize(latencies, self._errors[route], elapsed)
+                for route, latencies in sorted(self._latencies.items())
+            }
+
+
+def machine():
+    """What absolute timings depend on: CPU, core count, OS and Python."""
+    return {
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "system": platform.system(),
+        "python": platform.python_version(),
+    }
+
+
+def compare_to_baseline(current, baseline, tolerance=0.25):
+    """
+    Compare per-route summaries against a baseline of the same shape.
+
+    A route regresses when its p95 grows, or its throughput drops, by more
+    than `tolerance` (a fraction), or when it starts returning errors.
+    Returns human-readable regression messages; empty means no regression.
+    """
+    regressions = []
+    for route, base in sorted(baseline.items()):
+        now = current.get(route)
+        if now is None:
+            regressions.append(f"{route}: missing from this run")
+            continue
+        if base["p95_ms"] and now["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{route}: p95 {now['p95_ms']}ms vs baseline {base['p95_ms']}ms"
+            )
+        if base["rps"] and now["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(
+                f"{route}: {now['rps']} req/s vs baseline {base['rps']} req/s"
+            )
+        if now["errors"] > base["errors"]:
+            regressions.append(
+                f"{route}: {now['errors']} errors vs baseline {base['errors']}"
+            )
+    return regressions
+
+
+def run_load(request_fn, concurrency, duration):
+    """
+    Call `request_fn(worker_index)` in a loop from `concurrency` threads for
+    `duration` seconds. `request_fn` returns True on success. Returns the
+    `summarize` dict for the run.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = request_fn(index)
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local.append((time.perf_counter() - start) * 1000)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def free_port():
+    """Ask the OS for an unused TCP port on localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_http(url, timeout=30):
+    """Poll `url` until it answers with any HTTP status or `timeout` expires."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1, allow_redirects=False)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def write_results(name, payload):
+    """Write `payload` to benchmarks/results/<name>.json and return the path."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2, sort_keys=True)
+    return path
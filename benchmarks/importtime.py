@@ -0,0 +1,180 @@
+"""
+Import time of each service, as measured by `python -X importtime`.
+
+Each service module is imported in a fresh interpreter (started from the
+repository root) `--repeat` times and the fastest run is kept. For every
+service the benchmark reports the total import time, the number of modules
+loaded and its slowest direct imports (cumulative time). Clients that are
+slow to import are built on first use instead (`DEFERRED`); the benchmark
+lists any of them that the import pulled in anyway. Results go to
+benchmarks/results/importtime.json and are compared with the baseline in
+benchmarks/baselines/importtime.json; the exit code is 1 if a service's
+import time grew by more than --tolerance or a deferred package is imported
+at startup.
+
+    python -m benchmarks.importtime --repeat 5
+    python -m benchmarks.importtime --update-baseline
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+from benchmarks.common import write_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "importtime.json")
+
+SERVICES = {
+    "price_api": "api.price_api",
+    "search_api": "api.search_api",
+    "web_app": "web_app.app",
+}
+# Packages a service imports on first use only, never at startup
+DEFERRED = {
+    "price_api": ("py_clob_client",),
+}
+
+
+class ImportLine(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse(stderr: str) -> List[ImportLine]:
+    """The `import time:` lines of `-X importtime` output, in order."""
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        lines.append(ImportLine(name.strip(), int(self_us), int(cumulative_us), depth))
+    return lines
+
+
+def profile(module: str) -> List[ImportLine]:
+    """Import `module` in a fresh interpreter and parse its import times."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse(proc.stderr)
+
+
+def summarize_profile(
+    lines: List[ImportLine], module: str, deferred=(), top: int = 10
+) -> Dict:
+    """Total time, module count and slowest direct imports of `module`."""
+    children: List[ImportLine] = []
+    total = None
+    pending: List[ImportLine] = []
+    for line in lines:
+        if line.depth == 1:
+            pending.append(line)
+        elif line.depth == 0:
+            # A top-level import is printed after everything it imported
+            if line.module == module:
+                total, children = line, pending
+            pending = []
+    if total is None:
+        raise ValueError(f"{module} does not appear in the import profile")
+    loaded = {line.module for line in lines}
+    children.sort(key=lambda line: line.cumulative_us, reverse=True)
+    return {
+        "total_ms": round(total.cumulative_us / 1000, 1),
+        "modules": len(loaded),
+        "slowest": [
+            {
+                "module": line.module,
+                "cumulative_ms": round(line.cumulative_us / 1000, 1),
+            }
+            for line in children[:top]
+        ],
+        "deferred_loaded": sorted(
+            package
+            for package in deferred
+            if any(m == package or m.startswith(package + ".") for m in loaded)
+        ),
+    }
+
+
+def measure(service: str, repeat: int = 3) -> Dict:
+    """`summarize_profile` of the fastest of `repeat` imports of `service`."""
+    module = SERVICES[service]
+    runs = [
+        summarize_profile(profile(module), module, DEFERRED.get(service, ()))
+        for _ in range(repeat)
+    ]
+    return min(runs, key=lambda run: run["total_ms"])
+
+
+def regressions(current: Dict, baseline: Dict, tolerance: float = 0.25) -> List[str]:
+    """Services whose import slowed down, or that import a deferred package."""
+    messages = []
+    for service, now in sorted(current.items()):
+        if now["deferred_loaded"]:
+            messages.append(f"{service}: imports {now['deferred_loaded']} at startup")
+        base = baseline.get(service)
+        if base and now["total_ms"] > base["total_ms"] * (1 + tolerance):
+            messages.append(
+                f"{service}: {now['total_ms']}ms vs baseline {base['total_ms']}ms"
+            )
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument(
+        "--services", nargs="+", choices=sorted(SERVICES), default=list(SERVICES)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = {service: measure(service, args.repeat) for service in args.services}
+    for service, result in results.items():
+        slowest = ", ".join(
+            f"{entry['module']} {entry['cumulative_ms']:.0f}"
+            for entry in result["slowest"][:3]
+        )
+        print(
+            f"{service:<10} {result['total_ms']:8.1f} ms  "
+            f"{result['modules']:>5} modules  slowest: {slowest}"
+        )
+        if result["deferred_loaded"]:
+            print(f"{'':<10} imported at startup: {result['deferred_loaded']}")
+    print(f"results written to {write_results('importtime', results)}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"baseline updated at {args.baseline}")
+        return 0
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    else:
+        print("no baseline stored; run with --update-baseline to create one")
+    found = regressions(results, baseline, args.tolerance)
+    for message in found:
+        print(f"REGRESSION {message}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""
+web_app with an in-memory mongomock database in place of MongoDB.
+
+Only meant for benchmarks: serve it from a single worker process (threads are
+fine) so every request sees the same data, e.g.
+
+    python -m gunicorn -k gthread --workers 1 --threads 16 benchmarks.inmemory_web:app
+"""
+
+import mongomock
+
+import web_app.app as app_module
+
+app_module.db = mongomock.MongoClient()["polypaper"]
+app = app_module.app
@@ -0,0 +1,334 @@
+"""
+End-to-end load test: user journeys through web_app, search_api and price_api.
+
+Starts the Polymarket simulator (api/simulator.py) and the three services as
+separate processes: web_app under gunicorn (one gthread worker backed by
+mongomock in place of MongoDB), search_api and price_api under uvicorn. Virtual users each register once and
+then loop the journey
+
+    search -> open market -> switch chart intervals -> poll live price
+    -> trade -> view portfolio
+
+for the configured duration. p50/p95/p99 latency and throughput per route are
+written to benchmarks/results/loadtest.json and compared with the stored
+baseline in benchmarks/baselines/loadtest.json; the exit code is 1 if any
+route regressed by more than --tolerance.
+
+The services find the simulator through the same variables that point them
+at Polymarket in production: price_api reads POLYMARKET_CLOB_URL and
+POLYMARKET_WS_URL, search_api POLYMARKET_GAMMA_URL; unset, they default to
+the real hosts.
+
+Only runs of the same workload are compared: if the baseline was recorded
+with other --users, --duration, --web-threads, --upstream-latency-ms or
+--seed, the comparison is refused (exit code 2). Latencies also depend on
+the machine, so the baseline records the machine it was taken on
+(`common.machine()`); on another machine the comparison still runs but
+prints a warning, and a local baseline (--update-baseline) is the better
+reference there.
+
+Run from the repository root (Redis for the API caches is optional; service
+logs go to benchmarks/results/loadtest.log):
+
+    python -m benchmarks.loadtest --users 16 --duration 30
+    python -m benchmarks.loadtest --update-baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+from benchmarks.common import (
+    RESULTS_DIR,
+    LatencyRecorder,
+    compare_to_baseline,
+    free_port,
+    machine,
+    wait_for_http,
+    write_results,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "loadtest.json")
+# Options that change the workload; runs are only compared when they match
+WORKLOAD = ("users", "duration", "web_threads", "upstream_latency_ms", "seed")
+# Subjects the simulator's catalog is generated from
+QUERIES = ("election", "bitcoin", "the fed", "world cup", "weather")
+CHART_INTERVALS = ("1d", "1w", "max")
+
+SLUG_RE = re.compile(r"market_details\?slug=([^\"&]+)")
+ASSET_IDS_RE = re.compile(r"data-asset-ids='([^']*)'")
+
+
+class Services:
+    """Launches the three services as subprocesses; use as a context manager."""
+
+    def __init__(self, upstream_latency_ms, redis_host, threads):
+        self.upstream_latency_ms = upstream_latency_ms
+        self.upstream_url = None
+        self.redis_host = redis_host
+        self.threads = threads
+        self.procs = []
+        self.log = None
+        self.web_url = self.search_url = self.price_url = None
+
+    def _spawn(self, args, env):
+        proc = subprocess.Popen(
+            [sys.executable, "-m", *args],
+            cwd=ROOT,
+            env=dict(os.environ, **env),
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+        self.procs.append(proc)
+
+    def _uvicorn(self, target, extra_env):
+        port = free_port()
+        env = {"REDIS_HOST": self.redis_host, **extra_env}
+        self._spawn(
+            ["uvicorn", target, "--port", str(port), "--log-level", "warning"], env
+        )
+        return f"http://127.0.0.1:{port}"
+
+    def __enter__(self):
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        # pylint: disable-next=consider-using-with
+        self.log = open(
+            os.path.join(RESULTS_DIR, "loadtest.log"), "w", encoding="utf-8"
+        )
+        self.upstream_url = self._uvicorn(
+            "api.simulator:app", {"SIM_LATENCY_MS": str(self.upstream_latency_ms)}
+        )
+        self.price_url = self._uvicorn(
+            "api.price_api:app",
+            {
+                "POLYMARKET_CLOB_URL": self.upstream_url,
+                "POLYMARKET_WS_URL": self.upstream_url.replace("http", "ws", 1)
+                + "/ws/market",
+            },
+        )
+        self.search_url = self._uvicorn(
+            "api.search_api:app",
+            {
+                "POLYMARKET_GAMMA_URL": self.upstream_url,
+                "PRICE_SERVICE_URL": self.price_url,
+            },
+        )
+        port = free_port()
+        self._spawn(
+            [
+                "gunicorn",
+                "-k",
+                "gthread",
+                "--workers",
+                "1",
+                "--threads",
+                str(self.threads),
+                "--bind",
+                f"127.0.0.1:{port}",
+                "benchmarks.inmemory_web:app",
+            ],
+            {
+                "SEARCH_URL": self.search_url,
+                "PRICE_SERVICE_URL": self.price_url,
+                "SECRET_KEY": "loadtest",
+            },
+        )
+        self.web_url = f"http://127.0.0.1:{port}"
+        for url in (self.upstream_url, self.search_url, self.price_url):
+            wait_for_http(f"{url}/docs")
+        wait_for_http(self.web_url)
+        return self
+
+    def __exit__(self, *exc):
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            proc.wait(timeout=30)
+        self.log.close()
+
+
+class VirtualUser:
+    """One browser session walking the journey and recording each step."""
+
+    def __init__(self, base_url, recorder, rng):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+        self.session = requests.Session()
+
+    def _call(self, route, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(
+                method,
+                self.base_url + path,
+                timeout=60,
+                allow_redirects=False,
+                **kwargs,
+            )
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            resp, ok = None, False
+        self.recorder.record(route, (time.perf_counter() - start) * 1000, ok)
+        return resp if ok else None
+
+    def register(self):
+        self._call(
+            "POST /register",
+            "POST",
+            "/register",
+            data={
+                "email": f"load-{uuid.uuid4().hex}@example.com",
+                "username": "loadtest",
+                "password": "loadtest",
+                "starting_balance": "1000000",
+            },
+        )
+
+    def journey(self):
+        query = self.rng.choice(QUERIES)
+        resp = self._call("GET /markets", "GET", "/markets", params={"q": query})
+        slugs = SLUG_RE.findall(resp.text) if resp is not None else []
+        if not slugs:
+            return
+        resp = self._call(
+            "GET /market_details",
+            "GET",
+            "/market_details",
+            params={"slug": self.rng.choice(slugs)},
+        )
+        match = ASSET_IDS_RE.search(resp.text) if resp is not None else None
+        if not match:
+            return
+        asset_ids = json.loads(match.group(1))
+        for interval in CHART_INTERVALS:
+            self._call(
+                "GET /api/historical_prices",
+                "GET",
+                "/api/historical_prices",
+                params={"assets": asset_ids, "interval": interval},
+            )
+        side = self.rng.randrange(2)
+        self._call(
+            "GET /live_prices",
+            "GET",
+            "/live_prices",
+            params={"tokens": asset_ids[side]},
+        )
+        resp = self._call(
+            "POST /trade",
+            "POST",
+            "/trade",
+            json={
+                "asset_id": asset_ids[side],
+                "bid": self.rng.randint(1, 100),
+                "question": query,
+                "side": "NO" if side else "YES",
+            },
+        )
+        if resp is not None and not resp.json().get("success"):
+            self.recorder.record("POST /trade", 0, ok=False)
+        self._call("GET /portfolio", "GET", "/portfolio")
+
+
+def run_users(base_url, users, duration, seed):
+    """Run `users` virtual users concurrently; return per-route summaries."""
+    recorder = LatencyRecorder()
+    deadline = time.perf_counter() + duration
+
+    def loop(index):
+        user = VirtualUser(base_url, recorder, random.Random(seed + index))
+        user.register()
+        while time.perf_counter() < deadline:
+            user.journey()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.summary(time.perf_counter() - started)
+
+
+def config_differences(baseline_config, config):
+    """The WORKLOAD options whose values differ between two runs."""
+    return {
+        key: (baseline_config.get(key), config.get(key))
+        for key in WORKLOAD
+        if baseline_config.get(key) != config.get(key)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--web-threads", type=int, default=16)
+    parser.add_argument("--upstream-latency-ms", type=float, default=20)
+    parser.add_argument("--redis-host", default=os.getenv("REDIS_HOST", "localhost"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    with Services(
+        args.upstream_latency_ms, args.redis_host, args.web_threads
+    ) as services:
+        routes = run_users(services.web_url, args.users, args.duration, args.seed)
+
+    for route, stats in routes.items():
+        print(
+            f"{route:28} {stats['rps']:7.1f} req/s  p50 {stats['p50_ms']:8.2f}  "
+            f"p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms  "
+            f"errors {stats['errors']}"
+        )
+    config = {
+        k: v
+        for k, v in vars(args).items()
+        if k not in ("baseline", "update_baseline", "tolerance")
+    }
+    report = {"config": config, "machine": machine(), "routes": routes}
+    print(f"results written to {write_results('loadtest', report)}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        print(f"baseline updated at {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline stored; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    differences = config_differences(baseline["config"], config)
+    if differences:
+        for key, (then, now) in sorted(differences.items()):
+            print(f"baseline has {key}={then}, this run {key}={now}")
+        print("not compared: rerun with the baseline's options")
+        return 2
+    if baseline.get("machine") != report["machine"]:
+        print(
+            "WARNING baseline was recorded on another machine; latencies may "
+            "differ for that reason alone (--update-baseline records one here)"
+        )
+    regressions = compare_to_baseline(routes, baseline["routes"], args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
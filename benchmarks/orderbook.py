@@ -0,0 +1,121 @@
+"""
+Cost of keeping local order books and of pricing fills against them.
+
+Updates: `book` snapshots and `price_change` deltas for `--tokens` tokens
+are generated by the simulator (one step of its random walk per message),
+then applied with `BookStore.handle` the way the market channel delivers
+them. Reported as messages and level changes applied per second.
+
+Fill price: `OrderBook.fill` for each `--notionals` amount against a
+simulator book (10 levels a side) and against a full book (a level at
+every cent), reported as p50/p99 microseconds per query. Results go to
+benchmarks/results/orderbook.json.
+
+    python -m benchmarks.orderbook --tokens 50 --steps 200
+"""
+
+import argparse
+import time
+
+from api import simulator
+from api.orderbook import BookStore, OrderBook
+from benchmarks.common import percentile, write_results
+
+START = 1_700_000_000
+
+
+def book_messages(tokens, steps):
+    """The snapshot of each token, then its deltas step by step."""
+    books = {t: simulator.order_book(t, START) for t in tokens}
+    messages = [[{"event_type": "book", **b} for b in books.values()]]
+    for step in range(1, steps + 1):
+        now = START + step * simulator.STEP_SECONDS
+        for token in tokens:
+            latest = simulator.order_book(token, now)
+            changes = simulator._book_delta(books[token], latest)
+            books[token] = latest
+            if changes:
+                messages.append(
+                    {"event_type": "price_change", "price_changes": changes}
+                )
+    return messages
+
+
+def measure_updates(token_count, steps, repeat):
+    tokens = [m["clobTokenIds"][0] for m in simulator.catalog()[:token_count]]
+    messages = book_messages(tokens, steps)
+    changes = sum(len(m.get("price_changes", [])) for m in messages[1:])
+    best = float("inf")
+    for _ in range(repeat):
+        store = BookStore()
+        started = time.perf_counter()
+        for message in messages:
+            store.handle(message)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "tokens": len(tokens),
+        "messages": len(messages),
+        "level_changes": changes,
+        "seconds": round(best, 4),
+        "messages_per_s": round(len(messages) / best),
+        "level_changes_per_s": round(changes / best),
+    }
+
+
+def full_book():
+    """A level at every cent: the deepest book a Polymarket token can have."""
+    levels = [{"price": f"{c / 100:.2f}", "size": "100"} for c in range(1, 100)]
+    return OrderBook({"bids": levels[:50], "asks": levels[50:]})
+
+
+def measure_fills(notionals, repeat):
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    books = {
+        "simulator": OrderBook(simulator.order_book(token, START)),
+        "full": full_book(),
+    }
+    results = {}
+    for name, book in books.items():
+        for notional in notionals:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                fill = book.fill(notional)
+                samples.append((time.perf_counter() - started) * 1e6)
+            results[f"{name}:{notional}"] = {
+                "levels": fill["levels"],
+                "complete": fill["complete"],
+                "p50_us": round(percentile(samples, 50), 2),
+                "p99_us": round(percentile(samples, 99), 2),
+            }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument(
+        "--notionals", type=float, nargs="+", default=[100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    updates = measure_updates(args.tokens, args.steps, repeat=3)
+    print(
+        f"updates  {updates['messages_per_s']:>9} msg/s  "
+        f"{updates['level_changes_per_s']:>9} level changes/s "
+        f"({updates['tokens']} tokens, {updates['messages']} messages)"
+    )
+    fills = measure_fills(args.notionals, args.repeat)
+    for name, result in fills.items():
+        print(
+            f"fill {name:<18} {result['levels']:>3} levels  "
+            f"p50 {result['p50_us']:7.2f} us  p99 {result['p99_us']:7.2f} us"
+        )
+    path = write_results("orderbook", {"updates": updates, "fills": fills})
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+CPU cost of the cache serializers and response classes on real-sized payloads.
+
+Payloads come from the Polymarket simulator: a 1-day minute-resolution
+`prices-history` series, a thinned `max` series and a page of
+`public-search`. For each serializer the benchmark times a cache write
+(dumps), a cache read (loads) and the response render, then prices the
+two hot requests:
+
+    /historical_prices  two cache reads (one per outcome token) + render
+    /search             one cache read + render
+
+and reports the CPU saved per request against stdlib json (aiocache
+JsonSerializer + JSONResponse). Results go to benchmarks/results/serialization.json.
+
+    python -m benchmarks.serialization --repeat 200
+"""
+
+import argparse
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.testclient import TestClient
+
+from api import simulator
+from api.serializers import get_serializer
+from benchmarks.common import write_results
+
+# name -> (serializer args, response class)
+CANDIDATES = {
+    "json": (("json", "none"), JSONResponse),
+    "orjson": (("orjson", "none"), ORJSONResponse),
+    "msgpack": (("msgpack", "none"), ORJSONResponse),
+    "orjson+zstd": (("orjson", "zstd"), ORJSONResponse),
+    "msgpack+zstd": (("msgpack", "zstd"), ORJSONResponse),
+}
+
+
+def load_payloads():
+    """Real-shaped upstream responses, generated by the simulator."""
+    client = TestClient(simulator.app)
+    token = simulator.catalog()[0]["clobTokenIds"][0]
+    return {
+        "history_1d": client.get(
+            "/prices-history", params={"market": token, "interval": "1d"}
+        ).json(),
+        "history_max": client.get(
+            "/prices-history", params={"market": token, "interval": "max"}
+        ).json(),
+        "search_page": client.get("/public-search", params={"q": "bitcoin"}).json(),
+    }
+
+
+def per_call_us(fn, repeat):
+    """Mean CPU time of `fn()` in microseconds over `repeat` calls."""
+    fn()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1e6
+
+
+def measure(payloads, repeat):
+    results = {}
+    for name, ((serializer_name, compression), response_class) in CANDIDATES.items():
+        serializer = get_serializer(serializer_name, compression)
+        per_payload = {}
+        for label, payload in payloads.items():
+            stored = serializer.dumps(payload)
+            per_payload[label] = {
+                "bytes": len(stored),
+                "dumps_us": round(
+                    per_call_us(lambda p=payload: serializer.dumps(p), repeat), 1
+                ),
+                "loads_us": round(
+                    per_call_us(lambda s=stored: serializer.loads(s), repeat), 1
+                ),
+                "render_us": round(
+                    per_call_us(
+                        lambda p=payload: response_class(p).body,
+                        repeat,
+                    ),
+                    1,
+                ),
+            }
+        history, search = per_payload["history_1d"], per_payload["search_page"]
+        results[name] = {
+            "payloads": per_payload,
+            "requests_us": {
+                "/historical_prices": round(
+                    2 * history["loads_us"] + 2 * history["render_us"], 1
+                ),
+                "/search": round(search["loads_us"] + search["render_us"], 1),
+            },
+        }
+    baseline = results["json"]["requests_us"]
+    for result in results.values():
+        result["saved_us"] = {
+            route: round(baseline[route] - cost, 1)
+            for route, cost in result["requests_us"].items()
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads()
+    results = measure(payloads, args.repeat)
+    for name, result in results.items():
+        sizes = ", ".join(
+            f"{label} {stats['bytes'] / 1024:.0f} KiB"
+            for label, stats in result["payloads"].items()
+        )
+        costs = "  ".join(
+            f"{route} {cost:8.1f} us (saves {result['saved_us'][route]:7.1f})"
+            for route, cost in result["requests_us"].items()
+        )
+        print(f"{name:13} {costs}  [{sizes}]")
+    print(f"results written to {write_results('serialization', results)}")
+
+
+if __name__ == "__main__":
+    main()
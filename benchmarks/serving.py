@@ -0,0 +1,137 @@
+"""
+Throughput benchmark for the production server modes of web_app.
+
+Boots `python -m web_app.serve` once per worker model, logs in a user with a
+handful of positions and hammers /portfolio and /live_prices, recording
+requests per second and p50/p95/p99 latency for each mode. price_api is
+replaced by a stub with a fixed delay; MongoDB must be reachable at
+MONGO_URI (e.g. `docker run -p 27017:27017 mongo:7`).
+
+Run from the repository root:
+
+    python -m benchmarks.serving --modes gthread gevent asgi --duration 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import uuid
+
+import requests
+
+from benchmarks.common import free_port, run_load, wait_for_http, write_results
+from benchmarks.stubs import PriceStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ("/portfolio", "/live_prices")
+
+
+def start_server(mode, args, price_url):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PRICE_SERVICE_URL=price_url,
+        SECRET_KEY="benchmark",
+        MONGO_URI=args.mongo_uri,
+        WEB_ACCESS_LOG="",
+    )
+    command = [
+        sys.executable,
+        "-m",
+        "web_app.serve",
+        "--mode",
+        mode,
+        "--workers",
+        str(args.workers),
+        "--threads",
+        str(args.threads),
+        "--bind",
+        f"127.0.0.1:{port}",
+    ]
+    proc = subprocess.Popen(command, cwd=ROOT, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    wait_for_http(f"{base_url}/login")
+    return proc, base_url
+
+
+def seed_user(base_url, positions):
+    """Register a fresh user, buy `positions` markets and return its cookies."""
+    session = requests.Session()
+    session.post(
+        f"{base_url}/register",
+        data={
+            "email": f"bench-{uuid.uuid4().hex}@example.com",
+            "username": "bench",
+            "password": "benchmark",
+            "starting_balance": "1000000",
+        },
+        allow_redirects=False,
+        timeout=10,
+    ).raise_for_status()
+    tokens = [f"bench-token-{i}" for i in range(positions)]
+    for token in tokens:
+        session.post(
+            f"{base_url}/trade",
+            json={"asset_id": token, "bid": 10, "question": f"Market {token}"},
+            timeout=10,
+        ).raise_for_status()
+    return session.cookies.get_dict(), tokens
+
+
+def bench_mode(mode, args, price_url):
+    proc, base_url = start_server(mode, args, price_url)
+    try:
+        cookies, tokens = seed_user(base_url, args.positions)
+        sessions = []
+        for _ in range(args.concurrency):
+            s = requests.Session()
+            s.cookies.update(cookies)
+            sessions.append(s)
+        urls = {
+            "/portfolio": f"{base_url}/portfolio",
+            "/live_prices": f"{base_url}/live_prices?tokens={','.join(tokens)}",
+        }
+        results = {}
+        for route in ROUTES:
+            url = urls[route]
+
+            def hit(index, url=url):
+                resp = sessions[index].get(url, timeout=30, allow_redirects=False)
+                return resp.status_code == 200
+
+            results[route] = run_load(hit, args.concurrency, args.duration)
+        return results
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--modes", nargs="+", default=["gthread", "gevent", "asgi"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--upstream-latency-ms", type=float, default=10)
+    parser.add_argument(
+        "--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    )
+    args = parser.parse_args(argv)
+
+    report = {"config": vars(args), "modes": {}}
+    with PriceStub(free_port(), latency_ms=args.upstream_latency_ms) as stub:
+        for mode in args.modes:
+            report["modes"][mode] = bench_mode(mode, args, stub.url)
+            for route, stats in report["modes"][mode].items():
+                print(
+                    f"{mode:8} {route:13} {stats['rps']:8.1f} req/s  "
+                    f"p99 {stats['p99_ms']:8.2f} ms  errors {stats['errors']}"
+                )
+    print(f"results written to {write_results('serving', report)}")
+
+
+if __name__ == "__main__":
+    main()
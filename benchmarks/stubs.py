@@ -0,0 +1,75 @@
+"In-process stand-ins for the services a benchmark does not want to measure"
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Dispatches to `server.routes[(method, path)]` after `server.latency`."""
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        handler = self.server.routes.get((method, url.path))
+        if handler is None:
+            self.send_error(404)
+            return
+        time.sleep(self.server.latency)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length)) if length else None
+        body = json.dumps(handler(query, payload)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._dispatch("GET")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class _StubServer:
+    """Threaded JSON HTTP server; subclasses fill in `routes`. Context manager."""
+
+    routes = {}
+
+    def __init__(self, port, latency_ms=10):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency_ms / 1000
+        self.server.routes = {
+            key: getattr(self, name) for key, name in self.routes.items()
+        }
+        self.url = f"http://127.0.0.1:{port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PriceStub(_StubServer):
+    """Imitates price_api's /clob with a fixed price."""
+
+    routes = {("GET", "/clob"): "clob"}
+
+    def __init__(self, port, latency_ms=10, price=0.5):
+        super().__init__(port, latency_ms)
+        self.price = price
+
+    def clob(self, query, payload):
+        tokens = [t for t in query.get("tokens", "").split(",") if t]
+        return [str(self.price) for _ in tokens]
@@ -0,0 +1,166 @@
+"""
+Cost of portfolio valuation for heavy users, against the /portfolio page.
+
+For portfolios of increasing size (up to 10k positions) the benchmark times
+
+    loop     the per-position Python loop `portfolio()` used before
+             `web_app/valuation.py`, kept here as the reference
+    engine   `value_positions` plus the display rows
+    page     a whole GET /portfolio (mongomock database, live prices
+             stubbed so no service is called), which includes the engine
+
+and reports the engine's share of page time. Results go to
+benchmarks/results/valuation.json.
+
+    python -m benchmarks.valuation --sizes 100 1000 10000 --repeat 5
+"""
+
+import argparse
+import random
+import time
+from unittest.mock import patch
+
+import mongomock
+
+import web_app.app as app_module
+from benchmarks.common import write_results
+from web_app.valuation import value_positions
+
+
+def make_portfolio(size, seed=0):
+    """`size` positions and a live price for 90% of them."""
+    rng = random.Random(seed)
+    positions, live_prices = {}, {}
+    for i in range(size):
+        token = str(10**30 + i)
+        positions[token] = {
+            "market_question": f"Market {i}",
+            "side": rng.choice(["YES", "NO"]),
+            "avg_price": round(rng.uniform(0.02, 0.98), 4),
+            "quantity": round(rng.uniform(1, 500), 2),
+            "total_cost": 0.0,
+        }
+        if rng.random() < 0.9:
+            live_prices[token] = rng.uniform(0.01, 0.99)
+    return positions, live_prices
+
+
+def loop_valuation(positions, live_prices):
+    """The per-position valuation `portfolio()` did before the engine."""
+    rows, total_value, total_pnl = [], 0, 0.0
+    for asset_id, info in positions.items():
+        live_price_val = live_prices.get(asset_id)
+        current_price = info["avg_price"]
+        if live_price_val is not None:
+            try:
+                live_price = float(live_price_val)
+                complement = 1 - live_price
+                current_price = (
+                    live_price
+                    if abs(live_price - info["avg_price"])
+                    <= abs(complement - info["avg_price"])
+                    else complement
+                )
+            except (TypeError, ValueError):
+                current_price = info["avg_price"]
+        market_val = current_price * info["quantity"]
+        cost_basis = info["avg_price"] * info["quantity"]
+        pnl = market_val - cost_basis
+        total_pnl += pnl
+        total_value += market_val
+        rows.append(
+            {
+                "market": info.get("market_question", "Unknown Market"),
+                "avg_price": info["avg_price"],
+                "current_price": current_price,
+                "side": info.get("side", "YES"),
+                "bet_amount": cost_basis,
+                "quantity": info["quantity"],
+                "to_win": max((1 - info["avg_price"]) * info["quantity"], 0.0),
+                "market_value": market_val,
+                "pnl": pnl,
+            }
+        )
+    return rows, total_value, total_pnl
+
+
+def engine_valuation(positions, live_prices):
+    valuation = value_positions(positions, live_prices)
+    return valuation.rows(), valuation.total_value, valuation.total_pnl
+
+
+def best_ms(fn, repeat):
+    """Fastest of `repeat` wall-clock runs of `fn()`, in milliseconds."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def portfolio_page(positions, live_prices):
+    """Callable rendering GET /portfolio for a user holding `positions`."""
+    db = mongomock.MongoClient()["polypaper"]
+    db.users.insert_one(
+        {
+            "user_id": "bench",
+            "email": "bench@example.com",
+            "username": "bench",
+            "portfolio_id": "bench-portfolio",
+        }
+    )
+    db.portfolios.insert_one(
+        {"portfolio_id": "bench-portfolio", "balance": 1000.0, "positions": positions}
+    )
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "bench"
+        session["_fresh"] = True
+
+    def render():
+        with patch.object(app_module, "db", db), patch.object(
+            app_module, "fetch_live_prices", lambda tokens: live_prices
+        ):
+            response = client.get("/portfolio")
+        assert response.status_code == 200
+
+    return render
+
+
+def measure(sizes, repeat):
+    results = {}
+    for size in sizes:
+        positions, live_prices = make_portfolio(size)
+        loop_ms = best_ms(lambda: loop_valuation(positions, live_prices), repeat)
+        engine_ms = best_ms(lambda: engine_valuation(positions, live_prices), repeat)
+        page_ms = best_ms(portfolio_page(positions, live_prices), repeat)
+        results[str(size)] = {
+            "loop_ms": round(loop_ms, 3),
+            "engine_ms": round(engine_ms, 3),
+            "page_ms": round(page_ms, 3),
+            "engine_share_of_page": round(engine_ms / page_ms, 4),
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app_module.app.config["TESTING"] = True
+    results = measure(args.sizes, args.repeat)
+    for size, result in results.items():
+        print(
+            f"{size:>6} positions  loop {result['loop_ms']:8.2f} ms  "
+            f"engine {result['engine_ms']:8.2f} ms  page {result['page_ms']:8.2f} ms  "
+            f"(engine {result['engine_share_of_page']:.1%} of page)"
+        )
+    print(f"results written to {write_results('valuation', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Tests for the shared benchmark helpers.
+"""
+
+import pytest
+
+from benchmarks import importtime, loadtest, serialization, valuation
+from benchmarks.common import (
+    LatencyRecorder,
+    compare_to_baseline,
+    percentile,
+    summarize,
+)
+
+
+def _route(p95=100.0, rps=10.0, errors=0):
+    return {"p95_ms": p95, "rps": rps, "errors": errors}
+
+
+class TestStats:
+    """Tests for percentile and summarize."""
+
+    def test_percentile_nearest_rank(self):
+        samples = list(range(1, 101))
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 99) == 99
+        assert percentile(samples, 100) == 100
+
+    def test_percentile_empty(self):
+        assert percentile([], 99) == 0.0
+
+    def test_summarize_throughput(self):
+        stats = summarize([10.0] * 20, errors=1, elapsed=2.0)
+        assert stats["requests"] == 20
+        assert stats["errors"] == 1
+        assert stats["rps"] == 10.0
+        assert stats["p99_ms"] == 10.0
+
+    def test_recorder_groups_by_route(self):
+        recorder = LatencyRecorder()
+        recorder.record("GET /a", 5.0)
+        recorder.record("GET /a", 0, ok=False)
+        recorder.record("GET /b", 7.0)
+        summary = recorder.summary(1.0)
+        assert summary["GET /a"]["requests"] == 1
+        assert summary["GET /a"]["errors"] == 1
+        assert summary["GET /b"]["p50_ms"] == 7.0
+
+
+class TestCompareToBaseline:
+    """Tests for compare_to_baseline."""
+
+    def test_within_tolerance_passes(self):
+        baseline = {"GET /a": _route()}
+        assert (
+            compare_to_baseline({"GET /a": _route(p95=120.0, rps=8.0)}, baseline) == []
+        )
+
+    def test_latency_regression(self):
+        baseline = {"GET /a": _route()}
+        regressions = compare_to_baseline({"GET /a": _route(p95=200.0)}, baseline)
+        assert len(regressions) == 1
+        assert "p95" in regressions[0]
+
+    def test_throughput_and_error_regression(self):
+        baseline = {"GET /a": _route()}
+        regressions = compare_to_baseline(
+            {"GET /a": _route(rps=2.0, errors=3)}, baseline
+        )
+        assert len(regressions) == 2
+
+    def test_missing_route(self):
+        regressions = compare_to_baseline({}, {"GET /a": _route()})
+        assert regressions == ["GET /a: missing from this run"]
+
+
+class TestLoadtestConfig:
+    """Tests for the load test's workload comparison."""
+
+    def test_only_workload_options_must_match(self):
+        config = {"users": 16, "duration": 30.0, "seed": 0, "redis_host": "redis"}
+        same = dict(config, redis_host="localhost")
+        assert loadtest.config_differences(same, config) == {}
+        assert loadtest.config_differences(dict(config, users=4), config) == {
+            "users": (4, 16)
+        }
+
+
+class TestSerialization:
+    """Tests for the serialization benchmark's accounting."""
+
+    def test_savings_are_relative_to_stdlib_json(self):
+        payload = {"history": [{"t": i, "p": 0.5} for i in range(50)]}
+        results = serialization.measure(
+            {"history_1d": payload, "search_page": {"events": []}}, repeat=1
+        )
+        assert set(results) == set(serialization.CANDIDATES)
+        assert results["json"]["saved_us"] == {"/historical_prices": 0, "/search": 0}
+        orjson = results["orjson"]
+        assert orjson["payloads"]["history_1d"]["bytes"] > 0
+        assert orjson["saved_us"]["/search"] == round(
+            results["json"]["requests_us"]["/search"]
+            - orjson["requests_us"]["/search"],
+            1,
+        )
+
+
+class TestValuation:
+    """Tests for the valuation benchmark."""
+
+    def test_engine_matches_the_reference_loop(self):
+        positions, live_prices = valuation.make_portfolio(200, seed=3)
+        loop_rows, loop_value, loop_pnl = valuation.loop_valuation(
+            positions, live_prices
+        )
+        rows, value, pnl = valuation.engine_valuation(positions, live_prices)
+        assert value == pytest.approx(loop_value)
+        assert pnl == pytest.approx(loop_pnl)
+        assert len(rows) == len(loop_rows)
+        for row, expected in zip(rows, loop_rows):
+            for key, value in expected.items():
+                assert row[key] == (
+                    pytest.approx(value) if isinstance(value, float) else value
+                )
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+import time:        50 |         50 |     json.decoder
+import time:       200 |        250 |   json
+import time:       300 |        300 |   py_clob_client.client
+import time:        40 |        590 | svc
+"""
+
+
+class TestImportTime:
+    """Tests for the import-time benchmark."""
+
+    def test_profile_is_parsed_by_depth(self):
+        lines = importtime.parse(IMPORTTIME_OUTPUT)
+        assert [(line.module, line.depth) for line in lines] == [
+            ("site", 0),
+            ("json.decoder", 2),
+            ("json", 1),
+            ("py_clob_client.client", 1),
+            ("svc", 0),
+        ]
+
+    def test_summary_ranks_direct_imports_and_flags_deferred_ones(self):
+        lines = importtime.parse(IMPORTTIME_OUTPUT)
+        summary = importtime.summarize_profile(lines, "svc", ("py_clob_client",))
+        assert summary["total_ms"] == 0.6
+        assert summary["modules"] == 5
+        assert [e["module"] for e in summary["slowest"]] == [
+            "py_clob_client.client",
+            "json",
+        ]
+        assert summary["deferred_loaded"] == ["py_clob_client"]
+
+    def test_regressions(self):
+        baseline = {"svc": {"total_ms": 100.0, "deferred_loaded": []}}
+        assert importtime.regressions(baseline, baseline) == []
+        slower = {"svc": {"total_ms": 200.0, "deferred_loaded": ["x"]}}
+        assert len(importtime.regressions(slower, baseline)) == 2
+
+    @pytest.mark.parametrize("service", sorted(importtime.SERVICES))
+    def test_services_import_without_their_deferred_clients(self, service):
+        result = importtime.measure(service, repeat=1)
+        assert result["total_ms"] > 0
+        assert result["deferred_loaded"] == []
@@ -4,15 +4,34 @@ import json
 import os
 import time
 import uuid
-from datetime import datetime, timezone
-from typing import Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
 import flask_login
+import redis
 import requests
 from dotenv import load_dotenv
-from flask import Flask, flash, jsonify, redirect, render_template, request, url_for
+from flask import (
+    Flask,
+    Response,
+    flash,
+    g,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask_bcrypt import Bcrypt
-from pymongo import MongoClient
+
+from web_app import exports, http_cache, metrics, snapshots, timing
+from web_app import fragments as fragments_module
+from web_app.fragments import FragmentCache, market_card_version, position_row_version
+from web_app.leaderboard import Leaderboard, requested_view, seed_from_db
+from web_app.mongo import LazyDatabase
+from web_app.quotes import QuoteBook
+from web_app.valuation import value_positions
 
 load_dotenv()
 
@@ -25,16 +44,47 @@ app.secret_key = os.getenv("SECRET_KEY", "dev_secret")
 PRICE_SERVICE_URL = os.getenv("PRICE_SERVICE_URL", "http://localhost:8002")
 SEARCH_URL = os.getenv("SEARCH_URL", "http://localhost:8001")
 MONGO_URI = os.getenv("MONGO_URI")
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+# Tokens per batch request to /clob/batch and /resolutions (both take 500)
+PRICE_BATCH_SIZE = 500
+# /portfolio/history?range=...; None means every snapshot
+HISTORY_RANGES = {
+    "1d": timedelta(days=1),
+    "1w": timedelta(weeks=1),
+    "1m": timedelta(days=30),
+    "all": None,
+}
+# Tells the API services how long we will wait, so they stop working after
+# we give up (see api/deadline.py)
+DEADLINE_HEADER = "X-Deadline-Ms"
+# Lane of price_api's upstream rate limiter a call waits in
+PRIORITY_HEADER = "X-Priority"
 
 login_manager = flask_login.LoginManager()
 login_manager.init_app(app)
-
-try:
-    mongo_client = MongoClient(MONGO_URI)
-    db = mongo_client["polypaper"]
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    raise e
+metrics.init_app(app)
+timing.init_app(app)
+# max-age matches how long price_api caches each endpoint's data
+http_cache.init_app(
+    app,
+    max_ages={
+        "live_prices": 5,
+        "api_historical_prices": 600,
+        "api_sparklines": 600,
+    },
+)
+
+# Opened on first query so each server worker connects after it forks
+db = LazyDatabase(MONGO_URI, "polypaper", event_listeners=[metrics.MongoCommandTimer()])
+# redis-py connects lazily and resets its pool after a fork
+redis_client = redis.Redis(
+    host=REDIS_HOST, port=REDIS_PORT, socket_connect_timeout=1, socket_timeout=1
+)
+leaderboard = Leaderboard(redis_client)
+fragments = FragmentCache(redis_client)
+quotes = QuoteBook(redis_client)
+fragments_module.init_app(app, fragments)
 
 
 def cache_market(slug, market):
@@ -44,11 +94,14 @@ def cache_market(slug, market):
 def get_cached_market(slug):
     entry = MARKET_CACHE.get(slug)
     if not entry:
+        metrics.record_cache("market", "miss")
         return None
     # Check TTL
     if time.time() - entry["timestamp"] > CACHE_TTL:
         del MARKET_CACHE[slug]
+        metrics.record_cache("market", "miss")
         return None
+    metrics.record_cache("market", "hit")
     return entry["market"]
 
 
@@ -79,12 +132,21 @@ def load_user(user_id):
 #     return None
 
 
-def fetch_live_prices(token_ids: List[str]) -> Dict[str, float]:
+def deadline_headers(timeout):
+    """Request headers announcing that the answer is useless after `timeout` s."""
+    return {DEADLINE_HEADER: str(int(timeout * 1000))}
+
+
+def fetch_live_prices(
+    token_ids: List[str], priority: Optional[str] = None
+) -> Dict[str, float]:
     """
     Fetch the latest prices for a list of asset IDs from the CLOB service.
 
     Args:
         token_ids (List[str]): List of asset IDs to fetch prices for.
+        priority (str): price_api rate-limit lane ("trade", "valuation" or
+            "chart"); price_api's default for /clob when omitted.
 
     Returns:
         Dict[str, float]: Mapping of asset_id -> latest price. Empty dict if fetch fails.
@@ -102,11 +164,20 @@ def fetch_live_prices(token_ids: List[str]) -> Dict[str, float]:
         ordered_tokens.append(str(t))
 
     prices: Dict[str, float] = {}
+    headers = deadline_headers(5)
+    if priority:
+        headers[PRIORITY_HEADER] = priority
 
     for token in ordered_tokens:
         try:
             params = {"tokens": token}
-            resp = requests.get(f"{PRICE_SERVICE_URL}/clob", params=params, timeout=5)
+            with metrics.track_upstream("price_api"):
+                resp = requests.get(
+                    f"{PRICE_SERVICE_URL}/clob",
+                    params=params,
+                    headers=headers,
+                    timeout=5,
+                )
             resp.raise_for_status()
             data = resp.json()
 
@@ -129,15 +200,103 @@ def fetch_live_prices(token_ids: List[str]) -> Dict[str, float]:
             except (TypeError, ValueError):
                 continue
         except requests.RequestException as e:
-            print(f"Price Fetch Error for token {token}: {e}")
+            app.logger.warning("Price fetch error for token %s: %s", token, e)
             continue
         except Exception as e:
-            print(f"Unexpected price parse error for token {token}: {e}")
+            app.logger.warning(
+                "Unexpected price parse error for token %s: %s", token, e
+            )
             continue
 
+    # Re-mark the holders of any token whose price moved
+    leaderboard.update_quietly("apply_prices", prices)
+    return prices
+
+
+def fetch_fill_price(
+    asset_id: str, notional: float, local_only: bool = False
+) -> Optional[Dict]:
+    """
+    How a buy of `notional` dollars of `asset_id` fills against the order
+    book, from price_api's /fill_price ("avg_price", "slippage", "complete",
+    ...); None if the book cannot be read. With `local_only`, price_api only
+    uses the book it streams and never fetches one from the CLOB.
+    """
+    headers = deadline_headers(5)
+    headers[PRIORITY_HEADER] = "trade"
+    params = {"token": asset_id, "notional": notional}
+    if local_only:
+        params["local"] = "true"
+    try:
+        with metrics.track_upstream("price_api"):
+            resp = requests.get(
+                f"{PRICE_SERVICE_URL}/fill_price",
+                params=params,
+                headers=headers,
+                timeout=5,
+            )
+        if local_only and resp.status_code == 404:
+            return None  # not streamed yet
+        resp.raise_for_status()
+        fill = resp.json()
+    except (requests.RequestException, ValueError) as e:
+        app.logger.warning("Fill price fetch error for token %s: %s", asset_id, e)
+        return None
+    if not isinstance(fill, dict) or fill.get("avg_price") is None:
+        return None
+    return fill
+
+
+def post_in_batches(
+    upstream: str, url: str, token_ids: List[str], field: str, timeout: float
+) -> Dict[str, float]:
+    """
+    POST the tokens to `url` as {"tokens": [...]}, PRICE_BATCH_SIZE at a time,
+    and merge the `field` mapping of the answers. Batches that fail are logged
+    and skipped, so their tokens are missing from the result.
+    """
+    tokens = list(dict.fromkeys(str(t) for t in token_ids if t is not None))
+    merged: Dict[str, float] = {}
+    for start in range(0, len(tokens), PRICE_BATCH_SIZE):
+        batch = tokens[start : start + PRICE_BATCH_SIZE]
+        try:
+            with metrics.track_upstream(upstream):
+                resp = requests.post(
+                    url,
+                    json={"tokens": batch},
+                    headers=deadline_headers(timeout),
+                    timeout=timeout,
+                )
+            resp.raise_for_status()
+            merged.update(resp.json().get(field, {}))
+        except (requests.RequestException, ValueError) as e:
+            app.logger.warning("POST %s failed (%d tokens): %s", url, len(batch), e)
+    return merged
+
+
+def fetch_price_map(token_ids: List[str]) -> Dict[str, float]:
+    """
+    Latest prices for many tokens through price_api's /clob/batch. Tokens of
+    failed batches are missing from the result (valued at their average price).
+    """
+    prices = post_in_batches(
+        "price_api", f"{PRICE_SERVICE_URL}/clob/batch", token_ids, "prices", 30
+    )
+    leaderboard.update_quietly("apply_prices", prices)
     return prices
 
 
+def fetch_resolutions(token_ids: List[str]) -> Dict[str, float]:
+    """
+    Payout per share of the tokens whose markets have resolved, from
+    search_api's /resolutions. Tokens of failed batches are settled on a
+    later run.
+    """
+    return post_in_batches(
+        "search_api", f"{SEARCH_URL}/resolutions", token_ids, "resolved", 60
+    )
+
+
 def fetch_historical_prices(asset_ids, interval="1h", fidelity=None):
     """Fetch historical prices for given asset IDs"""
     if not asset_ids:
@@ -152,30 +311,42 @@ def fetch_historical_prices(asset_ids, interval="1h", fidelity=None):
         if fidelity is not None:
             params["fidelity"] = fidelity
 
-        print(f"Fetching from: {PRICE_SERVICE_URL}/historical_prices")
-        print(f"Params: {params}")
-
-        resp = requests.get(
-            f"{PRICE_SERVICE_URL}/historical_prices", params=params, timeout=30
-        )
-        print(f"Response status: {resp.status_code}")
+        with metrics.track_upstream("price_api"):
+            resp = requests.get(
+                f"{PRICE_SERVICE_URL}/historical_prices",
+                params=params,
+                headers=deadline_headers(30),
+                timeout=30,
+            )
         if resp.status_code == 200:
             return resp.json()
-        print(f"Error response: {resp.text}")
+        app.logger.warning(
+            "Historical prices returned %s: %s", resp.status_code, resp.text[:200]
+        )
     except requests.exceptions.ConnectionError as e:
-        print(
-            f"Connection Error - Is price_api running on {PRICE_SERVICE_URL}? Error: {e}"
+        app.logger.warning(
+            "Connection error - is price_api running on %s? %s", PRICE_SERVICE_URL, e
         )
     except requests.exceptions.Timeout as e:
-        print(f"Timeout Error: {e}")
-    except Exception as e:
-        print(f"Historical Price Fetch Error: {e}")
-        import traceback
-
-        traceback.print_exc()
+        app.logger.warning("Historical prices timed out: %s", e)
+    except Exception:
+        app.logger.exception("Historical price fetch error")
     return {}
 
 
+def value_portfolio(portfolio_id, positions):
+    """
+    Positions valued at live prices, once per request: the portfolio page and
+    the header (inject_portfolio_data) share the result.
+    """
+    cached = g.get("valuation")
+    if cached and cached[0] == portfolio_id:
+        return cached[1]
+    valuation = value_positions(positions, fetch_live_prices(list(positions)))
+    g.valuation = (portfolio_id, valuation)
+    return valuation
+
+
 @app.context_processor
 def inject_portfolio_data():
     """Make portfolio value and balance available to all templates"""
@@ -189,25 +360,14 @@ def inject_portfolio_data():
                     positions = portfolio.get("positions", {})
 
                     # Calculate total portfolio value
-                    total_value = 0
-                    if positions:
-                        asset_ids = list(positions.keys())
-                        live_prices = fetch_live_prices(asset_ids)
-
-                        for asset_id, info in positions.items():
-                            # Use live price if available, else fallback to avg_price
-                            current_price = float(
-                                live_prices.get(asset_id, info.get("avg_price", 0.0))
-                            )
-                            market_val = current_price * info.get("quantity", 0.0)
-                            total_value += market_val
+                    total_value = value_portfolio(portfolio_id, positions).total_value
 
                     return {
                         "header_portfolio_value": total_value,
                         "header_cash_balance": current_balance,
                     }
             except Exception as e:
-                print(f"Error calculating portfolio data for header: {e}")
+                app.logger.warning("Error calculating portfolio data for header: %s", e)
 
     # Default values if not authenticated or error occurs
     return {"header_portfolio_value": 0.0, "header_cash_balance": 0.0}
@@ -271,6 +431,9 @@ def register():
             "transaction_history": {},
         }
         db.portfolios.insert_one(new_user_portfolio)
+        leaderboard.update_quietly(
+            "seed_portfolio", new_user["portfolio_id"], username, starting_balance
+        )
 
         flask_login.login_user(
             User(new_user["user_id"], email, username, new_user["portfolio_id"])
@@ -316,58 +479,16 @@ def portfolio():
 
     # 2. Get Real Prices for these assets
     positions = portfolio["positions"] if portfolio else {}
-    print(portfolio)
-    asset_ids = list(positions.keys())
-    live_prices = fetch_live_prices(asset_ids)
-    print(asset_ids)
     # 3. Calculate Stats
-    portfolio_display = []
-    total_value = 0
-    total_pnl = 0.0  # Track total profit/loss
-
-    for asset_id, info in positions.items():
-        side = info.get("side", "YES").upper()
-
-        # Use live price if available; choose the value that aligns with the side's avg
-        live_price_val = live_prices.get(asset_id)
-        current_price = info["avg_price"]
-        if live_price_val is not None:
-            try:
-                live_price = float(live_price_val)
-                # Some feeds may return the opposite side; pick the price closest to the avg
-                candidate = live_price
-                complement = 1 - live_price
-                current_price = (
-                    candidate
-                    if abs(candidate - info["avg_price"])
-                    <= abs(complement - info["avg_price"])
-                    else complement
-                )
-            except (TypeError, ValueError):
-                current_price = info["avg_price"]
-
-        market_val = current_price * info["quantity"]
-        cost_basis = info["avg_price"] * info["quantity"]
-        pnl = market_val - cost_basis
-        # Potential profit if the outcome resolves in the user's favor
-        potential_profit = max((1 - info["avg_price"]) * info["quantity"], 0.0)
-
-        total_pnl += pnl
-        total_value += market_val
-
-        portfolio_display.append(
-            {
-                "market": info.get("market_question", "Unknown Market"),
-                "avg_price": info["avg_price"],
-                "current_price": current_price,
-                "side": info.get("side", "YES"),
-                "bet_amount": cost_basis,
-                "quantity": info["quantity"],
-                "to_win": potential_profit,
-                "market_value": market_val,
-                "pnl": pnl,
-            }
-        )
+    valuation = value_portfolio(portfolio_id, positions)
+    portfolio_display = valuation.rows()
+    fragments.prefetch(
+        (name, position_row_version(row))
+        for row in portfolio_display
+        for name in ("position_row", "position_payout")
+    )
+    total_value = valuation.total_value
+    total_pnl = valuation.total_pnl  # Track total profit/loss
 
     # 4. Construct User View Data
     user_view = {
@@ -386,44 +507,87 @@ def portfolio():
     )
 
 
+@app.route("/portfolio/history")
+@flask_login.login_required
+def portfolio_history():
+    """Downsampled equity curve: {"range", "points": [[epoch_ms, equity], ...]}."""
+    range_name = request.args.get("range", "1w")
+    if range_name not in HISTORY_RANGES:
+        return jsonify({"error": f"range must be one of {list(HISTORY_RANGES)}"}), 400
+    try:
+        points = min(max(int(request.args.get("points", 200)), 2), 1000)
+    except ValueError:
+        points = 200
+    window = HISTORY_RANGES[range_name]
+    since = datetime.now(timezone.utc) - window if window else None
+    curve = snapshots.history(
+        db, flask_login.current_user.portfolio_id, since=since, points=points
+    )
+    return jsonify({"range": range_name, "points": curve}), 200
+
+
+@app.route("/portfolio/export/<kind>")
+@flask_login.login_required
+def portfolio_export(kind):
+    """Stream the user's trades or positions as ?format=csv (default) or ndjson."""
+    fmt = request.args.get("format", "csv")
+    if kind not in ("trades", "positions") or fmt not in exports.FORMATS:
+        return jsonify({"error": "Export trades or positions as csv or ndjson"}), 404
+    portfolio_id = flask_login.current_user.portfolio_id
+    if kind == "trades":
+        rows, columns = exports.trade_rows(db, portfolio_id), exports.TRADE_COLUMNS
+    else:
+        rows = exports.position_rows(db, portfolio_id)
+        columns = exports.POSITION_COLUMNS
+    filename = f"{kind}-{datetime.now(timezone.utc):%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(exports.stream(rows, columns, fmt)),
+        mimetype=exports.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.route("/markets")
 @flask_login.login_required
 def markets():
     q = request.args.get("q", "").strip()
     page = request.args.get("page", "").strip()
     active_markets = []
+    pagination = {}
     if q:
         try:
             page = page if page else 1
-            resp = requests.get(
-                f"{SEARCH_URL}/search", params={"q": q, "page": page}, timeout=300
+            with metrics.track_upstream("search_api"):
+                resp = requests.get(
+                    f"{SEARCH_URL}/search",
+                    params={"q": q, "page": page},
+                    headers=deadline_headers(300),
+                    timeout=300,
+                )
+            data = resp.json() if resp.status_code == 200 else {}
+            # search_api already dropped closed markets and decoded the lists
+            active_markets = data.get("markets", [])
+            pagination = data.get("pagination", {})
+            for m in active_markets:
+                cache_market(m["slug"], m)
+            fragments.prefetch(
+                ("market_card", market_card_version(m)) for m in active_markets
             )
-            data = resp.json() if resp.status_code == 200 else []
-            active_markets = []
-            for event in data.get("events", []):
-                for m in event.get("markets", []):
-                    if m.get("active") is True and m.get("closed") is False:
-                        if isinstance(m.get("outcomes"), str):
-                            m["outcomes"] = json.loads(m["outcomes"])
-                        if isinstance(m.get("outcomePrices"), str):
-                            m["outcomePrices"] = json.loads(m["outcomePrices"])
-                        if isinstance(m.get("clobTokenIds"), str):
-                            m["clobTokenIds"] = json.loads(m["clobTokenIds"])
-                            print(m["clobTokenIds"])
-                        active_markets.append(m)
-                        cache_market(m["slug"], m)
         except Exception as e:
-            print(e)
+            app.logger.warning("Search failed for %r: %s", q, e)
             flash("Search service unreachable", "error")
 
-    return render_template("markets.html", markets=active_markets, query=q)
+    return render_template(
+        "markets.html", markets=active_markets, query=q, pagination=pagination
+    )
 
 
 @app.route("/market_details")
 @flask_login.login_required
 def market_details():
     slug = request.args.get("slug")
-    market = get_cached_market(slug)
+    with timing.phase("cache"):
+        market = get_cached_market(slug)
     if not market:
         return "Market does not exist", 400
     if isinstance(market.get("outcomes"), str):
@@ -432,7 +596,6 @@ def market_details():
         market["outcomePrices"] = json.loads(market["outcomePrices"])
     if isinstance(market.get("clobTokenIds"), str):
         market["clobTokenIds"] = json.loads(market["clobTokenIds"])
-        print(market["clobTokenIds"])
     # Extract clob_id from market (list of two IDs)
     asset_ids = []
     clob_id = market.get("clobTokenIds")
@@ -459,6 +622,55 @@ def market_details():
     )
 
 
+@app.route("/api/sparklines")
+@flask_login.login_required
+def api_sparklines():
+    """Trend lines for up to 100 tokens (?tokens=a,b,c) in one price_api call."""
+    tokens = [t.strip() for t in request.args.get("tokens", "").split(",") if t.strip()]
+    if not tokens:
+        return jsonify({"sparklines": {}, "pending": []}), 200
+    try:
+        with metrics.track_upstream("price_api"):
+            resp = requests.post(
+                f"{PRICE_SERVICE_URL}/sparklines",
+                json={"tokens": tokens[:100]},
+                headers=deadline_headers(5),
+                timeout=5,
+            )
+        resp.raise_for_status()
+        data = resp.json()
+        response = jsonify(data)
+        if isinstance(data, dict) and data.get("pending"):
+            # Still being built: the retry for them must not hit the browser cache
+            response.cache_control.no_store = True
+        return response, 200
+    except (requests.RequestException, ValueError) as e:
+        app.logger.warning("Sparkline fetch failed: %s", e)
+        return jsonify({"error": "Sparklines unavailable"}), 502
+
+
+@app.route("/api/autocomplete")
+@flask_login.login_required
+def api_autocomplete():
+    """Search suggestions for ?q=, from search_api's index of earlier searches."""
+    q = request.args.get("q", "").strip()
+    if len(q) < 2:
+        return jsonify({"suggestions": []}), 200
+    try:
+        with metrics.track_upstream("search_api"):
+            resp = requests.get(
+                f"{SEARCH_URL}/autocomplete",
+                params={"q": q[:100]},
+                headers=deadline_headers(2),
+                timeout=2,
+            )
+        resp.raise_for_status()
+        return jsonify(resp.json()), 200
+    except (requests.RequestException, ValueError) as e:
+        app.logger.warning("Autocomplete failed for %r: %s", q, e)
+        return jsonify({"suggestions": []}), 200
+
+
 @app.route("/api/historical_prices")
 @flask_login.login_required
 def api_historical_prices():
@@ -485,6 +697,10 @@ def live_prices():
     Endpoint to fetch live prices for multiple assets.
     Query parameter: ?tokens=token1,token2,token3
     Returns: JSON { "token1": price1, "token2": price2, ... }
+
+    With ?quote=1 (signed-in users) it returns {"prices": {...}, "quotes":
+    {token: {"quote_id", "price", "expires_at"}}}; /trade fills a quote_id
+    at its price without another price lookup.
     """
     tokens_param = request.args.get("tokens", "")
     token_ids = [t.strip() for t in tokens_param.split(",") if t.strip()]
@@ -493,7 +709,12 @@ def live_prices():
         return jsonify({}), 200
 
     prices = fetch_live_prices(token_ids)
-    print("LIVE PRICES: ", prices)
+    if request.args.get("quote") and flask_login.current_user.is_authenticated:
+        issued = quotes.issue(flask_login.current_user.portfolio_id, prices)
+        response = jsonify({"prices": prices, "quotes": issued})
+        # Each quote fills one trade: never reuse a quoted response
+        response.cache_control.no_store = True
+        return response, 200
     return jsonify(prices), 200
 
 
@@ -523,19 +744,16 @@ def trade():
 
     portfolio_id = flask_login.current_user.portfolio_id
     try:
-        portfolio = db.portfolios.find_one({"portfolio_id": portfolio_id})
-        print(portfolio)
-    except Exception as e:
-        flash(
-            "Portfolio not found for the current user. Please log in again.",
-            f"error: {e}",
+        # Fill at the price the user was quoted; without a valid quote (none
+        # sent, expired or already used) quote again from the pricing service
+        quote_id = data.get("quote_id")
+        raw_price = (
+            quotes.redeem(quote_id, portfolio_id, asset_id) if quote_id else None
         )
-        return jsonify({"success": False, "redirect": url_for("logout")})
-
-    try:
-        # Get current execution price from the pricing service
-        price = fetch_live_prices([asset_id])
-        raw_price = price.get(asset_id)
+        quoted = raw_price is not None
+        if raw_price is None:
+            price = fetch_live_prices([asset_id], priority="trade")
+            raw_price = price.get(asset_id)
         if raw_price is None:
             flash("Could not get a current price for the market.", "error")
             return jsonify({"success": False})
@@ -545,8 +763,16 @@ def trade():
             flash("Received an invalid price for the market.", "error")
             return jsonify({"success": False})
 
-        # Use the fetched price directly for the selected side token
+        # A bet deeper than the best level pays the book's slippage on top;
+        # without the book it fills at the price alone. A quoted trade only
+        # reads the book price_api already streams, so it never waits on the CLOB
         execution_price = raw_price
+        fill = fetch_fill_price(asset_id, bid, local_only=quoted)
+        if fill is not None:
+            if not fill.get("complete", True):
+                flash("Not enough liquidity in the market for this bid.", "error")
+                return jsonify({"success": False})
+            execution_price = raw_price + max(0.0, float(fill.get("slippage") or 0))
 
         # Calculate quantity for the selected side
         # Price represents the probability (YES or NO depending on side); bid is the cost.
@@ -604,6 +830,7 @@ def trade():
                     }
                 },
             )
+            held = (new_total_shares, new_avg_price)
         else:
             # Position does not exist: create new one
             db.portfolios.update_one(
@@ -623,6 +850,24 @@ def trade():
                 },
                 upsert=True,
             )
+            held = (quantity, execution_price)
+        leaderboard.update_quietly(
+            "record_trade", portfolio_id, asset_id, *held, execution_price, -bid
+        )
+
+        # Trade history, for exports
+        db.trades.insert_one(
+            {
+                "portfolio_id": portfolio_id,
+                "asset_id": asset_id,
+                "market_question": question,
+                "side": side,
+                "quantity": quantity,
+                "price": execution_price,
+                "amount": bid,
+                "executed_at": datetime.now(timezone.utc),
+            }
+        )
 
         flash(
             f"Executed bid ${bid:.2f}. Bought {quantity:.2f} shares at ${execution_price:.4f}",
@@ -630,11 +875,48 @@ def trade():
         )
         return jsonify({"success": True, "redirect": url_for("portfolio")})
     except Exception as e:
-        print(f"Error in trade: {e}")
+        app.logger.warning("Error in trade: %s", e)
         flash("An unexpected error occurred during the trade.", "error")
         return jsonify({"success": False, "redirect": url_for("portfolio")})
 
 
+def leaderboard_view():
+    """Requested page of the ranking plus the entries around the current user."""
+    user = flask_login.current_user
+    if user.portfolio_id and not leaderboard.contains(user.portfolio_id):
+        # Portfolios created before the leaderboard existed join on first visit
+        seed_from_db(
+            leaderboard, db, user.portfolio_id, user.username, fetch_live_prices
+        )
+    return requested_view(leaderboard, request.args, user.portfolio_id)
+
+
+@app.route("/leaderboard")
+@flask_login.login_required
+def leaderboard_page():
+    try:
+        view = leaderboard_view()
+    except redis.RedisError as e:
+        app.logger.warning("Leaderboard unavailable: %s", e)
+        flash("Leaderboard is temporarily unavailable", "error")
+        view = {"entries": [], "around_me": [], "page": 1, "per_page": 25, "total": 0}
+    return render_template(
+        "leaderboard.html",
+        board=view,
+        my_portfolio_id=flask_login.current_user.portfolio_id,
+    )
+
+
+@app.route("/api/leaderboard")
+@flask_login.login_required
+def api_leaderboard():
+    try:
+        return jsonify(leaderboard_view()), 200
+    except redis.RedisError as e:
+        app.logger.warning("Leaderboard unavailable: %s", e)
+        return jsonify({"error": "Leaderboard unavailable"}), 503
+
+
 @app.route("/settings", methods=["GET", "POST"])
 @flask_login.login_required
 def settings():
@@ -670,6 +952,12 @@ def settings():
                 return redirect(url_for("settings"))
 
             flask_login.current_user.balance = new_balance
+            leaderboard.update_quietly(
+                "seed_portfolio",
+                flask_login.current_user.portfolio_id,
+                flask_login.current_user.username,
+                new_balance,
+            )
             flash("Account reset completed.", "success")
             return redirect(url_for("settings"))
 
@@ -683,6 +971,9 @@ def settings():
             {"user_id": flask_login.current_user.id}, {"$set": {"username": username}}
         )
         flask_login.current_user.username = username
+        leaderboard.update_quietly(
+            "rename", flask_login.current_user.portfolio_id, username
+        )
         flash("Updated", "success")
 
     portfolio = db.portfolios.find_one(
@@ -698,8 +989,10 @@ if __name__ == "__main__":
     ENV = os.environ.get("FLASK_ENV", "development")
 
     if ENV == "production":
-        # Docker / DigitalOcean mode
-        app.run(host="0.0.0.0", port=5000, debug=False)
+        # Docker / DigitalOcean mode: hand off to gunicorn (see web_app/serve.py)
+        from web_app.serve import main as serve
+
+        serve()
     else:
         # Local development mode
         app.run(debug=True)
@@ -0,0 +1,7 @@
+"ASGI wrapper around the Flask app, served by uvicorn workers under gunicorn"
+
+from asgiref.wsgi import WsgiToAsgi
+
+from web_app.app import app
+
+application = WsgiToAsgi(app)
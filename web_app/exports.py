@@ -0,0 +1,117 @@
+"""
+Streaming exports of a portfolio's trades and positions as CSV or NDJSON.
+
+Rows come from a MongoDB cursor read `BATCH_SIZE` documents at a time and
+are encoded one batch per chunk, so an export holds one batch in memory
+however long the account's history is. Positions live inside the portfolio
+document; they are unwound by MongoDB (one document per position) rather
+than loading the document. CSV exports send their header row before the
+first query, so the download starts at once.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Sequence, Set
+
+BATCH_SIZE = 500
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+TRADE_COLUMNS = (
+    "executed_at",
+    "asset_id",
+    "market_question",
+    "side",
+    "quantity",
+    "price",
+    "amount",
+)
+POSITION_COLUMNS = (
+    "asset_id",
+    "market_question",
+    "side",
+    "quantity",
+    "avg_price",
+    "total_cost",
+    "created_at",
+    "updated_at",
+)
+
+# Databases (by id) whose indexes this process has already ensured
+_INDEXED: Set[int] = set()
+
+
+def ensure_indexes(db):
+    """Trades are read per portfolio, oldest first."""
+    db.trades.create_index([("portfolio_id", 1), ("executed_at", 1)])
+
+
+def trade_rows(db, portfolio_id: str) -> Iterator[Dict]:
+    """The portfolio's trades, oldest first; queried on first iteration."""
+    if id(db) not in _INDEXED:
+        ensure_indexes(db)
+        _INDEXED.add(id(db))
+    yield from db.trades.find(
+        {"portfolio_id": portfolio_id},
+        {"_id": 0, **{column: 1 for column in TRADE_COLUMNS}},
+        sort=[("executed_at", 1)],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def position_rows(db, portfolio_id: str) -> Iterator[Dict]:
+    """The portfolio's open positions; queried on first iteration."""
+    pipeline = [
+        {"$match": {"portfolio_id": portfolio_id}},
+        {"$project": {"position": {"$objectToArray": {"$ifNull": ["$positions", {}]}}}},
+        {"$unwind": "$position"},
+        {
+            "$replaceWith": {
+                "$mergeObjects": ["$position.v", {"asset_id": "$position.k"}]
+            }
+        },
+        {"$project": {"_id": 0, **{column: 1 for column in POSITION_COLUMNS}}},
+    ]
+    yield from db.portfolios.aggregate(pipeline, batchSize=BATCH_SIZE)
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _batches(rows: Iterable[Dict]) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def as_csv(rows: Iterable[Dict], columns: Sequence[str]) -> Iterator[str]:
+    """CSV text, the header first and then one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for batch in _batches(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_value(row.get(c)) for c in columns] for row in batch)
+        yield buffer.getvalue()
+
+
+def as_ndjson(rows: Iterable[Dict], columns: Sequence[str]) -> Iterator[str]:
+    """One JSON object per line, one chunk per batch of rows."""
+    for batch in _batches(rows):
+        yield "".join(
+            json.dumps({c: _value(row.get(c)) for c in columns}) + "\n" for row in batch
+        )
+
+
+def stream(rows: Iterable[Dict], columns: Sequence[str], fmt: str) -> Iterator[str]:
+    encode = as_csv if fmt == "csv" else as_ndjson
+    return encode(rows, columns)
@@ -0,0 +1,166 @@
+"""
+Cache of rendered template fragments, shared by the server workers.
+
+A fragment is a piece of a page (a market card, the price-independent cells
+of a portfolio row) identified by a name and a version: a tuple of whatever
+the fragment's HTML depends on, such as a market's slug and `updatedAt`.
+Templates wrap the fragment in a call block,
+
+    {% call cached_fragment("market_card", (m.slug, m.updatedAt)) %}
+      ...
+    {% endcall %}
+
+and the body is only rendered when no worker has rendered that version yet.
+Rendered HTML is kept in Redis (`fragment:<name>:<digest>`, expiring after
+`ttl` seconds) and in a per-worker LRU of at most `l1_max_entries`.
+
+A page showing many fragments calls `prefetch` first, so they are read from
+Redis with one MGET instead of one GET each. Fragments rendered on a miss are
+queued and written by `flush` (after each request) in one pipeline. Redis
+being down only costs the rendering: fragments are then rendered and kept in
+the LRU.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import redis
+from flask import current_app
+from markupsafe import Markup
+
+from web_app import metrics
+
+FRAGMENT_TTL = int(os.getenv("FRAGMENT_TTL", "600"))
+FRAGMENT_L1_MAX_ENTRIES = int(os.getenv("FRAGMENT_L1_MAX_ENTRIES", "2048"))
+PREFIX = "fragment"
+
+
+def market_card_version(market) -> Tuple:
+    """Everything a market card's HTML depends on."""
+    return (market["slug"], market.get("updatedAt"), market.get("outcomePrices"))
+
+
+def position_row_version(row) -> Tuple:
+    """A portfolio row's cached cells depend only on the position, not the price."""
+    return (row["asset_id"], row["quantity"], row["avg_price"])
+
+
+def fragment_key(name: str, version: Tuple) -> str:
+    """Redis key of one version of a fragment."""
+    digest = hashlib.blake2b(
+        json.dumps(list(version), default=str).encode(), digest_size=12
+    ).hexdigest()
+    return f"{PREFIX}:{name}:{digest}"
+
+
+class FragmentCache:
+    """Rendered fragments in a bounded LRU in front of the given Redis client."""
+
+    def __init__(
+        self,
+        client,
+        ttl: int = FRAGMENT_TTL,
+        l1_max_entries: int = FRAGMENT_L1_MAX_ENTRIES,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.l1_max_entries = l1_max_entries
+        self._l1: "OrderedDict[str, str]" = OrderedDict()
+        # Rendered since the last flush, not yet in Redis
+        self._unwritten: Dict[str, str] = {}
+        self._unwritten_lock = threading.Lock()
+
+    def _remember(self, key: str, html: str):
+        self._l1[key] = html
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    def prefetch(self, fragments: Iterable[Tuple[str, Tuple]]):
+        """Load the given (name, version) fragments from Redis in one MGET."""
+        keys = [fragment_key(name, version) for name, version in fragments]
+        keys = [key for key in dict.fromkeys(keys) if key not in self._l1]
+        if not keys:
+            return
+        try:
+            values = self.client.mget(keys)
+        except redis.RedisError:
+            return
+        for key, value in zip(keys, values):
+            if value is not None:
+                self._remember(key, value.decode())
+
+    def get(self, name: str, version: Tuple) -> Optional[str]:
+        """The fragment's HTML from the LRU or Redis; None if not rendered yet."""
+        key = fragment_key(name, version)
+        html = self._l1.get(key)
+        if html is not None:
+            self._l1.move_to_end(key)
+            return html
+        try:
+            value = self.client.get(key)
+        except redis.RedisError:
+            return None
+        if value is None:
+            return None
+        html = value.decode()
+        self._remember(key, html)
+        return html
+
+    def render(self, name: str, version: Tuple, render: Callable[[], str]) -> Markup:
+        """The fragment's cached HTML, calling `render()` on a miss."""
+        html = self.get(name, version)
+        if html is not None:
+            metrics.record_cache("fragment", "hit")
+            return Markup(html)
+        metrics.record_cache("fragment", "miss")
+        html = str(render())
+        key = fragment_key(name, version)
+        self._remember(key, html)
+        with self._unwritten_lock:
+            self._unwritten[key] = html
+        return Markup(html)
+
+    def flush(self):
+        """Write the fragments rendered since the last flush in one pipeline."""
+        with self._unwritten_lock:
+            unwritten, self._unwritten = self._unwritten, {}
+        if not unwritten:
+            return
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for key, html in unwritten.items():
+                    pipe.set(key, html, ex=self.ttl)
+                pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def clear_local(self):
+        """Empty this worker's LRU (Redis keeps its copies)."""
+        self._l1.clear()
+
+
+def init_app(app, cache: FragmentCache):
+    """
+    Give `app`'s templates `cached_fragment` and the version helpers, backed
+    by `cache` (kept in `app.extensions["fragments"]`), and flush the
+    fragments each request rendered once it is done.
+    """
+    app.extensions["fragments"] = cache
+
+    def cached_fragment(name, version, caller):
+        """Call-block wrapper rendering its body once per fragment version."""
+        return current_app.extensions["fragments"].render(name, tuple(version), caller)
+
+    app.add_template_global(cached_fragment)
+    app.add_template_global(market_card_version)
+    app.add_template_global(position_row_version)
+
+    @app.after_request
+    def flush_fragments(response):
+        current_app.extensions["fragments"].flush()
+        return response
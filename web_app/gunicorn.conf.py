@@ -0,0 +1,54 @@
+"Gunicorn settings for serving the Flask app in production"
+
+import glob
+import multiprocessing
+import os
+
+# Worker model -> (gunicorn worker class, application to load)
+WORKER_MODES = {
+    "gthread": ("gthread", "web_app.app:app"),
+    "gevent": ("gevent", "web_app.app:app"),
+    "asgi": ("uvicorn_worker.UvicornWorker", "web_app.asgi:application"),
+}
+
+mode = os.getenv("WEB_WORKER_MODE", "gthread")
+if mode not in WORKER_MODES:
+    raise ValueError(
+        f"WEB_WORKER_MODE must be one of {', '.join(WORKER_MODES)}, got {mode!r}"
+    )
+
+worker_class, wsgi_app = WORKER_MODES[mode]
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# Only used by gthread; gevent and asgi workers multiplex on one thread.
+threads = int(os.getenv("WEB_THREADS", 8))
+# Concurrent greenlets per gevent worker.
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+preload_app = os.getenv("WEB_PRELOAD_APP", "false").lower() == "true"
+accesslog = os.getenv("WEB_ACCESS_LOG", "-") or None
+
+
+def post_fork(server, worker):
+    """Drop any Mongo client inherited from the master when preload_app is on."""
+    from web_app.app import db
+
+    db.reset()
+
+
+def on_starting(server):
+    """Start from an empty Prometheus multiprocess directory, if one is set."""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+
+
+def child_exit(server, worker):
+    """Let /metrics drop the live gauges of a worker that has gone away."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
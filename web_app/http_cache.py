@@ -0,0 +1,94 @@
+"""
+HTTP conditional requests and compression for the Flask app.
+
+JSON answers to GET requests carry a weak ETag of their body; a browser
+that sends it back in `If-None-Match` gets an empty 304, so reloading a
+chart whose data has not changed costs no body at all. Endpoints listed in
+`init_app(max_ages=...)` also get `Cache-Control: private, max-age=N`,
+matching how long price_api caches their data.
+
+JSON, HTML and other text bodies of at least `MIN_COMPRESS_BYTES` are
+compressed with brotli or gzip, whichever the browser prefers (brotli on a
+tie). Static files (sent as passthrough) and streamed responses are left
+alone.
+"""
+
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+import brotli
+from flask import request
+
+MIN_COMPRESS_BYTES = 1024
+BROTLI_QUALITY = 4
+GZIP_LEVEL = 6
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """ "br" or "gzip", by the client's q-values; None if it accepts neither."""
+    weights = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+    candidates = [(weights.get(e, weights.get("*", 0.0)), e) for e in ("br", "gzip")]
+    quality, encoding = max(candidates, key=lambda c: c[0])
+    return encoding if quality > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _cacheable(response) -> bool:
+    """A complete, uncompressed 200 whose body is worth an ETag and gzip."""
+    if response.status_code != 200 or response.content_encoding:
+        return False
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    return (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+
+
+def init_app(app, max_ages: Optional[Dict[str, int]] = None):
+    """Add ETags, Cache-Control and compression to `app`'s responses.
+
+    `max_ages` maps endpoint names to Cache-Control max-age seconds.
+    """
+    max_ages = max_ages or {}
+
+    @app.after_request
+    def conditional_and_compressed(response):
+        if request.method != "GET" or not _cacheable(response):
+            return response
+
+        if response.mimetype == "application/json":
+            body = response.get_data()
+            response.set_etag(
+                hashlib.blake2b(body, digest_size=12).hexdigest(), weak=True
+            )
+            # A view that set no-store (e.g. one-off price quotes) keeps it
+            if request.endpoint in max_ages and not response.cache_control.no_store:
+                response.cache_control.private = True
+                response.cache_control.max_age = max_ages[request.endpoint]
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        response.vary.add("Accept-Encoding")
+        body = response.get_data()
+        encoding = None
+        if len(body) >= MIN_COMPRESS_BYTES:
+            encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding:
+            response.set_data(compress(body, encoding))
+            response.content_encoding = encoding
+        return response
@@ -0,0 +1,292 @@
+"""
+Global leaderboard of portfolio equity (cash plus positions at market) in Redis.
+
+    leaderboard:equity             sorted set  portfolio_id -> equity
+    leaderboard:names              hash        portfolio_id -> username
+    leaderboard:holders:<token>    hash        portfolio_id -> [quantity, avg_price, value]
+    leaderboard:holdings:<pid>     set         tokens the portfolio holds
+    leaderboard:prices             hash        token -> last price applied
+
+Scores are maintained incrementally: a trade adjusts one portfolio's score,
+and a price move in a token re-marks only the holders of that token, so no
+update ever loads or prices a whole portfolio. Reads (a page of the ranking,
+the entries around a portfolio) are O(log n + page size).
+
+The data is derived from MongoDB and can be rebuilt at any time:
+
+    python -m web_app.leaderboard rebuild
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List, Mapping, Optional
+
+import redis
+
+from web_app.valuation import mark_price, value_positions
+
+EQUITY = "leaderboard:equity"
+NAMES = "leaderboard:names"
+PRICES = "leaderboard:prices"
+HOLDERS = "leaderboard:holders:{}"
+HOLDINGS = "leaderboard:holdings:{}"
+# Skip `update_quietly` updates for this long after Redis fails, so pages
+# don't wait on a connect timeout each time
+RETRY_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class Leaderboard:
+    """Ranking of portfolios by equity, kept in the given Redis client."""
+
+    def __init__(self, client, retry_seconds: float = RETRY_SECONDS):
+        self.client = client
+        self.retry_seconds = retry_seconds
+        self._retry_at = 0.0
+
+    def update_quietly(self, method: str, *args):
+        """Call the update `method`; Redis failures are logged, never raised."""
+        if time.monotonic() < self._retry_at:
+            return
+        try:
+            getattr(self, method)(*args)
+        except redis.RedisError as e:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            logger.warning("Leaderboard %s failed: %s", method, e)
+
+    def seed_portfolio(
+        self,
+        portfolio_id: str,
+        username: str,
+        balance: float,
+        positions: Optional[Mapping[str, Dict]] = None,
+        live_prices: Optional[Mapping[str, float]] = None,
+    ):
+        """(Re)place a portfolio: used on sign-up, account reset and rebuilds."""
+        positions = positions or {}
+        valuation = value_positions(positions, live_prices or {})
+        holdings_key = HOLDINGS.format(portfolio_id)
+
+        def replace(pipe):
+            held = pipe.smembers(holdings_key)
+            pipe.multi()
+            for token in held:
+                pipe.hdel(HOLDERS.format(_decode(token)), portfolio_id)
+            pipe.delete(holdings_key)
+            for token, quantity, avg_price, value in zip(
+                valuation.asset_ids,
+                valuation.quantity.tolist(),
+                valuation.avg_price.tolist(),
+                valuation.market_value.tolist(),
+            ):
+                pipe.hset(
+                    HOLDERS.format(token),
+                    portfolio_id,
+                    json.dumps([quantity, avg_price, value]),
+                )
+                pipe.sadd(holdings_key, token)
+            pipe.zadd(EQUITY, {portfolio_id: balance + valuation.total_value})
+            pipe.hset(NAMES, portfolio_id, username)
+
+        self.client.transaction(replace, holdings_key)
+
+    def rename(self, portfolio_id: str, username: str):
+        self.client.hset(NAMES, portfolio_id, username)
+
+    def record_trade(
+        self,
+        portfolio_id: str,
+        token: str,
+        quantity: float,
+        avg_price: float,
+        price: float,
+        cash_delta: float,
+    ):
+        """Apply a fill: the position now holds `quantity` at `avg_price`."""
+        holders_key = HOLDERS.format(token)
+
+        def update(pipe):
+            old = pipe.hget(holders_key, portfolio_id)
+            old_value = json.loads(old)[2] if old else 0.0
+            value = quantity * mark_price(price, avg_price)
+            pipe.multi()
+            pipe.hset(
+                holders_key, portfolio_id, json.dumps([quantity, avg_price, value])
+            )
+            pipe.sadd(HOLDINGS.format(portfolio_id), token)
+            pipe.zincrby(EQUITY, cash_delta + value - old_value, portfolio_id)
+
+        self.client.transaction(update, holders_key)
+
+    def apply_prices(self, prices: Mapping[str, float]) -> int:
+        """Re-mark the holders of every token whose price moved; returns the count."""
+        tokens = list(prices)
+        if not tokens:
+            return 0
+        applied = self.client.hmget(PRICES, tokens)
+        moved = 0
+        for token, last in zip(tokens, applied):
+            price = float(prices[token])
+            if last is not None and float(last) == price:
+                continue
+            self._revalue_token(token, price)
+            moved += 1
+        return moved
+
+    def _revalue_token(self, token: str, price: float):
+        holders_key = HOLDERS.format(token)
+
+        def update(pipe):
+            holders = pipe.hgetall(holders_key)
+            pipe.multi()
+            for portfolio_id, raw in holders.items():
+                quantity, avg_price, old_value = json.loads(raw)
+                value = quantity * mark_price(price, avg_price)
+                if value != old_value:
+                    pipe.hset(
+                        holders_key,
+                        portfolio_id,
+                        json.dumps([quantity, avg_price, value]),
+                    )
+                    pipe.zincrby(EQUITY, value - old_value, portfolio_id)
+            pipe.hset(PRICES, token, price)
+
+        self.client.transaction(update, holders_key)
+
+    def settle_token(self, token: str, proceeds: Mapping[str, float]):
+        """Close every holder's position in a resolved token, crediting `proceeds`."""
+        holders_key = HOLDERS.format(token)
+
+        def update(pipe):
+            holders = dict(zip(proceeds, pipe.hmget(holders_key, list(proceeds))))
+            pipe.multi()
+            for portfolio_id, credit in proceeds.items():
+                raw = holders[portfolio_id]
+                old_value = json.loads(raw)[2] if raw else 0.0
+                pipe.zincrby(EQUITY, credit - old_value, portfolio_id)
+                pipe.hdel(holders_key, portfolio_id)
+                pipe.srem(HOLDINGS.format(portfolio_id), token)
+            pipe.hdel(PRICES, token)
+
+        if proceeds:
+            self.client.transaction(update, holders_key)
+
+    def _entries(self, start: int, scored) -> List[Dict]:
+        ids = [_decode(portfolio_id) for portfolio_id, _ in scored]
+        names = self.client.hmget(NAMES, ids) if ids else []
+        return [
+            {
+                "rank": start + offset + 1,
+                "portfolio_id": portfolio_id,
+                "username": _decode(name) or "Anonymous",
+                "equity": equity,
+            }
+            for offset, (portfolio_id, (_, equity), name) in enumerate(
+                zip(ids, scored, names)
+            )
+        ]
+
+    def page(self, page: int = 1, per_page: int = 25) -> Dict:
+        """One page of the ranking, best first, with the number of portfolios."""
+        start = (max(page, 1) - 1) * per_page
+        scored = self.client.zrevrange(
+            EQUITY, start, start + per_page - 1, withscores=True
+        )
+        return {
+            "entries": self._entries(start, scored),
+            "page": max(page, 1),
+            "per_page": per_page,
+            "total": self.client.zcard(EQUITY),
+        }
+
+    def around(self, portfolio_id: str, radius: int = 2) -> List[Dict]:
+        """The portfolio's entry with up to `radius` neighbours on each side."""
+        rank = self.client.zrevrank(EQUITY, portfolio_id)
+        if rank is None:
+            return []
+        start = max(rank - radius, 0)
+        scored = self.client.zrevrange(EQUITY, start, rank + radius, withscores=True)
+        return self._entries(start, scored)
+
+    def contains(self, portfolio_id: str) -> bool:
+        return self.client.zscore(EQUITY, portfolio_id) is not None
+
+
+def rebuild(board: Leaderboard, db, fetch_prices) -> int:
+    """Seed every portfolio from MongoDB; returns the number of portfolios."""
+    names = {
+        u["portfolio_id"]: u.get("username", "")
+        for u in db.users.find({}, {"portfolio_id": 1, "username": 1})
+        if u.get("portfolio_id")
+    }
+    portfolios = list(
+        db.portfolios.find({}, {"portfolio_id": 1, "balance": 1, "positions": 1})
+    )
+    tokens = {t for p in portfolios for t in (p.get("positions") or {})}
+    prices = fetch_prices(sorted(tokens))
+    for portfolio in portfolios:
+        board.seed_portfolio(
+            portfolio["portfolio_id"],
+            names.get(portfolio["portfolio_id"], ""),
+            portfolio.get("balance", 0.0),
+            portfolio.get("positions") or {},
+            prices,
+        )
+    if prices:
+        board.client.hset(PRICES, mapping=prices)
+    return len(portfolios)
+
+
+def seed_from_db(
+    board: Leaderboard, db, portfolio_id: str, username: str, fetch_prices
+):
+    """Seed one portfolio from MongoDB, e.g. one created before the leaderboard."""
+    portfolio = db.portfolios.find_one({"portfolio_id": portfolio_id}) or {}
+    positions = portfolio.get("positions") or {}
+    board.seed_portfolio(
+        portfolio_id,
+        username,
+        portfolio.get("balance", 0.0),
+        positions,
+        fetch_prices(list(positions)),
+    )
+
+
+def requested_view(
+    board: Leaderboard, args: Mapping[str, str], portfolio_id: Optional[str]
+) -> Dict:
+    """
+    The page of the ranking that the query `args` ask for (`page`, and
+    `per_page` up to 100), plus the entries around `portfolio_id`.
+    """
+    try:
+        page = max(int(args.get("page", 1)), 1)
+        per_page = min(max(int(args.get("per_page", 25)), 1), 100)
+    except ValueError:
+        page, per_page = 1, 25
+    view = board.page(page, per_page)
+    view["around_me"] = board.around(portfolio_id) if portfolio_id else []
+    return view
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    # Imported here so the module can be used without the Flask app
+    import web_app.app as app_module  # pylint: disable=import-outside-toplevel
+
+    count = rebuild(app_module.leaderboard, app_module.db, app_module.fetch_live_prices)
+    print(f"leaderboard rebuilt from {count} portfolios")
+
+
+if __name__ == "__main__":
+    main()
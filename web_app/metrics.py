@@ -0,0 +1,127 @@
+"Prometheus metrics for the Flask app: request, upstream, cache and Mongo timings"
+
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+from web_app import timing
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route rule",
+    ["service", "method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Time spent waiting on the search and price services",
+    ["upstream", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_EVENTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by namespace and result (hit, miss or stale)",
+    ["namespace", "result"],
+)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "Round trip of each MongoDB command as reported by the driver",
+    ["command", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def track_upstream(upstream):
+    """Time the enclosed call to another service; outcome is ok or error."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_LATENCY.labels(upstream, outcome).observe(elapsed)
+        timing.record("upstream", elapsed)
+
+
+def record_cache(namespace, result):
+    CACHE_EVENTS.labels(namespace, result).inc()
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo listener feeding MONGO_LATENCY; pass it in `event_listeners`."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+    @staticmethod
+    def _observe(event, outcome):
+        # Listeners run on the thread that issued the command, i.e. the request's
+        seconds = event.duration_micros / 1e6
+        MONGO_LATENCY.labels(event.command_name, outcome).observe(seconds)
+        timing.record("db", seconds)
+
+
+def render_metrics():
+    """Exposition of every metric, merged across gunicorn workers if configured."""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, service="web_app"):
+    """Time every request to `app` and serve the metrics at GET /metrics."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_LATENCY.labels(
+                service, request.method, rule, str(response.status_code)
+            ).observe(time.perf_counter() - start)
+        return response
+
+    app.add_url_rule("/metrics", "metrics", render_metrics)
@@ -0,0 +1,57 @@
+"MongoDB handle that defers opening the client until first use"
+
+import os
+import threading
+
+from pymongo import MongoClient
+
+
+class LazyDatabase:
+    """
+    Stand-in for a pymongo ``Database`` that builds its ``MongoClient`` on first use.
+
+    MongoClient starts monitor threads and a connection pool as soon as it is
+    constructed, and neither survives ``fork()``. Deferring construction until
+    the first query means every server worker opens its own client after it
+    has forked instead of inheriting a broken one from the master process.
+    """
+
+    def __init__(self, uri, name, **client_kwargs):
+        self._uri = uri
+        self._name = name
+        self._client_kwargs = client_kwargs
+        self._lock = threading.Lock()
+        self._client = None
+        self._database = None
+        self._pid = None
+
+    @property
+    def client(self):
+        """The underlying MongoClient, created on demand."""
+        self._get_database()
+        return self._client
+
+    def _get_database(self):
+        # A pid mismatch means we were forked after connecting; start over.
+        if self._database is None or self._pid != os.getpid():
+            with self._lock:
+                if self._database is None or self._pid != os.getpid():
+                    self._client = MongoClient(self._uri, **self._client_kwargs)
+                    self._database = self._client[self._name]
+                    self._pid = os.getpid()
+        return self._database
+
+    def reset(self):
+        """Forget the current client so the next access opens a fresh one."""
+        with self._lock:
+            self._client = None
+            self._database = None
+            self._pid = None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._get_database(), name)
+
+    def __getitem__(self, name):
+        return self._get_database()[name]
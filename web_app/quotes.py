@@ -0,0 +1,95 @@
+"""
+Short-lived, signed price quotes for quote-then-execute trading.
+
+`/live_prices?quote=1` hands out a quote per token along with the prices the
+market page shows. A quote ID is the signed quote itself (token, price,
+portfolio, expiry), so it cannot be altered by the client, and its nonce is
+kept in Redis (`quote:<nonce>`) until it expires. `/trade` redeems the quote
+and fills at the quoted price without asking price_api again. Redeeming
+deletes the nonce, so a quote fills at most one trade; an expired, used or
+foreign quote is refused and the trade re-quotes from price_api.
+"""
+
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, Mapping, Optional
+
+import redis
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from web_app import metrics
+
+QUOTE_TTL = int(os.getenv("QUOTE_TTL", "10"))
+KEY = "quote:{}"
+
+
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.secret_key, salt="price-quote")
+
+
+class QuoteBook:
+    """Issues and redeems quotes, kept in the given Redis client."""
+
+    def __init__(
+        self,
+        client,
+        ttl: int = QUOTE_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self._clock = clock
+
+    def issue(self, portfolio_id: str, prices: Mapping[str, float]) -> Dict[str, Dict]:
+        """
+        {token: {"quote_id", "price", "expires_at"}} for `prices`; empty if
+        the quotes cannot be stored, in which case trades simply re-quote.
+        """
+        expires_at = self._clock() + self.ttl
+        quotes = {}
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for token, price in prices.items():
+                    nonce = uuid.uuid4().hex
+                    quote = [nonce, token, price, portfolio_id, expires_at]
+                    pipe.set(KEY.format(nonce), json.dumps(quote), ex=self.ttl)
+                    quotes[token] = {
+                        "quote_id": _serializer().dumps(quote),
+                        "price": price,
+                        "expires_at": expires_at,
+                    }
+                pipe.execute()
+        except redis.RedisError as e:
+            current_app.logger.warning("Could not store price quotes: %s", e)
+            return {}
+        return quotes
+
+    def redeem(
+        self, quote_id: str, portfolio_id: str, asset_id: str
+    ) -> Optional[float]:
+        """The quoted price, once, if the quote is valid for this trade."""
+        try:
+            quote = _serializer().loads(quote_id)
+            nonce, token, price, owner, expires_at = quote
+        except (BadSignature, TypeError, ValueError):
+            metrics.record_cache("quote", "invalid")
+            return None
+        if token != asset_id or owner != portfolio_id:
+            metrics.record_cache("quote", "invalid")
+            return None
+        if expires_at <= self._clock():
+            metrics.record_cache("quote", "expired")
+            return None
+        try:
+            stored = self.client.getdel(KEY.format(nonce))
+        except redis.RedisError as e:
+            current_app.logger.warning("Could not redeem price quote: %s", e)
+            return None
+        if stored is None or json.loads(stored) != quote:
+            metrics.record_cache("quote", "miss")
+            return None
+        metrics.record_cache("quote", "hit")
+        return float(price)
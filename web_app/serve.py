@@ -0,0 +1,53 @@
+"""
+Production entry point for the Flask app.
+
+Runs gunicorn with web_app/gunicorn.conf.py. Every option falls back to the
+matching WEB_* environment variable, so the container can be tuned from
+docker-compose without changing the command:
+
+    python -m web_app.serve --mode gthread --workers 4 --threads 8
+    python -m web_app.serve --mode gevent --workers 4
+    python -m web_app.serve --mode asgi --workers 4
+"""
+
+import argparse
+import os
+import sys
+
+CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py"
+)
+MODES = ("gthread", "gevent", "asgi")
+
+
+def build_command(mode=None, workers=None, threads=None, bind=None):
+    """Return (argv, env) that start gunicorn with the requested worker model."""
+    env = dict(os.environ)
+    overrides = {
+        "WEB_WORKER_MODE": mode,
+        "WEB_WORKERS": workers,
+        "WEB_THREADS": threads,
+        "WEB_BIND": bind,
+    }
+    for key, value in overrides.items():
+        if value is not None:
+            env[key] = str(value)
+    argv = [sys.executable, "-m", "gunicorn", "--config", CONFIG_PATH]
+    return argv, env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve PolyPaper with gunicorn")
+    parser.add_argument("--mode", choices=MODES, help="worker model (WEB_WORKER_MODE)")
+    parser.add_argument("--workers", type=int, help="worker processes (WEB_WORKERS)")
+    parser.add_argument("--threads", type=int, help="threads per gthread worker")
+    parser.add_argument("--bind", help="host:port to listen on (WEB_BIND)")
+    args = parser.parse_args(argv)
+
+    command, env = build_command(args.mode, args.workers, args.threads, args.bind)
+    # Replace this process so signals from docker reach the gunicorn master.
+    os.execvpe(command[0], command, env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Settlement of positions in resolved markets.
+
+A resolved market's positions would otherwise stay in `positions` forever
+and be priced on every page load. The settlement job asks search_api which
+of the held tokens belong to resolved markets (POST /resolutions, from gamma
+metadata) and, for each of them:
+
+* finds the holders through the `positions.$**` wildcard index,
+* credits `quantity * payout` to each holder's balance, removes the position
+  and appends it to `settled_positions`, in one `bulk_write` per chunk of
+  holders,
+* closes the positions on the leaderboard.
+
+Each update matches only while the position is still there, so a token is
+never credited twice, even if two runs overlap. Only the updates that applied
+are reported (and passed on to the leaderboard): when a chunk modifies fewer
+holders than it wrote, the ones this run settled are found by the
+`settlement_id` it stamps on their `settled_positions` entries.
+
+    python -m web_app.settlement              # one pass
+    python -m web_app.settlement --every 600  # a pass every 10 minutes
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from web_app.snapshots import held_tokens, run_job
+
+# Holders per bulk_write
+WRITE_CHUNK = 1000
+
+
+def ensure_indexes(db):
+    """Index every position field, so holders of a token are found by index."""
+    db.portfolios.create_index([("positions.$**", 1)], name="positions_wildcard")
+
+
+def settlement_ops(
+    token: str, payout: float, holders, now: datetime, settlement_id: str = ""
+):
+    """(portfolio_id, proceeds, UpdateOne) for each holder document of `token`."""
+    for holder in holders:
+        position = holder["positions"][token]
+        proceeds = float(position.get("quantity") or 0.0) * payout
+        yield holder["portfolio_id"], proceeds, UpdateOne(
+            {
+                "portfolio_id": holder["portfolio_id"],
+                f"positions.{token}": {"$exists": True},
+            },
+            {
+                "$inc": {"balance": proceeds},
+                "$unset": {f"positions.{token}": ""},
+                "$push": {
+                    "settled_positions": {
+                        **position,
+                        "asset_id": token,
+                        "payout": payout,
+                        "proceeds": proceeds,
+                        "settled_at": now,
+                        "settlement_id": settlement_id,
+                    }
+                },
+            },
+        )
+
+
+def settle_token(db, token: str, payout: float, now: datetime) -> Dict[str, float]:
+    """Settle every holder of one resolved token; returns proceeds by portfolio."""
+    holders = db.portfolios.find(
+        {f"positions.{token}.quantity": {"$exists": True}},
+        {"_id": 0, "portfolio_id": 1, f"positions.{token}": 1},
+    )
+    settlement_id = uuid.uuid4().hex
+    settled: Dict[str, float] = {}
+    chunk: List[Tuple[str, float, UpdateOne]] = []
+    for entry in settlement_ops(token, payout, holders, now, settlement_id):
+        chunk.append(entry)
+        if len(chunk) >= WRITE_CHUNK:
+            settled.update(write_chunk(db, token, chunk, settlement_id))
+            chunk = []
+    if chunk:
+        settled.update(write_chunk(db, token, chunk, settlement_id))
+    return settled
+
+
+def write_chunk(
+    db, token: str, chunk: List[Tuple[str, float, UpdateOne]], settlement_id: str
+) -> Dict[str, float]:
+    """Write one chunk of settlements; proceeds of the holders it settled."""
+    result = db.portfolios.bulk_write([op for _, _, op in chunk], ordered=False)
+    if result.modified_count == len(chunk):
+        return {portfolio_id: proceeds for portfolio_id, proceeds, _ in chunk}
+    # An overlapping run settled some of these holders first
+    applied = {
+        doc["portfolio_id"]
+        for doc in db.portfolios.find(
+            {
+                "portfolio_id": {"$in": [portfolio_id for portfolio_id, _, _ in chunk]},
+                "settled_positions": {
+                    "$elemMatch": {"asset_id": token, "settlement_id": settlement_id}
+                },
+            },
+            {"_id": 0, "portfolio_id": 1},
+        )
+    }
+    return {
+        portfolio_id: proceeds
+        for portfolio_id, proceeds, _ in chunk
+        if portfolio_id in applied
+    }
+
+
+def settle(
+    db,
+    resolutions: Mapping[str, float],
+    on_settled: Optional[Callable[[str, Dict[str, float]], None]] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Settle the resolved tokens (`token -> payout per share`); returns the
+    number of positions settled per token. `on_settled(token, proceeds)` is
+    called after each token, e.g. to update the leaderboard.
+    """
+    now = now or datetime.now(timezone.utc)
+    counts = {}
+    for token, payout in resolutions.items():
+        settled = settle_token(db, token, float(payout), now)
+        if on_settled and settled:
+            on_settled(token, settled)
+        counts[token] = len(settled)
+    return counts
+
+
+def main(argv=None):
+    def start():
+        # Imported here so the module can be used without the Flask app
+        import web_app.app as app_module  # pylint: disable=import-outside-toplevel
+
+        def update_board(token, proceeds):
+            app_module.leaderboard.update_quietly("settle_token", token, proceeds)
+
+        ensure_indexes(app_module.db)
+
+        def job():
+            resolutions = app_module.fetch_resolutions(held_tokens(app_module.db))
+            counts = settle(app_module.db, resolutions, on_settled=update_board)
+            return (
+                f"settled {sum(counts.values())} positions in {len(counts)} "
+                "resolved tokens"
+            )
+
+        return job
+
+    run_job(argv, __doc__.split("\n\n", maxsplit=1)[0], start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Equity-curve snapshots: every portfolio revalued in one pass.
+
+The revaluation job collects the distinct tokens held across all portfolios,
+prices each of them once (in batches, see `fetch_price_map`), then streams the
+portfolios and writes one compact document per portfolio
+
+    {"ts": <datetime>, "portfolio_id": ..., "equity": cash + positions, "cash": ...}
+
+to the `equity_snapshots` time-series collection. Price lookups grow with the
+number of distinct tokens, not with users times positions.
+
+    python -m web_app.snapshots              # one pass
+    python -m web_app.snapshots --every 300  # a pass every 5 minutes
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Mapping, Optional
+
+from pymongo.errors import CollectionInvalid
+
+from web_app.valuation import value_positions
+
+COLLECTION = "equity_snapshots"
+# Snapshots older than this are dropped by MongoDB
+RETENTION_SECONDS = 365 * 24 * 3600
+# Portfolios per insert_many
+WRITE_CHUNK = 1000
+
+
+def ensure_collection(db):
+    """Create the time-series collection unless it already exists."""
+    try:
+        db.create_collection(
+            COLLECTION,
+            timeseries={
+                "timeField": "ts",
+                "metaField": "portfolio_id",
+                "granularity": "minutes",
+            },
+            expireAfterSeconds=RETENTION_SECONDS,
+        )
+    except CollectionInvalid:
+        pass
+
+
+def held_tokens(db) -> List[str]:
+    """Distinct tokens held by any portfolio, computed by MongoDB."""
+    pipeline = [
+        {"$project": {"position": {"$objectToArray": {"$ifNull": ["$positions", {}]}}}},
+        {"$unwind": "$position"},
+        {"$group": {"_id": "$position.k"}},
+    ]
+    return sorted(doc["_id"] for doc in db.portfolios.aggregate(pipeline))
+
+
+def revalue_all(
+    db,
+    fetch_prices: Callable[[List[str]], Mapping[str, float]],
+    now: Optional[datetime] = None,
+) -> int:
+    """Write a snapshot of every portfolio; returns the number written."""
+    now = now or datetime.now(timezone.utc)
+    prices = fetch_prices(held_tokens(db))
+    snapshots = db[COLLECTION]
+
+    written = 0
+    chunk: List[Dict] = []
+    cursor = db.portfolios.find(
+        {}, {"_id": 0, "portfolio_id": 1, "balance": 1, "positions": 1}
+    )
+    for portfolio in cursor:
+        if not portfolio.get("portfolio_id"):
+            continue
+        cash = float(portfolio.get("balance") or 0.0)
+        valuation = value_positions(portfolio.get("positions") or {}, prices)
+        chunk.append(
+            {
+                "ts": now,
+                "portfolio_id": portfolio["portfolio_id"],
+                "equity": cash + valuation.total_value,
+                "cash": cash,
+            }
+        )
+        if len(chunk) >= WRITE_CHUNK:
+            snapshots.insert_many(chunk, ordered=False)
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        snapshots.insert_many(chunk, ordered=False)
+        written += len(chunk)
+    return written
+
+
+def downsample(points: List[List], limit: int) -> List[List]:
+    """
+    At most `limit` of the time-ordered [ts, value] points: the range is cut
+    into `limit` equal time buckets and the last point of each is kept, so the
+    latest value is always present.
+    """
+    if limit <= 0 or len(points) <= limit:
+        return points
+    start, end = points[0][0], points[-1][0]
+    width = (end - start) / limit or 1
+    kept: Dict[int, List] = {}
+    for point in points:
+        kept[min(int((point[0] - start) / width), limit - 1)] = point
+    return list(kept.values())
+
+
+def history(
+    db, portfolio_id: str, since: Optional[datetime] = None, points: int = 200
+) -> List[List]:
+    """The portfolio's equity curve as [[epoch_ms, equity], ...], oldest first."""
+    query: Dict = {"portfolio_id": portfolio_id}
+    if since is not None:
+        query["ts"] = {"$gte": since}
+    cursor = db[COLLECTION].find(query, {"_id": 0, "ts": 1, "equity": 1}).sort("ts", 1)
+    curve = [
+        [int(doc["ts"].replace(tzinfo=timezone.utc).timestamp() * 1000), doc["equity"]]
+        for doc in cursor
+    ]
+    return downsample(curve, points)
+
+
+def run_job(argv, description: str, start: Callable[[], Callable[[], str]]):
+    """
+    Command line of a periodic job: parses `--every`, then calls `start()`
+    once for the job and runs it once or every `--every` seconds. The job
+    returns a summary of its pass, printed with how long the pass took.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--every", type=float, help="Repeat every this many seconds (default: once)"
+    )
+    args = parser.parse_args(argv)
+
+    job = start()
+    while True:
+        started = time.monotonic()
+        summary = job()
+        elapsed = time.monotonic() - started
+        print(f"{summary} in {elapsed:.1f}s", flush=True)
+        if not args.every:
+            break
+        time.sleep(max(args.every - elapsed, 0))
+
+
+def main(argv=None):
+    def start():
+        # Imported here so the module can be used without the Flask app
+        import web_app.app as app_module  # pylint: disable=import-outside-toplevel
+
+        ensure_collection(app_module.db)
+
+        def job():
+            count = revalue_all(app_module.db, app_module.fetch_price_map)
+            return f"snapshot of {count} portfolios"
+
+        return job
+
+    run_job(argv, __doc__.split("\n\n", maxsplit=1)[0], start)
+
+
+if __name__ == "__main__":
+    main()
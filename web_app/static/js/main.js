@@ -36,6 +36,8 @@ document.addEventListener("DOMContentLoaded", () => {
             bid: bid,
             question: processedQuestion,
             side: chosenIndex === 1 ? "NO" : "YES",
+            // Fill at the displayed price; the server re-quotes if it expired
+            quote_id: estPriceEl.dataset.quoteAsset === assetId ? estPriceEl.dataset.quoteId : undefined,
           }),
         });
 
@@ -120,14 +122,20 @@ document.addEventListener("DOMContentLoaded", () => {
 
         // console.log("Fetching live price for:", assetId); // Uncomment to debug spam
         try {
-          const resp = await fetch(`/live_prices?tokens=${assetId}`);
+          const resp = await fetch(`/live_prices?tokens=${assetId}&quote=1`);
           if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
           const data = await resp.json();
+          const prices = data.prices || {};
 
-          if (data[assetId] !== undefined) {
-            latestPrices[assetId] = parseFloat(data[assetId]);
+          if (prices[assetId] !== undefined) {
+            latestPrices[assetId] = parseFloat(prices[assetId]);
             updatePriceDisplay();
           }
+          const quote = (data.quotes || {})[assetId];
+          if (quote) {
+            estPriceEl.dataset.quoteId = quote.quote_id;
+            estPriceEl.dataset.quoteAsset = assetId;
+          }
         } catch (err) {
           console.error("Error fetching live price:", err);
         }
@@ -259,6 +267,155 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  // Trend lines on the markets page: one request for the whole result page
+  const sparklineCanvases = document.querySelectorAll('canvas.sparkline[data-token]');
+
+  function drawSparkline(canvas, series) {
+    const context = canvas.getContext('2d');
+    const { width, height } = canvas;
+    context.clearRect(0, 0, width, height);
+    if (!series || series.length < 2) return;
+    const low = Math.min(...series);
+    const span = Math.max(...series) - low || 1;
+    context.beginPath();
+    series.forEach((price, i) => {
+      const x = (i / (series.length - 1)) * (width - 2) + 1;
+      const y = height - 1 - ((price - low) / span) * (height - 2);
+      if (i === 0) context.moveTo(x, y);
+      else context.lineTo(x, y);
+    });
+    context.lineWidth = 2;
+    context.strokeStyle = series[series.length - 1] >= series[0] ? 'rgba(34, 197, 94, 1)' : 'rgba(239, 68, 68, 1)';
+    context.stroke();
+  }
+
+  function loadSparklines(tokens, retriesLeft) {
+    if (tokens.length === 0) return;
+    fetch(`/api/sparklines?tokens=${encodeURIComponent(tokens.join(','))}`)
+      .then(response => response.json())
+      .then(data => {
+        sparklineCanvases.forEach(canvas => {
+          const series = (data.sparklines || {})[canvas.dataset.token];
+          if (series) drawSparkline(canvas, series);
+        });
+        // Series that were not cached yet are being built: ask once more
+        const pending = data.pending || [];
+        if (pending.length > 0 && retriesLeft > 0) {
+          setTimeout(() => loadSparklines(pending, retriesLeft - 1), 3000);
+        }
+      })
+      .catch(error => console.error("Error loading sparklines:", error));
+  }
+
+  if (sparklineCanvases.length > 0) {
+    const tokens = [...new Set([...sparklineCanvases].map(canvas => canvas.dataset.token))];
+    loadSparklines(tokens, 2);
+  }
+
+  // Suggestions while typing a search, from search_api's local index
+  const searchInput = document.querySelector('.positions-search input[name="q"]');
+  const suggestionList = document.getElementById('market-suggestions');
+  let suggestTimer = null;
+
+  if (searchInput && suggestionList) {
+    searchInput.addEventListener('input', () => {
+      clearTimeout(suggestTimer);
+      const q = searchInput.value.trim();
+      if (q.length < 2) return;
+      suggestTimer = setTimeout(() => {
+        fetch(`/api/autocomplete?q=${encodeURIComponent(q)}`)
+          .then(response => response.json())
+          .then(data => {
+            suggestionList.replaceChildren(...(data.suggestions || []).map(suggestion => {
+              const option = document.createElement('option');
+              option.value = suggestion.text;
+              return option;
+            }));
+          })
+          .catch(error => console.error("Error loading suggestions:", error));
+      }, 150);
+    });
+  }
+
+  // Equity curve on the portfolio page, from the snapshot job's history
+  const equityChartCanvas = document.getElementById("equityChart");
+  let equityChart = null;
+
+  function loadEquityHistory(range) {
+    fetch(`/portfolio/history?range=${encodeURIComponent(range)}`)
+      .then(response => response.json())
+      .then(data => {
+        const points = data.points || [];
+        const container = equityChartCanvas.parentElement;
+        const placeholder = container.querySelector('.chart-placeholder');
+        if (placeholder) placeholder.remove();
+        if (equityChart) {
+          equityChart.destroy();
+          equityChart = null;
+        }
+        if (points.length === 0) {
+          const empty = document.createElement('div');
+          empty.className = 'chart-placeholder';
+          empty.innerHTML = '<span>No snapshots yet for this range.</span>';
+          container.appendChild(empty);
+          return;
+        }
+        const labels = points.map(point => new Date(point[0]).toLocaleString());
+        equityChart = new Chart(equityChartCanvas, {
+          type: 'line',
+          data: {
+            labels: labels,
+            datasets: [{
+              label: 'Equity',
+              data: points.map(point => point[1]),
+              borderColor: 'rgb(59, 130, 246)',
+              backgroundColor: 'rgba(59, 130, 246, 0.1)',
+              borderWidth: 2,
+              fill: true,
+              tension: 0.1,
+              pointRadius: 0,
+              pointHoverRadius: 4
+            }]
+          },
+          options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            interaction: { intersect: false, mode: 'index' },
+            plugins: {
+              legend: { display: false },
+              tooltip: { callbacks: { label: context => `Equity: $${context.parsed.y.toFixed(2)}` } }
+            },
+            scales: {
+              x: { grid: { color: 'rgba(0, 0, 0, 0.05)' }, ticks: { maxTicksLimit: 8 } },
+              y: { grid: { color: 'rgba(0, 0, 0, 0.05)' }, ticks: { callback: value => '$' + value.toFixed(2) } }
+            }
+          }
+        });
+      })
+      .catch(error => console.error("Error loading equity history:", error));
+  }
+
+  if (equityChartCanvas) {
+    const rangeButtons = document.querySelectorAll('.interval-btn[data-range]');
+    rangeButtons.forEach(btn => {
+      btn.addEventListener('click', function(e) {
+        e.preventDefault();
+        rangeButtons.forEach(b => b.classList.remove('active'));
+        this.classList.add('active');
+        loadEquityHistory(this.dataset.range);
+      });
+    });
+
+    if (typeof Chart === 'undefined') {
+      const script = document.createElement('script');
+      script.src = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js';
+      script.onload = () => loadEquityHistory('1w');
+      document.head.appendChild(script);
+    } else {
+      loadEquityHistory('1w');
+    }
+  }
+
   let currentChart = null;
 
   function loadChartWithInterval(interval) {
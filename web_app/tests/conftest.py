@@ -4,9 +4,14 @@ Pytest configuration and shared fixtures for web_app tests.
 
 from unittest.mock import MagicMock, patch
 
+import fakeredis
 import pytest
 from flask_bcrypt import Bcrypt
 
+from web_app.fragments import FragmentCache
+from web_app.leaderboard import Leaderboard
+from web_app.quotes import QuoteBook
+
 
 @pytest.fixture
 def sample_user_data():
@@ -45,8 +50,15 @@ def app(mock_db):
 
         import web_app.app as app_module
 
-        # Patch db directly to ensure all references use mock
-        with patch.object(app_module, "db", mock_db):
+        # Patch db directly to ensure all references use mock, and give each
+        # test an empty in-memory leaderboard, fragment cache and quote book
+        with patch.object(app_module, "db", mock_db), patch.object(
+            app_module, "leaderboard", Leaderboard(fakeredis.FakeRedis())
+        ), patch.object(
+            app_module, "fragments", FragmentCache(fakeredis.FakeRedis())
+        ), patch.object(
+            app_module, "quotes", QuoteBook(fakeredis.FakeRedis())
+        ):
             flask_app = app_module.app
             flask_app.config["TESTING"] = True
             flask_app.config["SECRET_KEY"] = "test-secret-key"
@@ -56,6 +68,11 @@ def app(mock_db):
 
             # Store mock_db reference on app for tests to access
             flask_app._mock_db = mock_db
+            flask_app._leaderboard = app_module.leaderboard
+            flask_app._fragments = app_module.fragments
+            # Templates reach the fragment cache through the app's extensions
+            flask_app.extensions["fragments"] = app_module.fragments
+            flask_app._quotes = app_module.quotes
 
             yield flask_app
 
@@ -0,0 +1,76 @@
+"""
+Tests for the streaming trade and position exports.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from web_app import exports
+
+TRADES = [
+    {
+        "executed_at": datetime(2025, 1, 1, tzinfo=timezone.utc),
+        "asset_id": "tok",
+        "market_question": 'Will it "rain"?',
+        "side": "YES",
+        "quantity": 100.0,
+        "price": 0.4,
+        "amount": 40.0,
+    },
+    {"asset_id": "tok2", "side": "NO", "quantity": 10.0, "price": 0.5, "amount": 5.0},
+]
+
+
+def test_csv_sends_the_header_before_reading_rows():
+    def rows():
+        raise AssertionError("rows read before the header was sent")
+        yield  # pylint: disable=unreachable
+
+    chunks = exports.as_csv(rows(), exports.TRADE_COLUMNS)
+    assert next(chunks).startswith("executed_at,asset_id,")
+
+
+def test_rows_are_encoded_one_batch_per_chunk(monkeypatch):
+    monkeypatch.setattr(exports, "BATCH_SIZE", 1)
+    chunks = list(exports.as_csv(iter(TRADES), exports.TRADE_COLUMNS))
+    assert len(chunks) == 3
+    assert chunks[1] == (
+        '2025-01-01T00:00:00+00:00,tok,"Will it ""rain""?",YES,100.0,0.4,40.0\r\n'
+    )
+    assert chunks[2] == ",tok2,,NO,10.0,0.5,5.0\r\n"
+
+    lines = "".join(exports.as_ndjson(iter(TRADES), exports.TRADE_COLUMNS))
+    first, second = map(json.loads, lines.splitlines())
+    assert first["executed_at"] == "2025-01-01T00:00:00+00:00"
+    assert second["market_question"] is None
+
+
+def test_export_route_streams_from_a_cursor(app, auth_client):
+    app._mock_db.trades.find.return_value = iter(TRADES)
+    response = auth_client.get("/portfolio/export/trades?format=ndjson")
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "application/x-ndjson"
+    assert "attachment" in response.headers["Content-Disposition"]
+    assert [json.loads(line)["asset_id"] for line in response.data.splitlines()] == [
+        "tok",
+        "tok2",
+    ]
+    _, kwargs = app._mock_db.trades.find.call_args
+    assert kwargs["batch_size"] == exports.BATCH_SIZE
+
+
+def test_positions_are_unwound_by_mongodb(app, auth_client):
+    app._mock_db.portfolios.aggregate.return_value = iter(
+        [{"asset_id": "tok", "side": "YES", "quantity": 5.0, "avg_price": 0.2}]
+    )
+    response = auth_client.get("/portfolio/export/positions")
+    lines = response.data.decode().splitlines()
+    assert lines[0].startswith("asset_id,market_question,side")
+    assert lines[1].startswith("tok,,YES,5.0,0.2")
+    pipeline = app._mock_db.portfolios.aggregate.call_args.args[0]
+    assert {"$unwind": "$position"} in pipeline
+
+    assert auth_client.get("/portfolio/export/orders").status_code == 404
+    assert auth_client.get("/portfolio/export/trades?format=xml").status_code == 404
@@ -0,0 +1,86 @@
+"""
+Tests for the rendered-fragment cache.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import redis
+
+from web_app.fragments import FragmentCache, fragment_key, position_row_version
+
+
+def test_renders_once_per_version_across_workers():
+    client = fakeredis.FakeRedis()
+    first, second = FragmentCache(client), FragmentCache(client)
+    render = MagicMock(return_value="<p>card</p>")
+
+    assert first.render("card", ("slug", "v1"), render) == "<p>card</p>"
+    first.flush()
+    assert second.render("card", ("slug", "v1"), render) == "<p>card</p>"
+    assert render.call_count == 1
+
+    # A new version is rendered again
+    second.render("card", ("slug", "v2"), render)
+    second.flush()
+    assert render.call_count == 2
+    assert client.ttl(fragment_key("card", ("slug", "v2"))) > 0
+
+
+def test_local_entries_are_bounded():
+    cache = FragmentCache(fakeredis.FakeRedis(), l1_max_entries=2)
+    for version in range(3):
+        cache.render("row", (version,), lambda: "<tr></tr>")
+    assert len(cache._l1) == 2
+    assert fragment_key("row", (0,)) not in cache._l1
+
+
+def test_prefetch_reads_all_fragments_in_one_call():
+    client = fakeredis.FakeRedis()
+    writer = FragmentCache(client)
+    writer.render("card", ("a",), lambda: "A")
+    writer.flush()
+    cache = FragmentCache(client)
+    with patch.object(client, "mget", wraps=client.mget) as mget, patch.object(
+        client, "get", wraps=client.get
+    ) as get:
+        cache.prefetch([("card", ("a",)), ("card", ("b",))])
+        assert cache.render("card", ("a",), lambda: "stale") == "A"
+    mget.assert_called_once()
+    get.assert_not_called()
+
+
+def test_redis_errors_only_cost_rendering():
+    client = MagicMock()
+    client.get.side_effect = redis.ConnectionError
+    client.mget.side_effect = redis.ConnectionError
+    client.pipeline.return_value.__enter__.return_value.execute.side_effect = (
+        redis.ConnectionError
+    )
+    cache = FragmentCache(client)
+    cache.prefetch([("card", ("a",))])
+    assert cache.render("card", ("a",), lambda: "A") == "A"
+    cache.flush()
+    assert cache.render("card", ("a",), lambda: "B") == "A"
+
+
+def test_misses_are_written_in_one_pipeline():
+    client = fakeredis.FakeRedis()
+    cache = FragmentCache(client)
+    with patch.object(client, "set") as unpipelined, patch.object(
+        client, "pipeline", wraps=client.pipeline
+    ) as pipeline:
+        for version in range(3):
+            cache.render("row", (version,), lambda: "<tr></tr>")
+        cache.flush()
+        cache.flush()
+    unpipelined.assert_not_called()
+    pipeline.assert_called_once()
+    assert client.exists(*(fragment_key("row", (v,)) for v in range(3))) == 3
+
+
+def test_position_rows_do_not_change_with_the_price():
+    row = {"asset_id": "t1", "quantity": 10.0, "avg_price": 0.4}
+    assert position_row_version({**row, "current_price": 0.5}) == (
+        position_row_version({**row, "current_price": 0.7})
+    )
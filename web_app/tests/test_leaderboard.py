@@ -0,0 +1,147 @@
+"""
+Tests for the Redis leaderboard.
+"""
+
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+import redis
+
+from web_app.leaderboard import EQUITY, HOLDERS, Leaderboard, rebuild
+
+
+@pytest.fixture
+def board():
+    return Leaderboard(fakeredis.FakeRedis())
+
+
+def equity(board, portfolio_id):
+    return board.client.zscore(EQUITY, portfolio_id)
+
+
+def test_trades_adjust_only_the_trading_portfolio(board):
+    board.seed_portfolio("alice", "alice", 1000.0)
+    board.seed_portfolio("bob", "bob", 500.0)
+
+    # 100 shares at 0.40 for $40 cash
+    board.record_trade("alice", "tok", 100.0, 0.4, 0.4, -40.0)
+    assert equity(board, "alice") == pytest.approx(1000.0)
+    assert equity(board, "bob") == pytest.approx(500.0)
+
+    # Adding to the position replaces its value rather than adding to it
+    board.record_trade("alice", "tok", 150.0, 0.4, 0.4, -20.0)
+    assert equity(board, "alice") == pytest.approx(1000.0)
+
+
+def test_price_moves_remark_only_the_holders(board):
+    board.seed_portfolio(
+        "alice",
+        "alice",
+        960.0,
+        {"tok": {"avg_price": 0.4, "quantity": 100}},
+        {"tok": 0.4},
+    )
+    board.seed_portfolio("bob", "bob", 500.0)
+
+    assert board.apply_prices({"tok": 0.5, "other": 0.9}) == 2
+    assert equity(board, "alice") == pytest.approx(1010.0)
+    assert equity(board, "bob") == pytest.approx(500.0)
+
+    # Unchanged prices are skipped
+    assert board.apply_prices({"tok": 0.5}) == 0
+
+
+def test_pages_and_rank_around_a_portfolio(board):
+    for i in range(10):
+        board.seed_portfolio(f"p{i}", f"user{i}", float(i))
+
+    first = board.page(1, per_page=3)
+    assert [e["username"] for e in first["entries"]] == ["user9", "user8", "user7"]
+    assert [e["rank"] for e in first["entries"]] == [1, 2, 3]
+    assert first["total"] == 10
+
+    second = board.page(2, per_page=3)
+    assert [e["rank"] for e in second["entries"]] == [4, 5, 6]
+
+    around = board.around("p5", radius=1)
+    assert [(e["rank"], e["portfolio_id"]) for e in around] == [
+        (4, "p6"),
+        (5, "p5"),
+        (6, "p4"),
+    ]
+    assert board.around("missing") == []
+
+
+def test_reseeding_drops_old_holdings(board):
+    board.seed_portfolio(
+        "alice", "alice", 0.0, {"tok": {"avg_price": 0.5, "quantity": 10}}
+    )
+    board.seed_portfolio("alice", "alice", 1000.0)
+    assert board.client.hlen(HOLDERS.format("tok")) == 0
+    assert equity(board, "alice") == pytest.approx(1000.0)
+
+
+def test_settling_a_token_credits_its_holders(board):
+    board.seed_portfolio(
+        "alice", "alice", 960.0, {"tok": {"avg_price": 0.4, "quantity": 100}}
+    )
+    board.seed_portfolio(
+        "bob", "bob", 500.0, {"other": {"avg_price": 0.5, "quantity": 10}}
+    )
+
+    board.settle_token("tok", {"alice": 100.0})
+
+    assert equity(board, "alice") == pytest.approx(1060.0)
+    assert equity(board, "bob") == pytest.approx(505.0)
+    assert board.client.hlen(HOLDERS.format("tok")) == 0
+    # Later price updates no longer touch the settled position
+    assert board.apply_prices({"tok": 0.9}) == 1
+    assert equity(board, "alice") == pytest.approx(1060.0)
+
+
+def test_rebuild_seeds_every_portfolio(board, mongo_like_db):
+    count = rebuild(board, mongo_like_db, lambda tokens: {t: 0.5 for t in tokens})
+    assert count == 2
+    assert equity(board, "pa") == pytest.approx(100.0 + 5.0)
+    assert board.page()["entries"][0]["username"] == "alice"
+
+
+@pytest.fixture
+def mongo_like_db():
+    class Collection:
+        def __init__(self, docs):
+            self.docs = docs
+
+        def find(self, *_):
+            return list(self.docs)
+
+    class Db:
+        users = Collection(
+            [
+                {"portfolio_id": "pa", "username": "alice"},
+                {"portfolio_id": "pb", "username": "bob"},
+            ]
+        )
+        portfolios = Collection(
+            [
+                {
+                    "portfolio_id": "pa",
+                    "balance": 100.0,
+                    "positions": {"tok": {"avg_price": 0.5, "quantity": 10}},
+                },
+                {"portfolio_id": "pb", "balance": 50.0, "positions": {}},
+            ]
+        )
+
+    return Db()
+
+
+def test_quiet_updates_back_off_after_a_redis_failure():
+    client = MagicMock()
+    client.hset.side_effect = redis.ConnectionError
+    board = Leaderboard(client, retry_seconds=60)
+
+    board.update_quietly("rename", "alice", "alice")
+    board.update_quietly("rename", "alice", "alice2")
+    assert client.hset.call_count == 1
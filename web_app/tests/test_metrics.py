@@ -0,0 +1,63 @@
+"""
+Tests for the Prometheus instrumentation of the Flask app.
+"""
+
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from web_app import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_endpoint_is_served(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "mongo_command_duration_seconds" in response.get_data(as_text=True)
+
+
+def test_requests_are_timed_by_route_rule(client):
+    labels = {"service": "web_app", "method": "GET", "route": "/login", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    client.get("/login")
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+
+
+def test_market_cache_hits_and_misses_are_counted(app):
+    import web_app.app as app_module
+
+    misses = sample("cache_requests_total", namespace="market", result="miss")
+    hits = sample("cache_requests_total", namespace="market", result="hit")
+    assert app_module.get_cached_market("metrics-slug") is None
+    app_module.cache_market("metrics-slug", {"slug": "metrics-slug"})
+    assert app_module.get_cached_market("metrics-slug") == {"slug": "metrics-slug"}
+    assert sample("cache_requests_total", namespace="market", result="miss") == (
+        misses + 1
+    )
+    assert sample("cache_requests_total", namespace="market", result="hit") == hits + 1
+
+
+def test_mongo_listener_records_command_durations():
+    timer = metrics.MongoCommandTimer()
+    before = sample(
+        "mongo_command_duration_seconds_count", command="find", outcome="ok"
+    )
+    timer.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+    assert (
+        sample("mongo_command_duration_seconds_count", command="find", outcome="ok")
+        == before + 1
+    )
+
+
+def test_hot_paths_do_not_print(auth_client, app, capsys):
+    app._mock_db.portfolios.find_one.return_value = {
+        "portfolio_id": "test-portfolio-id-12345",
+        "balance": 100.0,
+        "positions": {},
+    }
+    auth_client.get("/portfolio")
+    auth_client.get("/live_prices")
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,100 @@
+"""
+Tests for quote-then-execute trading.
+"""
+
+from unittest.mock import MagicMock, patch
+
+
+def quote_for(auth_client, asset_id="test-asset"):
+    response = auth_client.get(f"/live_prices?tokens={asset_id}&quote=1")
+    assert response.headers["Cache-Control"] == "no-store"
+    return response.get_json()["quotes"][asset_id]
+
+
+def place_trade(app, auth_client, **extra):
+    mock_db = app._mock_db
+    mock_db.portfolios.update_one.return_value = MagicMock(matched_count=1)
+    mock_db.portfolios.find_one.return_value = None
+    response = auth_client.post(
+        "/trade",
+        json={"asset_id": "test-asset", "bid": 100.0, "question": "Q", **extra},
+    )
+    assert response.get_json()["success"] is True
+    return mock_db.trades.insert_one.call_args.args[0]
+
+
+@patch("web_app.app.fetch_fill_price", return_value=None)
+@patch("web_app.app.fetch_live_prices")
+def test_trade_fills_at_the_quoted_price_without_a_lookup(
+    mock_fetch, mock_fill, app, auth_client
+):
+    mock_fetch.return_value = {"test-asset": 0.5}
+    quote = quote_for(auth_client)
+    assert quote["price"] == 0.5
+
+    mock_fetch.reset_mock()
+    mock_fetch.return_value = {"test-asset": 0.8}
+    trade = place_trade(app, auth_client, quote_id=quote["quote_id"])
+    assert trade["price"] == 0.5
+    mock_fetch.assert_not_called()
+
+
+@patch("web_app.app.fetch_fill_price")
+@patch("web_app.app.fetch_live_prices")
+def test_quoted_trade_reads_only_the_streamed_book(
+    mock_fetch, mock_fill, app, auth_client
+):
+    mock_fetch.return_value = {"test-asset": 0.5}
+    quote = quote_for(auth_client)
+    mock_fill.return_value = {"avg_price": 0.52, "slippage": 0.02, "complete": True}
+
+    trade = place_trade(app, auth_client, quote_id=quote["quote_id"])
+    mock_fill.assert_called_once_with("test-asset", 100.0, local_only=True)
+    assert round(trade["price"], 6) == 0.52
+
+    # Without a quote the book may come from the CLOB
+    mock_fill.reset_mock()
+    place_trade(app, auth_client)
+    mock_fill.assert_called_once_with("test-asset", 100.0, local_only=False)
+
+
+@patch("web_app.app.fetch_fill_price", return_value=None)
+@patch("web_app.app.fetch_live_prices")
+def test_used_expired_or_altered_quotes_requote(
+    mock_fetch, mock_fill, app, auth_client
+):
+    mock_fetch.return_value = {"test-asset": 0.5}
+    quote = quote_for(auth_client)
+    place_trade(app, auth_client, quote_id=quote["quote_id"])
+
+    # A quote fills one trade only
+    mock_fetch.return_value = {"test-asset": 0.8}
+    assert place_trade(app, auth_client, quote_id=quote["quote_id"])["price"] == 0.8
+
+    # Tampered with
+    assert (
+        place_trade(app, auth_client, quote_id=quote["quote_id"] + "x")["price"] == 0.8
+    )
+
+    # Expired
+    mock_fetch.return_value = {"test-asset": 0.5}
+    quote = quote_for(auth_client)
+    mock_fetch.return_value = {"test-asset": 0.8}
+    app._quotes._clock = lambda: quote["expires_at"] + 1
+    assert place_trade(app, auth_client, quote_id=quote["quote_id"])["price"] == 0.8
+
+
+@patch("web_app.app.fetch_fill_price", return_value=None)
+@patch("web_app.app.fetch_live_prices")
+def test_quotes_are_bound_to_the_token(mock_fetch, mock_fill, app, auth_client):
+    mock_fetch.return_value = {"other-asset": 0.1}
+    quote = quote_for(auth_client, "other-asset")
+    mock_fetch.return_value = {"test-asset": 0.6}
+    assert place_trade(app, auth_client, quote_id=quote["quote_id"])["price"] == 0.6
+
+
+@patch("web_app.app.fetch_live_prices")
+def test_plain_live_prices_are_unchanged(mock_fetch, client):
+    mock_fetch.return_value = {"t1": 0.5}
+    # Anonymous callers get prices only, even when asking for quotes
+    assert client.get("/live_prices?tokens=t1&quote=1").get_json() == {"t1": 0.5}
@@ -4,6 +4,8 @@ Web_app route tests.
 
 from unittest.mock import MagicMock, patch
 
+import requests
+
 # =============================================================================
 # HOME ROUTE TESTS
 # =============================================================================
@@ -279,6 +281,33 @@ class TestPortfolio:
         assert "+$130.00" in html  # Potential profit
         assert "$880.00" in html  # Current value
 
+    @patch("web_app.app.fetch_live_prices")
+    def test_portfolio_rows_are_reused_when_only_the_price_moves(
+        self, mock_fetch, app, auth_client
+    ):
+        """A price move updates the price cells without re-rendering the row."""
+        app._mock_db.portfolios.find_one.return_value = {
+            "portfolio_id": "test-portfolio-id-12345",
+            "balance": 1000.0,
+            "positions": {
+                "asset-no": {
+                    "quantity": 1000,
+                    "avg_price": 0.87,
+                    "market_question": "Test Market",
+                    "side": "NO",
+                }
+            },
+        }
+        mock_fetch.return_value = {"asset-no": 0.88}
+        auth_client.get("/portfolio")
+
+        mock_fetch.return_value = {"asset-no": 0.9}
+        with patch.object(app._fragments, "client") as shared:
+            html = auth_client.get("/portfolio").data.decode("utf-8")
+        shared.pipeline.assert_not_called()
+        assert "0.87 \u2192 0.90" in html
+        assert "$900.00" in html
+
     @patch("web_app.app.fetch_live_prices")
     def test_portfolio_corrects_flipped_prices_using_avg_anchor(
         self, mock_fetch, app, auth_client
@@ -330,29 +359,107 @@ class TestMarkets:
 
     @patch("web_app.app.requests.get")
     def test_markets_search_filters_by_question(self, mock_get, app, auth_client):
-        """Search should filter markets by question text."""
+        """Search should render and cache the slim markets from search_api."""
+        import web_app.app as app_module
+
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {
-            "events": [
+            "markets": [
                 {
-                    "markets": [
-                        {
-                            "slug": "btc-market",
-                            "active": True,
-                            "closed": False,
-                            "outcomes": '["Yes", "No"]',
-                            "outcomePrices": "[0.5, 0.5]",
-                            "clobTokenIds": '["1", "2"]',
-                        }
-                    ]
+                    "id": "1",
+                    "slug": "btc-market",
+                    "question": "Will BTC close higher?",
+                    "outcomes": ["Yes", "No"],
+                    "outcomePrices": [0.5, 0.5],
+                    "clobTokenIds": ["1", "2"],
                 }
-            ]
+            ],
+            "pagination": {"page": 1, "hasMore": True, "totalResults": 30},
         }
         mock_get.return_value = mock_response
 
         response = auth_client.get("/markets?q=btc")
         assert response.status_code == 200
+        assert b"Will BTC close higher?" in response.data
+        assert b"page=2" in response.data
+        assert app_module.get_cached_market("btc-market")["clobTokenIds"] == ["1", "2"]
+        assert b'data-token="1"' in response.data
+
+    @patch("web_app.app.requests.get")
+    def test_market_cards_are_rendered_once_per_version(
+        self, mock_get, app, auth_client
+    ):
+        """A repeated search reuses the cards until the market is updated."""
+        market = {
+            "slug": "btc-market",
+            "question": "Will BTC close higher?",
+            "updatedAt": "2025-01-01T00:00:00Z",
+            "outcomePrices": [0.5, 0.5],
+            "clobTokenIds": ["1", "2"],
+        }
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"markets": [market]}
+
+        auth_client.get("/markets?q=btc")
+        with patch.object(app._fragments, "client") as shared:
+            cached = auth_client.get("/markets?q=btc")
+        assert b"Will BTC close higher?" in cached.data
+        shared.pipeline.assert_not_called()
+
+        market["updatedAt"] = "2025-01-02T00:00:00Z"
+        market["question"] = "Will BTC close higher today?"
+        updated = auth_client.get("/markets?q=btc")
+        assert b"Will BTC close higher today?" in updated.data
+
+    @patch("web_app.app.requests.get")
+    def test_autocomplete_proxies_search_api(self, mock_get, app, auth_client):
+        """/api/autocomplete asks search_api, and degrades to no suggestions."""
+        suggestion = {"text": "Will BTC hit 100k?", "kind": "market", "slug": "b"}
+        mock_get.return_value.json.return_value = {"suggestions": [suggestion]}
+
+        response = auth_client.get("/api/autocomplete?q=btc")
+        assert response.get_json() == {"suggestions": [suggestion]}
+        assert mock_get.call_args.args[0].endswith("/autocomplete")
+
+        mock_get.side_effect = requests.ConnectionError
+        response = auth_client.get("/api/autocomplete?q=btc")
+        assert response.status_code == 200
+        assert response.get_json() == {"suggestions": []}
+
+    @patch("web_app.app.requests.post")
+    def test_sparklines_for_a_page_take_one_request(self, mock_post, app, auth_client):
+        """/api/sparklines asks price_api for every token at once."""
+        mock_post.return_value.json.return_value = {
+            "sparklines": {"1": [0.4, 0.5]},
+            "pending": ["3"],
+        }
+
+        response = auth_client.get("/api/sparklines?tokens=1,3")
+
+        assert response.status_code == 200
+        assert response.get_json()["sparklines"] == {"1": [0.4, 0.5]}
+        assert mock_post.call_count == 1
+        assert mock_post.call_args.kwargs["json"] == {"tokens": ["1", "3"]}
+
+    @patch("web_app.app.requests.post")
+    def test_sparklines_still_pending_are_not_cached(self, mock_post, app, auth_client):
+        """The retry for pending tokens must reach price_api, not the cache."""
+        mock_post.return_value.json.return_value = {
+            "sparklines": {},
+            "pending": ["a", "b"],
+        }
+        response = auth_client.get("/api/sparklines?tokens=a,b")
+        assert response.cache_control.no_store
+        assert response.cache_control.max_age is None
+
+        mock_post.return_value.json.return_value = {
+            "sparklines": {"a": [0.4], "b": [0.6]},
+            "pending": [],
+        }
+        response = auth_client.get("/api/sparklines?tokens=a,b")
+        assert response.cache_control.max_age == 600
+        assert not response.cache_control.no_store
 
 
 # =============================================================================
@@ -468,9 +575,10 @@ class TestTrade:
         response = client.post("/trade", json={"asset_id": "1", "bid": 100})
         assert response.status_code in (301, 302, 401)
 
+    @patch("web_app.app.fetch_fill_price", return_value=None)
     @patch("web_app.app.fetch_live_prices")
     def test_trade_valid_bid_executes_successfully(
-        self, mock_fetch, app, auth_client, sample_user_data
+        self, mock_fetch, mock_fill, app, auth_client, sample_user_data
     ):
         """POST /trade with valid bid should execute successfully."""
         mock_db = app._mock_db
@@ -491,9 +599,16 @@ class TestTrade:
         assert response.status_code == 200
         data = response.get_json()
         assert data["success"] is True
+        trade = mock_db.trades.insert_one.call_args.args[0]
+        assert trade["asset_id"] == "test-asset"
+        assert trade["amount"] == 100.0
+        assert trade["quantity"] == 200.0
 
+    @patch("web_app.app.fetch_fill_price", return_value=None)
     @patch("web_app.app.fetch_live_prices")
-    def test_trade_zero_bid_returns_error(self, mock_fetch, app, auth_client):
+    def test_trade_zero_bid_returns_error(
+        self, mock_fetch, mock_fill, app, auth_client
+    ):
         """POST /trade with zero bid should return error."""
         mock_fetch.return_value = {"test-asset": 0.5}
 
@@ -506,27 +621,22 @@ class TestTrade:
         data = response.get_json()
         assert data["success"] is False
 
+    @patch("web_app.app.fetch_fill_price", return_value=None)
     @patch("web_app.app.fetch_live_prices")
-    def test_trade_stores_submitted_side(self, mock_fetch, app, auth_client):
+    def test_trade_stores_submitted_side(self, mock_fetch, mock_fill, app, auth_client):
         """Trade should persist the side sent from the client (YES/NO)."""
         mock_db = app._mock_db
         asset_id = "asset-no"
         portfolio_id = "test-portfolio-id-12345"
         mock_fetch.return_value = {asset_id: 0.4}
 
-        # find_one is called three times within the trade route
-        portfolio_initial = {
-            "portfolio_id": portfolio_id,
-            "balance": 1000.0,
-            "positions": {},
-        }
+        # find_one is called twice within the trade route
         portfolio_after_debit = {
             "portfolio_id": portfolio_id,
             "balance": 900.0,
             "positions": {},
         }
         mock_db.portfolios.find_one.side_effect = [
-            portfolio_initial,
             portfolio_after_debit,
             None,
         ]
@@ -552,6 +662,46 @@ class TestTrade:
         set_fields = update_doc.get("$set", {})
         assert set_fields[f"positions.{asset_id}"]["side"] == "NO"
 
+    @patch("web_app.app.fetch_fill_price")
+    @patch("web_app.app.fetch_live_prices")
+    def test_trade_pays_the_order_book_slippage(
+        self, mock_fetch, mock_fill, app, auth_client
+    ):
+        """A bid deeper than the best level fills at the price plus slippage."""
+        mock_db = app._mock_db
+        mock_fetch.return_value = {"test-asset": 0.5}
+        mock_fill.return_value = {"avg_price": 0.52, "slippage": 0.02, "complete": True}
+        mock_db.portfolios.update_one.return_value = MagicMock(matched_count=1)
+        mock_db.portfolios.find_one.return_value = None
+
+        response = auth_client.post(
+            "/trade",
+            json={"asset_id": "test-asset", "bid": 52.0, "question": "Test Market"},
+        )
+
+        assert response.get_json()["success"] is True
+        mock_fill.assert_called_once_with("test-asset", 52.0, local_only=False)
+        trade = mock_db.trades.insert_one.call_args.args[0]
+        assert round(trade["price"], 6) == 0.52
+        assert round(trade["quantity"], 6) == 100.0
+
+    @patch("web_app.app.fetch_fill_price")
+    @patch("web_app.app.fetch_live_prices")
+    def test_trade_beyond_the_book_is_refused(
+        self, mock_fetch, mock_fill, app, auth_client
+    ):
+        mock_db = app._mock_db
+        mock_fetch.return_value = {"test-asset": 0.5}
+        mock_fill.return_value = {"avg_price": 0.7, "slippage": 0.2, "complete": False}
+
+        response = auth_client.post(
+            "/trade",
+            json={"asset_id": "test-asset", "bid": 1e6, "question": "Test Market"},
+        )
+
+        assert response.get_json()["success"] is False
+        mock_db.portfolios.update_one.assert_not_called()
+
 
 # =============================================================================
 # USER LOADER TESTS
@@ -637,3 +787,149 @@ class TestUserClass:
         assert user.is_authenticated is True
         assert user.is_active is True
         assert user.is_anonymous is False
+
+
+# =============================================================================
+# DEADLINE PROPAGATION TESTS
+# =============================================================================
+
+
+class TestDeadlineHeaders:
+    """Calls to the API services announce how long the caller will wait."""
+
+    @patch("web_app.app.requests.get")
+    def test_live_prices_sends_deadline(self, mock_get, app):
+        from web_app.app import fetch_live_prices
+
+        mock_get.return_value.json.return_value = ["0.5"]
+        assert fetch_live_prices(["t1"]) == {"t1": 0.5}
+        _, kwargs = mock_get.call_args
+        assert kwargs["headers"] == {"X-Deadline-Ms": "5000"}
+        assert kwargs["timeout"] == 5
+
+    @patch("web_app.app.requests.get")
+    def test_trades_ask_for_the_trade_lane(self, mock_get, app):
+        from web_app.app import fetch_live_prices
+
+        mock_get.return_value.json.return_value = ["0.5"]
+        fetch_live_prices(["t1"], priority="trade")
+        _, kwargs = mock_get.call_args
+        assert kwargs["headers"] == {"X-Deadline-Ms": "5000", "X-Priority": "trade"}
+
+    @patch("web_app.app.requests.get")
+    def test_historical_prices_sends_deadline(self, mock_get, app):
+        from web_app.app import fetch_historical_prices
+
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {}
+        fetch_historical_prices(["t1"], interval="1d")
+        _, kwargs = mock_get.call_args
+        assert kwargs["headers"] == {"X-Deadline-Ms": "30000"}
+
+
+# =============================================================================
+# LEADERBOARD TESTS
+# =============================================================================
+
+
+class TestLeaderboard:
+    """Tests for /leaderboard and /api/leaderboard."""
+
+    def test_leaderboard_requires_login(self, client):
+        response = client.get("/leaderboard", follow_redirects=False)
+        assert response.status_code in (301, 302)
+
+    def test_current_user_joins_on_first_visit(self, app, auth_client):
+        app._mock_db.portfolios.find_one.return_value = {
+            "portfolio_id": "test-portfolio-id-12345",
+            "balance": 250.0,
+            "positions": {},
+        }
+        app._leaderboard.seed_portfolio("other-portfolio", "rival", 900.0)
+
+        response = auth_client.get("/api/leaderboard?per_page=1")
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["total"] == 2
+        assert [e["username"] for e in data["entries"]] == ["rival"]
+        assert [e["rank"] for e in data["around_me"]] == [1, 2]
+        assert data["around_me"][1]["username"] == "testuser"
+
+        page = auth_client.get("/leaderboard")
+        assert page.status_code == 200
+        assert b"rival" in page.data
+
+    @patch("web_app.app.fetch_fill_price", return_value=None)
+    @patch("web_app.app.fetch_live_prices")
+    def test_trade_updates_the_leaderboard(
+        self, mock_prices, mock_fill, app, auth_client
+    ):
+        mock_prices.return_value = {"tok": 0.5}
+        db = app._mock_db
+        db.portfolios.find_one.side_effect = [
+            {"portfolio_id": "test-portfolio-id-12345", "balance": 90.0},
+            None,
+        ]
+        db.portfolios.update_one.return_value.matched_count = 1
+        app._leaderboard.seed_portfolio("test-portfolio-id-12345", "testuser", 100.0)
+
+        response = auth_client.post(
+            "/trade",
+            json={"asset_id": "tok", "bid": 10, "question": "Q?", "side": "YES"},
+        )
+        assert response.get_json()["success"] is True
+        # $10 of cash became 20 shares worth $10
+        (entry,) = app._leaderboard.around("test-portfolio-id-12345", 0)
+        assert abs(entry["equity"] - 100.0) < 1e-9
+        assert app._leaderboard.client.hexists(
+            "leaderboard:holders:tok", "test-portfolio-id-12345"
+        )
+
+
+# =============================================================================
+# HTTP CACHING TESTS
+# =============================================================================
+
+
+class TestHTTPCaching:
+    """ETags, Cache-Control and compression on JSON responses."""
+
+    @patch("web_app.app.fetch_live_prices")
+    def test_live_prices_etag_round_trip(self, mock_prices, client):
+        mock_prices.return_value = {"t1": 0.5}
+        first = client.get("/live_prices?tokens=t1")
+        assert first.status_code == 200
+        assert first.headers["ETag"].startswith('W/"')
+        assert first.headers["Cache-Control"] == "private, max-age=5"
+
+        again = client.get(
+            "/live_prices?tokens=t1",
+            headers={"If-None-Match": first.headers["ETag"]},
+        )
+        assert again.status_code == 304
+        assert again.data == b""
+
+        mock_prices.return_value = {"t1": 0.6}
+        moved = client.get(
+            "/live_prices?tokens=t1",
+            headers={"If-None-Match": first.headers["ETag"]},
+        )
+        assert moved.status_code == 200
+
+    @patch("web_app.app.fetch_live_prices")
+    def test_large_json_is_compressed(self, mock_prices, client):
+        import brotli
+
+        tokens = [f"token-{i:04d}" for i in range(200)]
+        mock_prices.return_value = {token: 0.5 for token in tokens}
+        response = client.get(
+            "/live_prices?tokens=" + ",".join(tokens),
+            headers={"Accept-Encoding": "gzip, br"},
+        )
+        assert response.headers["Content-Encoding"] == "br"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert len(brotli.decompress(response.data)) > len(response.data)
+
+        plain = client.get("/live_prices?tokens=" + ",".join(tokens))
+        assert "Content-Encoding" not in plain.headers
+        assert plain.get_json() == mock_prices.return_value
@@ -0,0 +1,108 @@
+"""
+Tests for the production serving entry point and lazy Mongo handle.
+"""
+
+import os
+from unittest.mock import MagicMock, patch
+
+from web_app.mongo import LazyDatabase
+from web_app.serve import CONFIG_PATH, build_command
+
+
+class TestLazyDatabase:
+    """Tests for LazyDatabase."""
+
+    @patch("web_app.mongo.MongoClient")
+    def test_client_not_created_until_first_use(self, mock_client):
+        """Constructing the handle must not open a connection."""
+        db = LazyDatabase("mongodb://example", "polypaper")
+        mock_client.assert_not_called()
+
+        db.users.find_one({"user_id": "x"})
+        mock_client.assert_called_once_with("mongodb://example")
+        mock_client.return_value.__getitem__.assert_called_once_with("polypaper")
+
+    @patch("web_app.mongo.MongoClient")
+    def test_client_reused_across_accesses(self, mock_client):
+        """Repeated access in one process reuses the same client."""
+        db = LazyDatabase("mongodb://example", "polypaper")
+        _ = db.users
+        _ = db["portfolios"]
+        assert mock_client.call_count == 1
+
+    @patch("web_app.mongo.MongoClient")
+    def test_reset_reconnects(self, mock_client):
+        """reset() drops the client so the next access reconnects."""
+        db = LazyDatabase("mongodb://example", "polypaper")
+        _ = db.users
+        db.reset()
+        _ = db.users
+        assert mock_client.call_count == 2
+
+    @patch("web_app.mongo.os.getpid")
+    @patch("web_app.mongo.MongoClient")
+    def test_new_process_gets_new_client(self, mock_client, mock_getpid):
+        """A client inherited across fork() is replaced, not reused."""
+        db = LazyDatabase("mongodb://example", "polypaper")
+        mock_getpid.return_value = 100
+        _ = db.users
+        mock_getpid.return_value = 101
+        _ = db.users
+        assert mock_client.call_count == 2
+
+
+class TestServeCommand:
+    """Tests for web_app.serve.build_command."""
+
+    def test_command_runs_gunicorn_with_config(self):
+        argv, _ = build_command()
+        assert argv[1:4] == ["-m", "gunicorn", "--config"]
+        assert argv[4] == CONFIG_PATH
+        assert os.path.exists(CONFIG_PATH)
+
+    def test_options_are_passed_through_env(self):
+        _, env = build_command(
+            mode="gevent", workers=3, threads=2, bind="127.0.0.1:9000"
+        )
+        assert env["WEB_WORKER_MODE"] == "gevent"
+        assert env["WEB_WORKERS"] == "3"
+        assert env["WEB_THREADS"] == "2"
+        assert env["WEB_BIND"] == "127.0.0.1:9000"
+
+    def test_unset_options_keep_environment(self, monkeypatch):
+        monkeypatch.setenv("WEB_WORKERS", "7")
+        _, env = build_command(mode="asgi")
+        assert env["WEB_WORKERS"] == "7"
+        assert env["WEB_WORKER_MODE"] == "asgi"
+
+
+class TestGunicornConfig:
+    """Tests for web_app/gunicorn.conf.py."""
+
+    def _load(self, monkeypatch, **env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        namespace = {}
+        with open(CONFIG_PATH, encoding="utf-8") as fh:
+            exec(compile(fh.read(), CONFIG_PATH, "exec"), namespace)
+        return namespace
+
+    def test_asgi_mode_uses_uvicorn_worker(self, monkeypatch):
+        conf = self._load(monkeypatch, WEB_WORKER_MODE="asgi")
+        assert conf["worker_class"] == "uvicorn_worker.UvicornWorker"
+        assert conf["wsgi_app"] == "web_app.asgi:application"
+
+    def test_thread_and_worker_counts_from_env(self, monkeypatch):
+        conf = self._load(
+            monkeypatch, WEB_WORKER_MODE="gthread", WEB_WORKERS="2", WEB_THREADS="16"
+        )
+        assert conf["worker_class"] == "gthread"
+        assert conf["workers"] == 2
+        assert conf["threads"] == 16
+
+    def test_post_fork_resets_db(self, monkeypatch, app):
+        conf = self._load(monkeypatch)
+        db = MagicMock()
+        with patch("web_app.app.db", db):
+            conf["post_fork"](None, None)
+        db.reset.assert_called_once()
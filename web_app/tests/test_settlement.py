@@ -0,0 +1,106 @@
+"""
+Tests for the settlement of resolved markets.
+"""
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from web_app import settlement
+
+NOW = datetime(2025, 1, 1)
+
+
+def holders_db(holders):
+    db = MagicMock()
+    db.portfolios.find.return_value = holders
+    db.portfolios.bulk_write.side_effect = lambda ops, ordered: MagicMock(
+        modified_count=len(ops)
+    )
+    return db
+
+
+def test_settle_token_credits_and_archives_each_holder():
+    db = holders_db(
+        [
+            {
+                "portfolio_id": "a",
+                "positions": {"t1": {"quantity": 10.0, "side": "YES"}},
+            },
+            {"portfolio_id": "b", "positions": {"t1": {"quantity": 2.5}}},
+        ]
+    )
+
+    settled = settlement.settle_token(db, "t1", 1.0, NOW)
+
+    assert settled == {"a": 10.0, "b": 2.5}
+    query = db.portfolios.find.call_args.args[0]
+    assert query == {"positions.t1.quantity": {"$exists": True}}
+    (ops,), kwargs = db.portfolios.bulk_write.call_args
+    assert kwargs == {"ordered": False}
+    first = ops[0]
+    # Only matches while the position is still open, so it is never paid twice
+    assert first._filter == {"portfolio_id": "a", "positions.t1": {"$exists": True}}
+    assert first._doc["$inc"] == {"balance": 10.0}
+    assert first._doc["$unset"] == {"positions.t1": ""}
+    archived = first._doc["$push"]["settled_positions"]
+    assert archived["asset_id"] == "t1"
+    assert archived["side"] == "YES"
+    assert (archived["payout"], archived["proceeds"]) == (1.0, 10.0)
+    assert archived["settled_at"] == NOW
+    assert archived["settlement_id"]
+
+
+def test_losing_positions_are_closed_without_credit():
+    db = holders_db([{"portfolio_id": "a", "positions": {"t2": {"quantity": 10.0}}}])
+    assert settlement.settle_token(db, "t2", 0.0, NOW) == {"a": 0.0}
+    (ops,), _ = db.portfolios.bulk_write.call_args
+    assert ops[0]._doc["$inc"] == {"balance": 0.0}
+
+
+def test_holders_are_written_in_chunks(monkeypatch):
+    monkeypatch.setattr(settlement, "WRITE_CHUNK", 2)
+    db = holders_db(
+        [
+            {"portfolio_id": str(i), "positions": {"t1": {"quantity": 1.0}}}
+            for i in range(5)
+        ]
+    )
+    settlement.settle_token(db, "t1", 1.0, NOW)
+    sizes = [len(c.args[0]) for c in db.portfolios.bulk_write.call_args_list]
+    assert sizes == [2, 2, 1]
+
+
+def test_holders_settled_by_an_overlapping_run_are_not_reported():
+    db = holders_db(
+        [
+            {"portfolio_id": "a", "positions": {"t1": {"quantity": 1.0}}},
+            {"portfolio_id": "b", "positions": {"t1": {"quantity": 2.0}}},
+        ]
+    )
+    # Another run removed b's position between our read and our write
+    db.portfolios.bulk_write.side_effect = None
+    db.portfolios.bulk_write.return_value = MagicMock(modified_count=1)
+    holders = db.portfolios.find.return_value
+    db.portfolios.find.side_effect = [holders, [{"portfolio_id": "a"}]]
+
+    assert settlement.settle_token(db, "t1", 1.0, NOW) == {"a": 1.0}
+    query = db.portfolios.find.call_args.args[0]
+    assert query["portfolio_id"] == {"$in": ["a", "b"]}
+    (ops,), _ = db.portfolios.bulk_write.call_args
+    settlement_id = ops[0]._doc["$push"]["settled_positions"]["settlement_id"]
+    assert query["settled_positions"]["$elemMatch"] == {
+        "asset_id": "t1",
+        "settlement_id": settlement_id,
+    }
+
+
+def test_settle_reports_each_token():
+    db = holders_db([{"portfolio_id": "a", "positions": {"t1": {"quantity": 4.0}}}])
+    on_settled = MagicMock()
+
+    counts = settlement.settle(db, {"t1": 0.5}, on_settled=on_settled, now=NOW)
+
+    assert counts == {"t1": 1}
+    on_settled.assert_called_once_with("t1", {"a": pytest.approx(2.0)})
@@ -0,0 +1,94 @@
+"""
+Tests for the equity snapshot job and the /portfolio/history endpoint.
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from web_app import snapshots
+
+POSITIONS = {
+    "t1": {"avg_price": 0.5, "quantity": 10.0},
+    "t2": {"avg_price": 0.2, "quantity": 5.0},
+}
+
+
+def test_revalue_all_prices_each_token_once():
+    db = MagicMock()
+    db.portfolios.aggregate.return_value = [{"_id": "t2"}, {"_id": "t1"}]
+    db.portfolios.find.return_value = [
+        {"portfolio_id": "a", "balance": 10.0, "positions": POSITIONS},
+        {"portfolio_id": "b", "balance": 5.0, "positions": {"t1": POSITIONS["t1"]}},
+        {"portfolio_id": "c"},
+    ]
+    fetch_prices = MagicMock(return_value={"t1": 0.6})
+    now = datetime(2025, 1, 1)
+
+    assert snapshots.revalue_all(db, fetch_prices, now=now) == 3
+
+    fetch_prices.assert_called_once_with(["t1", "t2"])
+    (written,), _ = db[snapshots.COLLECTION].insert_many.call_args
+    assert [(s["portfolio_id"], s["ts"], s["cash"]) for s in written] == [
+        ("a", now, 10.0),
+        ("b", now, 5.0),
+        ("c", now, 0.0),
+    ]
+    # t2 has no price and keeps its average price
+    assert [s["equity"] for s in written] == pytest.approx([17.0, 11.0, 0.0])
+
+
+def test_revalue_all_writes_in_chunks(monkeypatch):
+    monkeypatch.setattr(snapshots, "WRITE_CHUNK", 2)
+    db = MagicMock()
+    db.portfolios.aggregate.return_value = []
+    db.portfolios.find.return_value = [
+        {"portfolio_id": str(i), "balance": 1.0} for i in range(5)
+    ]
+
+    assert snapshots.revalue_all(db, lambda tokens: {}) == 5
+    sizes = [
+        len(c.args[0]) for c in db[snapshots.COLLECTION].insert_many.call_args_list
+    ]
+    assert sizes == [2, 2, 1]
+
+
+def test_downsample_keeps_the_last_point_of_each_bucket():
+    points = [[t, float(t)] for t in range(100)]
+    sampled = snapshots.downsample(points, 10)
+    assert len(sampled) == 10
+    assert sampled[-1] == [99, 99.0]
+    assert [p[0] for p in sampled] == sorted(p[0] for p in sampled)
+    assert snapshots.downsample(points[:5], 10) == points[:5]
+
+
+class TestPortfolioHistory:
+    """Tests for /portfolio/history."""
+
+    def test_requires_login(self, client):
+        response = client.get("/portfolio/history")
+        assert response.status_code == 302
+
+    def test_returns_the_curve(self, app, auth_client):
+        start = datetime(2025, 1, 1)
+        cursor = app._mock_db[snapshots.COLLECTION].find.return_value
+        cursor.sort.return_value = [
+            {"ts": start + timedelta(minutes=5 * i), "equity": 100.0 + i}
+            for i in range(3)
+        ]
+
+        response = auth_client.get("/portfolio/history?range=1d")
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body["range"] == "1d"
+        assert [p[1] for p in body["points"]] == [100.0, 101.0, 102.0]
+        assert body["points"][1][0] - body["points"][0][0] == 5 * 60 * 1000
+        query = app._mock_db[snapshots.COLLECTION].find.call_args.args[0]
+        assert query["portfolio_id"] == "test-portfolio-id-12345"
+        assert "$gte" in query["ts"]
+
+    def test_rejects_unknown_ranges(self, auth_client):
+        response = auth_client.get("/portfolio/history?range=2y")
+        assert response.status_code == 400
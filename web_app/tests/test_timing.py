@@ -0,0 +1,45 @@
+"""
+Tests for Server-Timing headers and the admin profiler.
+"""
+
+from types import SimpleNamespace
+
+from web_app import metrics, timing
+
+
+def test_header_value_formats_phases_in_milliseconds():
+    value = timing.header_value({"db": 0.003, "render": 0.0061}, 0.01)
+    assert value == "db;dur=3.0, render;dur=6.1, total;dur=10.0"
+
+
+def test_render_phase_is_reported(client):
+    header = client.get("/login").headers["Server-Timing"]
+    assert "render;dur=" in header
+    assert "total;dur=" in header
+
+
+def test_mongo_commands_count_towards_db_phase(app):
+    with app.test_request_context():
+        app.preprocess_request()
+        metrics.MongoCommandTimer().succeeded(
+            SimpleNamespace(command_name="find", duration_micros=2000)
+        )
+        response = app.process_response(app.response_class("ok"))
+    assert "db;dur=2.0" in response.headers["Server-Timing"]
+
+
+def test_profile_is_ignored_for_non_admins(auth_client, app, monkeypatch):
+    monkeypatch.setenv("ADMIN_EMAILS", "someone-else@example.com")
+    app._mock_db.portfolios.find_one.return_value = None
+    response = auth_client.get("/settings?profile=1")
+    assert response.mimetype == "text/html"
+
+
+def test_profile_returns_folded_stacks_for_admins(auth_client, app, monkeypatch):
+    monkeypatch.setenv("ADMIN_EMAILS", "Test@Example.com")
+    app._mock_db.portfolios.find_one.return_value = None
+    response = auth_client.get("/settings", headers={"X-Profile": "1"})
+    assert response.mimetype == "text/plain"
+    assert "Server-Timing" in response.headers
+    for line in response.get_data(as_text=True).splitlines():
+        assert line.rsplit(" ", 1)[1].isdigit()
@@ -0,0 +1,59 @@
+"""
+Tests for the portfolio valuation engine.
+"""
+
+import pytest
+
+from web_app.valuation import value_positions
+
+POSITIONS = {
+    "yes-token": {
+        "market_question": "Will it rain?",
+        "side": "YES",
+        "avg_price": 0.4,
+        "quantity": 100.0,
+    },
+    "flipped-feed": {"side": "NO", "avg_price": 0.7, "quantity": 10.0},
+    "no-price": {"avg_price": 0.25, "quantity": 8.0},
+}
+
+
+def test_values_each_position():
+    valuation = value_positions(
+        POSITIONS, {"yes-token": "0.5", "flipped-feed": 0.2, "no-price": None}
+    )
+    rows = {row["market"]: row for row in valuation.rows()}
+
+    rain = rows["Will it rain?"]
+    assert rain["current_price"] == pytest.approx(0.5)
+    assert rain["market_value"] == pytest.approx(50.0)
+    assert rain["bet_amount"] == pytest.approx(40.0)
+    assert rain["pnl"] == pytest.approx(10.0)
+    assert rain["to_win"] == pytest.approx(60.0)
+    assert rain["side"] == "YES"
+
+
+def test_uses_the_complement_closest_to_the_average_price():
+    valuation = value_positions(POSITIONS, {"flipped-feed": 0.2})
+    index = valuation.asset_ids.index("flipped-feed")
+    assert valuation.current_price[index] == pytest.approx(0.8)
+
+
+def test_falls_back_to_the_average_price_without_a_live_price():
+    valuation = value_positions(POSITIONS, {"no-price": "n/a"})
+    index = valuation.asset_ids.index("no-price")
+    assert valuation.current_price[index] == pytest.approx(0.25)
+    assert valuation.pnl[index] == pytest.approx(0.0)
+
+
+def test_totals():
+    valuation = value_positions(POSITIONS, {"yes-token": 0.5, "flipped-feed": 0.2})
+    assert valuation.total_value == pytest.approx(50.0 + 8.0 + 2.0)
+    assert valuation.total_pnl == pytest.approx(10.0 + 1.0 + 0.0)
+
+
+def test_empty_portfolio():
+    valuation = value_positions({}, {})
+    assert valuation.rows() == []
+    assert valuation.total_value == 0.0
+    assert valuation.total_pnl == 0.0
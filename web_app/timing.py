@@ -0,0 +1,163 @@
+"""
+Per-request timing: Server-Timing phases and an on-demand sampling profiler.
+
+Code that waits on something calls `record(phase, seconds)` (or wraps the
+wait in `phase(name)`); the totals for the request are sent back as
+
+    Server-Timing: db;dur=3.1, upstream;dur=41.0, render;dur=6.2, total;dur=52.4
+
+Admins (emails listed in ADMIN_EMAILS) can add `?profile=1` or an
+`X-Profile: 1` header to any request to get a profile of that request back
+instead of the page, in the folded-stack format that flamegraph.pl and
+speedscope read.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import flask_login
+from flask import (
+    Response,
+    before_render_template,
+    g,
+    has_app_context,
+    request,
+    template_rendered,
+)
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+
+
+def record(name, seconds):
+    """Add `seconds` to phase `name` of the current request, if there is one."""
+    if has_app_context() and "server_timing" in g:
+        g.server_timing[name] = g.server_timing.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def header_value(phases, total):
+    """Format phase totals (seconds) as a Server-Timing header value."""
+    parts = [f"{name};dur={phases[name] * 1000:.1f}" for name in phases]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread and counts identical stacks. Only sees real OS
+    threads, so it has nothing to sample under the gevent worker.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(  # pylint: disable=protected-access
+                self.thread_id
+            )
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                    f":{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """One `frame;frame;... count` line per distinct stack, busiest first."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def _admin_emails():
+    return {
+        email.strip().lower()
+        for email in os.getenv("ADMIN_EMAILS", "").split(",")
+        if email.strip()
+    }
+
+
+def profiling_requested():
+    """True when an admin asked for this request to be profiled."""
+    wanted = (
+        request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+    )
+    if not wanted:
+        return False
+    user = flask_login.current_user
+    return user.is_authenticated and user.email.lower() in _admin_emails()
+
+
+def init_app(app):
+    """Attach Server-Timing headers and the admin profiler to `app`."""
+
+    @app.before_request
+    def start_request_timing():
+        g.server_timing = {}
+        g.request_start = time.perf_counter()
+        if profiling_requested():
+            g.profiler = StackSampler(threading.get_ident()).start()
+
+    def render_started(sender, **extra):  # pylint: disable=unused-argument
+        g.render_start = time.perf_counter()
+
+    def render_finished(sender, **extra):  # pylint: disable=unused-argument
+        start = g.pop("render_start", None)
+        if start is not None:
+            record("render", time.perf_counter() - start)
+
+    # weak=False: the handlers are closures that would otherwise be collected
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.after_request
+    def add_server_timing(response):
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            response = Response(profiler.folded(), mimetype="text/plain")
+        response.headers["Server-Timing"] = header_value(
+            g.pop("server_timing", {}), total
+        )
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):  # pylint: disable=unused-argument
+        # after_request is skipped when the view raised
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
@@ -0,0 +1,118 @@
+"""
+Portfolio valuation over all positions at once.
+
+Positions come from a portfolio document (`asset_id -> position`) and live
+prices from `fetch_live_prices`. Every metric is computed with NumPy array
+operations, so valuing a portfolio costs a couple of passes over the
+positions to build the arrays rather than Python arithmetic per position.
+"""
+
+import math
+from typing import Dict, Iterable, List, Mapping
+
+import numpy as np
+
+
+def _as_float(value, default) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float_array(values: Iterable, missing: float = 0.0) -> np.ndarray:
+    """Values as a float array; None and unparsable values become `missing`."""
+    values = [missing if v is None else v for v in values]
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([_as_float(v, missing) for v in values], dtype=float)
+
+
+def mark_price(live_price, avg_price: float) -> float:
+    """One position's current price; the scalar form of `Valuation`'s rule."""
+    live = _as_float(live_price, math.nan)
+    if math.isnan(live):
+        return avg_price
+    complement = 1 - live
+    return live if abs(live - avg_price) <= abs(complement - avg_price) else complement
+
+
+class Valuation:  # pylint: disable=too-many-instance-attributes
+    """Per-position arrays (in `asset_ids` order) and portfolio totals."""
+
+    def __init__(self, positions: Mapping[str, Dict], live_prices: Mapping[str, float]):
+        self.asset_ids: List[str] = list(positions)
+        self._infos = [positions[a] for a in self.asset_ids]
+
+        self.avg_price = _float_array(i.get("avg_price") for i in self._infos)
+        self.quantity = _float_array(i.get("quantity") for i in self._infos)
+        live = _float_array(
+            (live_prices.get(a) for a in self.asset_ids), missing=math.nan
+        )
+
+        # Some feeds return the opposite side's price: of the price and its
+        # complement, take the one closest to what the user paid. Without a
+        # live price the position is valued at its average price.
+        complement = 1 - live
+        closest = np.where(
+            np.abs(live - self.avg_price) <= np.abs(complement - self.avg_price),
+            live,
+            complement,
+        )
+        self.current_price = np.where(np.isnan(live), self.avg_price, closest)
+
+        self.market_value = self.current_price * self.quantity
+        self.cost_basis = self.avg_price * self.quantity
+        self.pnl = self.market_value - self.cost_basis
+        # Potential profit if the outcome resolves in the user's favor
+        self.to_win = np.maximum((1 - self.avg_price) * self.quantity, 0.0)
+
+        self.total_value = float(self.market_value.sum())
+        self.total_pnl = float(self.pnl.sum())
+
+    def rows(self) -> List[Dict]:
+        """Display rows for the portfolio table, one per position."""
+        columns = zip(
+            self.asset_ids,
+            self._infos,
+            self.avg_price.tolist(),
+            self.current_price.tolist(),
+            self.cost_basis.tolist(),
+            self.quantity.tolist(),
+            self.to_win.tolist(),
+            self.market_value.tolist(),
+            self.pnl.tolist(),
+        )
+        return [
+            {
+                "asset_id": asset_id,
+                "market": info.get("market_question", "Unknown Market"),
+                "avg_price": avg_price,
+                "current_price": current_price,
+                "side": info.get("side", "YES"),
+                "bet_amount": cost_basis,
+                "quantity": quantity,
+                "to_win": to_win,
+                "market_value": market_value,
+                "pnl": pnl,
+            }
+            for (
+                asset_id,
+                info,
+                avg_price,
+                current_price,
+                cost_basis,
+                quantity,
+                to_win,
+                market_value,
+                pnl,
+            ) in columns
+        ]
+
+
+def value_positions(
+    positions: Mapping[str, Dict], live_prices: Mapping[str, float]
+) -> Valuation:
+    """Value every position of a portfolio against `live_prices`."""
+    return Valuation(positions or {}, live_prices or {})